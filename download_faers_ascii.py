@@ -1,15 +1,24 @@
+import hashlib
+import json
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from urllib.parse import urljoin, urlparse
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
+import faers_config
+
 # ======================
 # 配置区
 # ======================
-SAVE_ROOT = Path(r"C:\Users\venture\first\FAERS_DATA\RAW_ZIP")
+# 数据根目录：环境变量 FAERS_BASE_DIR（faers_cli --base-dir 会设置），未设置时为默认目录
+SAVE_ROOT = Path(faers_config.base_dir()) / "RAW_ZIP"
 START_YEAR = 2004
 END_YEAR = 2025
 
@@ -18,15 +27,28 @@ OLDER_PAGE = "https://www.fda.gov/drugs/fdas-adverse-event-reporting-system-faer
 
 TIMEOUT = (10, 60)
 
+# 同时下载的文件数（1 = 逐个下载）；所有线程共用一个 Session，连接池大小与之一致
+MAX_WORKERS = 4
+CHUNK_SIZE = 1024 * 1024
+
+# 下载清单：每个 URL 记录远端 Content-Length / ETag / Last-Modified 与本地 sha256
+MANIFEST_NAME = "_download_manifest.json"
+# True：每次运行对清单内文件重算 sha256（读全部 ZIP）；False：只靠 HEAD + 本地大小判断
+VERIFY_CHECKSUM = False
+
 # ======================
 # 会话（禁用系统代理）
 # ======================
-def make_session():
+def make_session(pool_size=MAX_WORKERS):
     s = requests.Session()
     s.trust_env = False
     s.headers.update({
         "User-Agent": "Mozilla/5.0"
     })
+    # 同一主机（fis.fda.gov）最多保持 pool_size 条长连接，并发线程复用，不再每个文件重新握手
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
     return s
 
 
@@ -34,6 +56,9 @@ def make_session():
 # 抓 ASCII ZIP 链接
 # ======================
 def collect_ascii_links(session, page_url):
+    # bs4 + lxml 只有抓页面时才需要
+    from bs4 import BeautifulSoup
+
     html = session.get(page_url, timeout=TIMEOUT).text
     soup = BeautifulSoup(html, "lxml")
 
@@ -62,12 +87,229 @@ def parse_year_quarter(filename):
     return int(m.group(1)), int(m.group(2))
 
 
+# ======================
+# 下载清单 + HEAD 复核
+# ======================
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def head_info(session, url):
+    """HEAD 取远端大小与校验头；失败返回 None（离线时退回只看本地清单）"""
+    try:
+        r = session.head(url, allow_redirects=True, timeout=TIMEOUT)
+        if r.status_code != 200:
+            return None
+    except requests.RequestException:
+        return None
+    size = r.headers.get("Content-Length")
+    return {
+        "size": int(size) if size else None,
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+    }
+
+
+class DownloadManifest:
+    """
+    {url: {"path", "size", "etag", "last_modified", "sha256"}}，多线程共用；
+    每记录一条就原子写回磁盘（tmp + replace），中途崩溃也不丢已完成的条目。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8")).get("files", {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, url):
+        with self.lock:
+            return self.entries.get(url)
+
+    def record(self, url, save_path, remote):
+        entry = {
+            "path": str(save_path),
+            "size": save_path.stat().st_size,
+            "etag": (remote or {}).get("etag"),
+            "last_modified": (remote or {}).get("last_modified"),
+            "sha256": file_sha256(save_path),
+        }
+        with self.lock:
+            self.entries[url] = entry
+            self._save()
+        return entry
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"files": self.entries}, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def check_local(save_path, entry, remote, verify_checksum=False):
+    """
+    返回需要下载的原因，None 表示本地文件可信：
+      MISSING    本地不存在
+      CHANGED    远端 ETag/Last-Modified 与清单不同（删除后整文件重下）
+      SHORT      本地比远端小（半截文件，Range 续传）
+      OVERSIZE   本地比远端大（删除后重下）
+      CORRUPT    verify_checksum 时 sha256 与清单不符（删除后重下）
+      UNVERIFIED HEAD 失败且清单无法证明本地完整（续传）
+      ADOPT      本地完整但清单里没有（不下载，只补记清单）
+    """
+    if not save_path.exists():
+        return "MISSING"
+    local_size = save_path.stat().st_size
+
+    if remote is None or remote.get("size") is None:
+        if entry and entry.get("size") == local_size:
+            return None
+        return "UNVERIFIED"
+
+    if entry:
+        for key in ("etag", "last_modified"):
+            if entry.get(key) and remote.get(key) and entry[key] != remote[key]:
+                return "CHANGED"
+    if local_size < remote["size"]:
+        return "SHORT"
+    if local_size > remote["size"]:
+        return "OVERSIZE"
+    if not entry or entry.get("size") != local_size:
+        return "ADOPT"
+    if verify_checksum and file_sha256(save_path) != entry.get("sha256"):
+        return "CORRUPT"
+    return None
+
+
+def revalidate(session, items, manifest, max_workers=MAX_WORKERS, verify_checksum=False):
+    """
+    items: [(label, url, save_path), ...]
+    每个 URL 一次 HEAD 并核对本地文件（线程池并发）；返回 (jobs, remote)：
+      jobs   需要（重新）下载的 [(label, url, save_path)]，CHANGED/OVERSIZE/CORRUPT 的本地文件已删除
+      remote {url: head_info}，供下载时 If-Range 与写清单使用
+    ADOPT 的文件直接补记清单（算一次 sha256），不进入 jobs。
+    sha256（ADOPT、verify_checksum）也在线程池里算：首次运行补记大量已有 ZIP 时不在主线程里逐个读完。
+    """
+    def check(item):
+        label, url, save_path = item
+        info = head_info(session, url)
+        reason = check_local(save_path, manifest.get(url), info, verify_checksum)
+        if reason == "ADOPT":
+            manifest.record(url, save_path, info)
+        return info, reason
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as ex:
+        checked = list(ex.map(check, items))
+
+    jobs, remote = [], {}
+    for (label, url, save_path), (info, reason) in zip(items, checked):
+        remote[url] = info
+        if reason is None:
+            print(f"[SKIP] {label}")
+            continue
+        if reason == "ADOPT":
+            print(f"[SKIP] {label} (recorded)")
+            continue
+        if reason in ("CHANGED", "OVERSIZE", "CORRUPT"):
+            save_path.unlink()
+        print(f"[{reason}] {label}")
+        jobs.append((label, url, save_path))
+    return jobs, remote
+
+
+def _fetch(session, url, save_path, progress, remote, manifest):
+    """下载一个文件；有 HEAD 信息时核对最终大小，通过后写入清单"""
+    info = (remote or {}).get(url)
+    validator = (info or {}).get("etag") or (info or {}).get("last_modified")
+    if not download(session, url, save_path, progress=progress, if_range=validator,
+                    expected_size=(info or {}).get("size")):
+        return False
+    if info and info.get("size") is not None and save_path.stat().st_size != info["size"]:
+        tqdm.write(f"[SIZE] {save_path.name}: {save_path.stat().st_size} != {info['size']}")
+        return False
+    if manifest is not None:
+        manifest.record(url, save_path, info)
+    return True
+
+
+# ======================
+# 汇总进度（多线程共用一个进度条）
+# ======================
+class DownloadProgress:
+    """
+    并发下载时只显示一个总进度条：每个文件的大小只登记一次（HEAD 大小，之后按 Content-Length 补差值），
+    已有部分（断点续传前的字节）也只计一次；重试时由 download 调整差值，不重复累加。
+    另记录本次实际传输的字节数（不含断点续传前已有部分），用于计算吞吐。
+    """
+
+    def __init__(self, n_files, disable=False):
+        self.lock = threading.Lock()
+        self.n_files = n_files
+        self.done_files = 0
+        self.transferred = 0
+        self.total = 0
+        self.done = 0
+        self.bar = tqdm(total=0, unit="B", unit_scale=True, desc=f"0/{n_files} files", disable=disable)
+
+    def adjust(self, total_delta=0, done_delta=0):
+        """改总量 / 已完成量（不计入传输字节）"""
+        with self.lock:
+            self.total += total_delta
+            self.done += done_delta
+            self.bar.total = self.total
+            self.bar.n = self.done
+            self.bar.refresh()
+
+    def update(self, nbytes):
+        with self.lock:
+            self.transferred += nbytes
+            self.done += nbytes
+            self.bar.update(nbytes)
+
+    def file_done(self):
+        with self.lock:
+            self.done_files += 1
+            self.bar.set_description(f"{self.done_files}/{self.n_files} files")
+
+    def close(self):
+        self.bar.close()
+
+
 # ======================
 # 下载
 # ======================
-def download(session, url, save_path, max_retries=5):
+def _unsatisfied_range_size(r):
+    """416 响应的 Content-Range: bytes */<size> -> size；没有或格式不符时 None"""
+    m = re.fullmatch(r"bytes \*/(\d+)", (r.headers.get("Content-Range") or "").strip())
+    return int(m.group(1)) if m else None
+
+
+def download(session, url, save_path, max_retries=5, progress=None, if_range=None, expected_size=None):
+    """
+    progress 为空时每个文件一个 tqdm 条（原行为）；
+    否则字节数汇总到共享的 DownloadProgress（expected_size 为 HEAD 大小，开始前登记一次）。
+    if_range：续传时附带的 ETag / Last-Modified；远端已变时服务器返回 200 全量，避免拼出新旧混合文件。
+    """
     save_path.parent.mkdir(parents=True, exist_ok=True)
 
+    # 本文件已计入共享进度条的总量 / 已完成量；每次尝试只把差值补进去
+    counted = {"total": 0, "done": 0}
+
+    def sync(total, done):
+        if progress is not None:
+            progress.adjust(total - counted["total"], done - counted["done"])
+            counted.update(total=total, done=done)
+
+    sync(expected_size or 0, save_path.stat().st_size if save_path.exists() else 0)
+
     for attempt in range(1, max_retries + 1):
         try:
             headers = {}
@@ -76,41 +318,108 @@ def download(session, url, save_path, max_retries=5):
             if save_path.exists():
                 downloaded = save_path.stat().st_size
                 headers["Range"] = f"bytes={downloaded}-"
+                if if_range:
+                    headers["If-Range"] = if_range
 
             with session.get(url, stream=True, headers=headers, timeout=(10, 120)) as r:
+                if r.status_code == 416 and downloaded:
+                    # 本地已有的字节之后没有内容：Content-Range 为 */<本地大小> 时本地就是完整文件
+                    if _unsatisfied_range_size(r) == downloaded:
+                        sync(downloaded, downloaded)
+                        return True
+                    # 远端比本地短（文件已变）：删掉本地文件，下一次尝试整文件重下
+                    save_path.unlink()
+                    raise RuntimeError(f"HTTP 416 (Content-Range {r.headers.get('Content-Range')!r}, local {downloaded})")
                 if r.status_code not in (200, 206):
                     raise RuntimeError(f"HTTP {r.status_code}")
 
+                # 服务器忽略 Range 返回 200 时是完整文件，必须覆盖重写而不是追加
+                if r.status_code == 200:
+                    downloaded = 0
                 mode = "ab" if downloaded > 0 else "wb"
                 total = r.headers.get("Content-Length")
                 total = int(total) + downloaded if total else None
 
-                with open(save_path, mode) as f, tqdm(
-                    initial=downloaded,
-                    total=total,
-                    unit="B",
-                    unit_scale=True,
-                    desc=save_path.name,
-                ) as bar:
-                    for chunk in r.iter_content(1024 * 1024):
-                        if chunk:
-                            f.write(chunk)
-                            bar.update(len(chunk))
+                if progress is not None:
+                    sync(total if total is not None else counted["total"], downloaded)
+                    bar = None
+                else:
+                    bar = tqdm(
+                        initial=downloaded,
+                        total=total,
+                        unit="B",
+                        unit_scale=True,
+                        desc=save_path.name,
+                    )
+
+                try:
+                    with open(save_path, mode) as f:
+                        for chunk in r.iter_content(CHUNK_SIZE):
+                            if chunk:
+                                f.write(chunk)
+                                if bar is not None:
+                                    bar.update(len(chunk))
+                                else:
+                                    progress.update(len(chunk))
+                                    counted["done"] += len(chunk)
+                finally:
+                    if bar is not None:
+                        bar.close()
 
             return True
 
         except Exception as e:
-            print(f"[RETRY {attempt}/{max_retries}] {save_path.name} -> {e}")
+            tqdm.write(f"[RETRY {attempt}/{max_retries}] {save_path.name} -> {e}")
             if attempt == max_retries:
                 return False
 
 
+def download_all(session, jobs, max_workers=MAX_WORKERS, show_progress=True, manifest=None, remote=None):
+    """
+    jobs: [(label, url, save_path), ...]
+    有界线程池并发下载（download 内部的 Range 续传与重试不变）；
+    给出 manifest/remote 时核对大小并把完成的文件记入清单。返回
+    {"ok": [...], "failed": [...], "bytes": 本次传输字节数, "seconds": 墙钟秒数, "mb_per_s": 总吞吐}
+    """
+    progress = DownloadProgress(len(jobs), disable=not show_progress)
+    ok, failed = [], []
+    start = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as ex:
+            futures = {
+                ex.submit(_fetch, session, url, save_path, progress, remote, manifest): (label, save_path)
+                for label, url, save_path in jobs
+            }
+            for fut in as_completed(futures):
+                label, save_path = futures[fut]
+                progress.file_done()
+                if fut.result():
+                    ok.append(save_path)
+                    tqdm.write(f"[OK]   {label} -> {save_path}")
+                else:
+                    failed.append(save_path)
+                    tqdm.write(f"[MISS] {label} -> {save_path.name}")
+    finally:
+        progress.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        "ok": ok,
+        "failed": failed,
+        "bytes": progress.transferred,
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(progress.transferred / (1024 * 1024) / seconds, 2) if seconds > 0 else 0.0,
+    }
+
+
 
 # ======================
 # 主流程
 # ======================
-def main():
-    session = make_session()
+def main(dry_run=False):
+    """dry_run=True：只抓链接、列出年份范围内的季度与本地是否已有文件，不发 HEAD、不下载、不改清单"""
+    session = make_session(MAX_WORKERS)
 
     print("抓取主页面（含最新季度 + 2012 Q4）")
     links_main = collect_ascii_links(session, MAIN_PAGE)
@@ -135,21 +444,28 @@ def main():
 
     print(f"共找到 {len(tasks)} 个 ASCII ZIP（{START_YEAR}–{END_YEAR}）")
 
-    for year, quarter, fname, url in tasks:
-        save_path = SAVE_ROOT / str(year) / f"Q{quarter}" / fname
+    items = [
+        (f"{year} Q{quarter}", url, SAVE_ROOT / str(year) / f"Q{quarter}" / fname)
+        for year, quarter, fname, url in tasks
+    ]
 
-        if save_path.exists():
-            print(f"[SKIP] {year} Q{quarter}")
-            continue
+    if dry_run:
+        for label, url, save_path in items:
+            print(f"[{'已有' if save_path.exists() else '缺失'}] {label} {url} -> {save_path}")
+        return items
+
+    # 每季度一次 HEAD：只重下缺失 / 半截 / 远端已更新的文件
+    manifest = DownloadManifest(SAVE_ROOT / MANIFEST_NAME)
+    jobs, remote = revalidate(session, items, manifest, MAX_WORKERS, VERIFY_CHECKSUM)
 
-        print(f"[DOWN] {year} Q{quarter}")
-        ok = download(session, url, save_path)
-        if ok:
-            print(f"[OK]   {save_path}")
-        else:
-            print(f"[MISS] {fname}")
+    print(f"待下载 {len(jobs)} 个，并发 {MAX_WORKERS}")
+    summary = download_all(session, jobs, MAX_WORKERS, manifest=manifest, remote=remote)
 
-    print("=== 完成 ===")
+    print(
+        f"=== 完成 === OK={len(summary['ok'])} MISS={len(summary['failed'])} | "
+        f"{summary['bytes'] / (1024 * 1024):.1f}MB in {summary['seconds']:.1f}s "
+        f"({summary['mb_per_s']:.2f} MB/s)"
+    )
 
 
 if __name__ == "__main__":
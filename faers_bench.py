@@ -0,0 +1,731 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import warnings
+
+import pandas as pd
+
+import faers_decode_final as fd
+import faers_schema
+
+
+# =========================================================
+# 0) 配置
+# =========================================================
+
+# 合成数据 / 结果目录（默认系统临时目录，可改成 SSD 上的路径）
+BENCH_ROOT = os.path.join(tempfile.gettempdir(), "faers_bench")
+
+# 每张合成表的行数
+BENCH_ROWS = 200_000
+
+# 随机种子（保证每台机器生成相同的数据）
+SEED = 20240101
+
+# 每个 case 大致的行数（DRUG / REAC 一个 primaryid 多行）
+ROWS_PER_CASE = {"DEMO": 1, "DRUG": 4, "INDI": 2, "OUTC": 1, "REAC": 3, "RPSR": 1, "STAT": 1, "THER": 2}
+
+# 每 N 行插入一行畸形数据（多出字段），0 表示不插入
+MALFORMED_EVERY = 5000
+
+
+# =========================================================
+# 1) FAERS 表结构（现行 FAERS 布局）
+# =========================================================
+
+TABLE_COLUMNS = {
+    "DEMO": [
+        "primaryid", "caseid", "caseversion", "i_f_code", "event_dt", "mfr_dt", "init_fda_dt", "fda_dt",
+        "rept_cod", "auth_num", "mfr_num", "mfr_sndr", "lit_ref", "age", "age_cod", "age_grp", "sex",
+        "e_sub", "wt", "wt_cod", "rept_dt", "to_mfr", "occp_cod", "reporter_country", "occr_country",
+    ],
+    "DRUG": [
+        "primaryid", "caseid", "drug_seq", "role_cod", "drugname", "prod_ai", "val_vbm", "route", "dose_vbm",
+        "cum_dose_chr", "cum_dose_unit", "dechal", "rechal", "lot_num", "exp_dt", "nda_num", "dose_amt",
+        "dose_unit", "dose_form", "dose_freq",
+    ],
+    "INDI": ["primaryid", "caseid", "indi_drug_seq", "indi_pt"],
+    "OUTC": ["primaryid", "caseid", "outc_cod"],
+    "REAC": ["primaryid", "caseid", "pt", "drug_rec_act"],
+    "RPSR": ["primaryid", "caseid", "rpsr_cod"],
+    "STAT": ["primaryid", "caseid", "stat_cod"],
+    "THER": ["primaryid", "caseid", "dsg_drug_seq", "start_dt", "end_dt", "dur", "dur_cod"],
+}
+
+_DRUGS = [
+    "ASPIRIN", "Metformin Hydrochloride", "HUMIRA", "ADALIMUMAB", "LIPITOR", "atorvastatin calcium",
+    "PREDNISONE 10MG TABLETS", "Methotrexate Sodium", "XARELTO", "ENBREL (ETANERCEPT)", "Paracétamol",
+]
+_PTS = [
+    "Nausea", "Headache", "Drug ineffective", "Fatigue", "Diarrhoea", "Death", "Off label use",
+    "Pneumonia", "Rash", "Dyspnoea", "Arthralgia", "Malaise", "Dizziness", "Pyrexia", "Vomiting",
+]
+_CODES = {
+    "role_cod": ["PS", "SS", "C", "I"],
+    "route": ["Oral", "Subcutaneous", "Intravenous", "Unknown", "Topical", ""],
+    "dose_form": ["TABLET", "INJECTION", "CAPSULE", "SOLUTION", ""],
+    "outc_cod": ["OT", "HO", "DE", "LT", "DS", "RI", "CA"],
+    "occr_country": ["US", "JP", "GB", "FR", "DE", "CA", "BR", ""],
+    "reporter_country": ["US", "JP", "GB", "FR", "DE", "CA", "BR", ""],
+    "sex": ["F", "M", ""],
+    "rept_cod": ["EXP", "PER", "DIR"],
+    "i_f_code": ["I", "F"],
+    "occp_cod": ["MD", "CN", "HP", "PH", "LW", ""],
+    "rpsr_cod": ["HP", "CSM", "FGN", "SDY", "LIT"],
+    "dur_cod": ["DAY", "WK", "MON", "YR", ""],
+    "dose_unit": ["MG", "ML", "UG", ""],
+}
+
+
+def _fake_value(rng: random.Random, col: str, primaryid: int, caseid: int, seq: int) -> str:
+    if col == "primaryid":
+        return str(primaryid)
+    if col == "caseid":
+        return str(caseid)
+    if col in ("caseversion", "drug_seq", "indi_drug_seq", "dsg_drug_seq"):
+        return str(seq)
+    if col.endswith("_dt"):
+        return "" if rng.random() < 0.2 else f"20{rng.randint(10, 24):02d}{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
+    if col in _CODES:
+        return rng.choice(_CODES[col])
+    if col in ("drugname", "prod_ai"):
+        # 少量前后空格，模拟原始数据
+        name = rng.choice(_DRUGS)
+        return f" {name} " if rng.random() < 0.05 else name
+    if col in ("pt", "indi_pt"):
+        return rng.choice(_PTS)
+    if col in ("age", "wt", "dose_amt", "dur"):
+        return "" if rng.random() < 0.3 else str(rng.randint(1, 99))
+    if col in ("mfr_num", "lot_num", "nda_num", "auth_num"):
+        return "" if rng.random() < 0.5 else f"{rng.choice('ABCDEFGH')}{rng.randint(100000, 999999)}"
+    return "" if rng.random() < 0.6 else rng.choice(["Y", "N", "U", "D", "1", "Unknown text"])
+
+
+# =========================================================
+# 2) 合成 FAERS 风格的 $ 分隔文件（latin1 + 少量畸形行）
+# =========================================================
+
+def write_synthetic_table(path: str, table: str, rows: int, seed: int = SEED, malformed_every: int = MALFORMED_EVERY,
+                          header: list = None, first_case: int = 0) -> int:
+    """
+    写出一个 FAERS 形状的 ASCII 表，返回文件字节数。
+    header 为写出的表头（默认现行 FAERS 列；AERS 时期传入大写旧列名，取值按规范列名生成）；
+    first_case 为首个 case 的序号，多个季度依次递增即可保证 primaryid 不重复。
+    """
+    rng = random.Random(f"{seed}-{table}-{first_case}")
+    header = header or TABLE_COLUMNS[table]
+    columns = [faers_schema.canonical_name(table, c) for c in header]
+    per_case = ROWS_PER_CASE.get(table, 1)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding=fd.INPUT_ENCODING, newline="") as f:
+        f.write(fd.DELIM.join(header) + "\r\n")
+        for i in range(rows):
+            case_no = first_case + i // per_case
+            primaryid = 100000000 + case_no * 10 + 1
+            caseid = 10000000 + case_no
+            seq = i % per_case + 1
+            fields = [_fake_value(rng, c, primaryid, caseid, seq) for c in columns]
+            if malformed_every and i and i % malformed_every == 0:
+                fields.append("EXTRA")
+            f.write(fd.DELIM.join(fields) + "\r\n")
+    return os.path.getsize(path)
+
+
+# =========================================================
+# 3) 解析引擎吞吐（MB/s）
+# =========================================================
+
+def bench_engines(tables=("DEMO", "DRUG", "REAC"), rows: int = BENCH_ROWS, engines=fd.PARSE_ENGINES, repeat: int = 3) -> list:
+    results = []
+    for table in tables:
+        path = os.path.join(BENCH_ROOT, "engines", f"{table}24Q1.txt")
+        if not os.path.exists(path):
+            write_synthetic_table(path, table, rows)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+
+        for engine in engines:
+            for mode in ("full", "chunk"):
+                best = None
+                nrows = 0
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore")
+                        if mode == "full":
+                            nrows = len(fd.read_faers_full(path, engine=engine))
+                        else:
+                            nrows = sum(len(c) for c in fd.read_faers_chunks(path, engine=engine, chunk_rows=50_000))
+                    sec = time.perf_counter() - start
+                    best = sec if best is None else min(best, sec)
+
+                results.append({
+                    "table": table,
+                    "engine": engine,
+                    "mode": mode,
+                    "size_mb": round(size_mb, 2),
+                    "rows": nrows,
+                    "seconds": round(best, 4),
+                    "mb_per_s": round(size_mb / best, 2),
+                })
+    return results
+
+
+# =========================================================
+# 4) 输出格式：CSV vs Parquet（写入耗时 / 文件大小 / 回读耗时）
+# =========================================================
+
+def bench_output_formats(tables=("DEMO", "DRUG", "REAC"), rows: int = BENCH_ROWS) -> list:
+    logger = logging.getLogger("bench")
+    results = []
+    for table in tables:
+        path = os.path.join(BENCH_ROOT, "engines", f"{table}24Q1.txt")
+        if not os.path.exists(path):
+            write_synthetic_table(path, table, rows)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            df = fd.clean_df(fd.read_faers_full(path, engine="c"))
+
+        for fmt in fd.OUTPUT_FORMATS:
+            out_path = os.path.join(BENCH_ROOT, "formats", f"{table}24Q1.{fmt}")
+
+            start = time.perf_counter()
+            fd.atomic_write(df, out_path, table, fmt)
+            write_sec = time.perf_counter() - start
+
+            start = time.perf_counter()
+            fd.atomic_write_chunks(
+                (df.iloc[i:i + 50_000].copy() for i in range(0, len(df), 50_000)),
+                out_path, table, logger, fmt,
+            )
+            chunk_write_sec = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if fmt == "parquet":
+                back = pd.read_parquet(out_path)
+            else:
+                back = pd.read_csv(out_path, dtype=str, keep_default_na=False)
+            read_sec = time.perf_counter() - start
+
+            results.append({
+                "table": table,
+                "format": fmt,
+                "rows": len(back),
+                "size_mb": round(os.path.getsize(out_path) / (1024 * 1024), 2),
+                "write_s": round(write_sec, 4),
+                "chunk_write_s": round(chunk_write_sec, 4),
+                "read_s": round(read_sec, 4),
+            })
+    return results
+
+
+# =========================================================
+# 5) 调度 makespan：发现顺序 vs 大任务优先 vs 大任务优先 + 区间拆分
+# =========================================================
+
+def skewed_corpus_sizes(quarters: int = 80, seed: int = SEED) -> list:
+    """
+    近似真实 FAERS 的文件大小分布（MB），按发现顺序（季度升序）排列：
+    各表逐季度变大，最近季度的 DRUG 约 1–2 GB；quarters 取最近的若干季度。
+    """
+    rng = random.Random(seed)
+    base_mb = {"DEMO": 60, "DRUG": 250, "INDI": 40, "OUTC": 6, "REAC": 70, "RPSR": 2, "STAT": 1, "THER": 30}
+    sizes = []
+    for qi in range(88 - quarters, 88):
+        growth = 1.2 ** (qi / 4)
+        for table, mb in base_mb.items():
+            sizes.append(round(mb / 6 * growth * rng.uniform(0.8, 1.2), 1))
+    return sizes
+
+
+def simulate_makespan(job_sizes_mb: list, workers: int, mb_per_s: float = 25.0, task_overhead_s: float = 0.1) -> float:
+    """贪心列表调度：空闲进程按顺序领取下一个任务；返回总耗时（秒）"""
+    free_at = [0.0] * workers
+    for size in job_sizes_mb:
+        i = min(range(workers), key=free_at.__getitem__)
+        free_at[i] += task_overhead_s + size / mb_per_s
+    return max(free_at)
+
+
+def bench_scheduler(workers: int = 8, quarters: int = 80, part_mb: float = None, threshold_mb: float = None,
+                    mb_per_s: float = 25.0, copy_mb_per_s: float = 400.0) -> list:
+    part_mb = part_mb or fd.SPLIT_PART_MB
+    threshold_mb = threshold_mb or fd.CHUNK_THRESHOLD_MB
+    sizes = skewed_corpus_sizes(quarters)
+
+    split_jobs = []
+    stitch_mb = 0.0
+    for size in sizes:
+        if size >= threshold_mb:
+            n = max(1, int(-(-size // part_mb)))
+            split_jobs += [size / n] * n
+            # 拼接在主进程里与其他任务重叠，只有最后一个拼接落在关键路径上（取最大值近似）
+            stitch_mb = max(stitch_mb, size)
+        else:
+            split_jobs.append(size)
+
+    plans = [
+        ("discovery_order", sizes, 0.0),
+        ("largest_first", sorted(sizes, reverse=True), 0.0),
+        ("largest_first+split", sorted(split_jobs, reverse=True), stitch_mb / copy_mb_per_s),
+    ]
+    baseline = None
+    results = []
+    for name, jobs, extra in plans:
+        makespan = simulate_makespan(jobs, workers, mb_per_s) + extra
+        baseline = baseline or makespan
+        results.append({
+            "quarters": quarters,
+            "plan": name,
+            "workers": workers,
+            "jobs": len(jobs),
+            "total_mb": round(sum(sizes), 1),
+            "makespan_s": round(makespan, 1),
+            "lower_bound_s": round(sum(sizes) / mb_per_s / workers, 1),
+            "speedup": round(baseline / makespan, 2),
+        })
+    return results
+
+
+def print_table(results: list):
+    if not results:
+        return
+    keys = list(results[0].keys())
+    widths = {k: max(len(k), *(len(str(r[k])) for r in results)) for k in keys}
+    print("  ".join(k.ljust(widths[k]) for k in keys))
+    for r in results:
+        print("  ".join(str(r[k]).ljust(widths[k]) for k in keys))
+
+
+# =========================================================
+# 6) 内存：全字符串 dtype vs 紧凑 dtype（各表 deep memory_usage）
+# =========================================================
+
+def bench_memory(tables=tuple(TABLE_COLUMNS), rows: int = BENCH_ROWS) -> list:
+    results = []
+    for table in tables:
+        path = os.path.join(BENCH_ROOT, "engines", f"{table}24Q1.txt")
+        if not os.path.exists(path):
+            write_synthetic_table(path, table, rows)
+        file_mb = os.path.getsize(path) / (1024 * 1024)
+
+        row = {"table": table, "file_mb": round(file_mb, 2)}
+        for label, compact in (("str", False), ("compact", True)):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                start = time.perf_counter()
+                df = fd.clean_df(fd.read_faers_full(path, engine="c", compact=compact))
+                sec = time.perf_counter() - start
+            mem_mb = df.memory_usage(deep=True, index=False).sum() / (1024 * 1024)
+            row[f"{label}_mb"] = round(mem_mb, 2)
+            row[f"{label}_x_file"] = round(mem_mb / file_mb, 2)
+            row[f"{label}_s"] = round(sec, 3)
+            del df
+        row["saved_pct"] = round(100 * (1 - row["compact_mb"] / row["str_mb"]), 1)
+        results.append(row)
+    return results
+
+
+# =========================================================
+# 7) 合成 UNZIP_DATA 目录树（按时期的表头 / 文件名 / 逐季度增长）
+# =========================================================
+
+# 各时期的起始季度（与 faers_schema 的时期名一致）；某表没有登记该时期时沿用它更早的布局
+ERA_STARTS = [
+    ("aers_2004", (2004, 1)),
+    ("aers_2005", (2005, 3)),
+    ("faers_2012q4", (2012, 4)),
+    ("faers_2013q1", (2013, 1)),
+    ("faers_2014q3", (2014, 3)),
+]
+
+# 每季度 case 数的增长率（最后一个季度为 cases，往前逐季递减）
+QUARTER_GROWTH = 1.05
+
+
+def era_layout(table: str, year: int, quarter: int):
+    """(时期, 表头)；AERS 时期列名大写；该表在这个季度还不存在时返回 None"""
+    eras = faers_schema.TABLE_SCHEMAS[table]["eras"]
+    era = None
+    for name, start in ERA_STARTS:
+        if (year, quarter) >= start and name in eras:
+            era = name
+    if era is None:
+        return None
+    cols = eras[era]
+    return era, ([c.upper() for c in cols] if era.startswith("aers") else list(cols))
+
+
+def write_synthetic_tree(root: str, start_year: int = 2011, end_year: int = 2014, cases: int = 20_000,
+                         tables=tuple(TABLE_COLUMNS), seed: int = SEED, malformed_every: int = MALFORMED_EVERY) -> list:
+    """
+    在 root 下生成 UNZIP_DATA/{year}/{Qn}/ascii/{TABLE}{yy}Q{n}.txt：
+    表头与文件名随时期变化（AERS 为大写列名 + .TXT），各表行数 = case 数 × ROWS_PER_CASE，
+    case 数逐季度按 QUARTER_GROWTH 增长，primaryid 跨季度不重复；含 latin1 字节与畸形行。
+    返回每个文件的 {path, table, era, rows, bytes}
+    """
+    quarters = [(y, q) for y in range(start_year, end_year + 1) for q in range(1, 5)]
+    files = []
+    first_case = 0
+    for i, (year, q) in enumerate(quarters):
+        n_cases = max(1, int(cases / QUARTER_GROWTH ** (len(quarters) - 1 - i)))
+        ascii_dir = os.path.join(root, "UNZIP_DATA", str(year), f"Q{q}", "ascii")
+        for table in tables:
+            layout = era_layout(table, year, q)
+            if layout is None:
+                continue
+            era, header = layout
+            ext = ".TXT" if era.startswith("aers") else ".txt"
+            path = os.path.join(ascii_dir, f"{table}{year % 100:02d}Q{q}{ext}")
+            rows = n_cases * ROWS_PER_CASE.get(table, 1)
+            size = write_synthetic_table(path, table, rows, seed, malformed_every, header=header, first_case=first_case)
+            files.append({"path": path, "table": table, "era": era, "rows": rows, "bytes": size})
+        first_case += n_cases
+    return files
+
+
+# =========================================================
+# 8) 微基准：解析 / 清理 / 写出 各环节单独计时
+# =========================================================
+
+def _best_of(fn, repeat: int):
+    best = None
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            value = fn()
+        sec = time.perf_counter() - start
+        best = sec if best is None else min(best, sec)
+    return best, value
+
+
+def bench_micro(tables=("DEMO", "DRUG", "REAC"), rows: int = BENCH_ROWS, repeat: int = 3, chunk_rows: int = 50_000) -> list:
+    """
+    read_faers_full / read_faers_chunks / clean_df / prepare_frame / atomic_write_*_chunks，MB/s 以输入字节计；
+    CSV 写出另测 to_csv 逐块追加（[pandas]）与边写边 gzip（[gzip]）
+    """
+    logger = logging.getLogger("bench")
+    results = []
+    for table in tables:
+        path = os.path.join(BENCH_ROOT, "engines", f"{table}24Q1.txt")
+        if not os.path.exists(path):
+            write_synthetic_table(path, table, rows)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            raw = fd.read_faers_full(path, engine="c")
+            cleaned = fd.prepare_frame(raw, table)
+        out_dir = os.path.join(BENCH_ROOT, "micro")
+
+        def chunks_of(df):
+            return (df.iloc[i:i + chunk_rows] for i in range(0, len(df), chunk_rows))
+
+        cases = [
+            ("read_faers_full", lambda: len(fd.read_faers_full(path, engine="c"))),
+            ("read_faers_chunks", lambda: sum(len(c) for c in fd.read_faers_chunks(path, engine="c", chunk_rows=chunk_rows))),
+            ("clean_df", lambda: len(fd.clean_df(raw.copy()))),
+            ("prepare_frame", lambda: len(fd.prepare_frame(raw.copy(), table))),
+            ("atomic_write_csv_chunks", lambda: fd.atomic_write_csv_chunks(
+                chunks_of(cleaned), os.path.join(out_dir, f"{table}24Q1.csv"), logger, clean=False,
+                writer="direct")[0]),
+            # 对照：逐块 to_csv(mode="a") 追加
+            ("atomic_write_csv_chunks[pandas]", lambda: fd.atomic_write_csv_chunks(
+                chunks_of(cleaned), os.path.join(out_dir, f"{table}24Q1.csv"), logger, clean=False,
+                writer="pandas")[0]),
+            ("atomic_write_csv_chunks[gzip]", lambda: fd.atomic_write_csv_chunks(
+                chunks_of(cleaned), os.path.join(out_dir, f"{table}24Q1.csv.gz"), logger, clean=False)[0]),
+            ("atomic_write_parquet_chunks", lambda: fd.atomic_write_parquet_chunks(
+                chunks_of(cleaned), os.path.join(out_dir, f"{table}24Q1.parquet"), table, logger, clean=False)[0]),
+        ]
+        for name, fn in cases:
+            sec, nrows = _best_of(fn, repeat)
+            results.append({
+                "bench": name,
+                "table": table,
+                "rows": nrows,
+                "size_mb": round(size_mb, 2),
+                "seconds": round(sec, 4),
+                "mb_per_s": round(size_mb / sec, 2),
+            })
+    return results
+
+
+# =========================================================
+# 9) 端到端：对合成目录树运行 faers_decode_final.main()（逐个引擎 / 输出格式）
+# =========================================================
+
+def bench_end_to_end(root: str, engines=("c",), formats=("csv",), process_num: int = None) -> list:
+    """
+    每个 (引擎, 格式) 组合从空输出目录完整跑一遍 main()；报告写在 root/LOGS/run_bench_*，
+    可直接用 faers_report.py compare 逐表 / 逐文件对比两次组合或两台机器
+    """
+    names = ("INPUT_ROOT", "OUTPUT_ROOT", "LOG_ROOT", "RUN_TS", "RUN_DIR", "PARSE_ENGINE", "OUTPUT_FORMAT",
+             "PROCESS_NUM", "SKIP_EXISTING", "INPUT_SOURCE", "BUILD_INDEX")
+    saved = {n: getattr(fd, n) for n in names}
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    results = []
+    try:
+        for engine in engines:
+            for fmt in formats:
+                out_root = os.path.join(root, "BENCH_OUT", f"{engine}_{fmt}")
+                shutil.rmtree(out_root, ignore_errors=True)
+                fd.INPUT_SOURCE = "unzip"
+                fd.INPUT_ROOT = os.path.join(root, "UNZIP_DATA")
+                fd.OUTPUT_ROOT = out_root
+                fd.LOG_ROOT = os.path.join(root, "LOGS")
+                fd.RUN_TS = f"bench_{stamp}_{engine}_{fmt}"
+                fd.RUN_DIR = os.path.join(fd.LOG_ROOT, f"run_{fd.RUN_TS}")
+                fd.PARSE_ENGINE = engine
+                fd.OUTPUT_FORMAT = fmt
+                fd.PROCESS_NUM = process_num
+                fd.SKIP_EXISTING = False
+                fd.BUILD_INDEX = False
+
+                start = time.perf_counter()
+                fd.main()
+                wall = time.perf_counter() - start
+
+                report_path = os.path.join(fd.RUN_DIR, f"report_{fd.RUN_TS}.json")
+                with open(report_path, "r", encoding="utf-8") as f:
+                    report = json.load(f)
+                total = report["summary"]["total"]
+                in_mb = total["bytes_read"] / (1024 * 1024)
+                results.append({
+                    "engine": engine,
+                    "format": fmt,
+                    "process_num": report["process_num"],
+                    "files": total["files"],
+                    "failed": total["failed"],
+                    "rows": total["rows"],
+                    "input_mb": round(in_mb, 1),
+                    "output_mb": round(total["bytes_written"] / (1024 * 1024), 1),
+                    "wall_s": round(wall, 2),
+                    "mb_per_s": round(in_mb / wall, 2),
+                    "worker_s": total["seconds"],
+                    **{f"{p}_s": total["phases"].get(p, 0.0) for p in ("parse", "clean", "write")},
+                    "report": report_path,
+                })
+    finally:
+        for n, v in saved.items():
+            setattr(fd, n, v)
+    return results
+
+
+def _stable_results(report_path: str) -> list:
+    """report 里与耗时无关的字段（冷 / 热两种启动方式应完全一致）"""
+    with open(report_path, "r", encoding="utf-8") as f:
+        results = json.load(f)["results"]
+    keys = ("year", "quarter", "file", "status", "reason", "rows", "cols", "mode", "engine", "schema_era",
+            "bytes_read", "bytes_written", "scan")
+    return [{k: r.get(k) for k in keys} for r in results]
+
+
+def bench_warm_start(root: str, runs: int = 3, process_num: int = None) -> list:
+    """
+    同一批任务：每次新建 spawn 进程池的 main()（冷启动）对比常驻预热进程池 faers_daemon（热启动）。
+    每次运行前清空输出目录（全量重建），报告与单次运行逐字段一致（耗时字段除外）
+    """
+    import faers_daemon
+
+    config = {
+        "INPUT_SOURCE": "unzip",
+        "INPUT_ROOT": os.path.join(root, "UNZIP_DATA"),
+        "OUTPUT_ROOT": os.path.join(root, "BENCH_OUT", "warm_start"),
+        "LOG_ROOT": os.path.join(root, "LOGS"),
+        "SKIP_EXISTING": False,
+        "BUILD_INDEX": False,
+        "BUILD_STORE": False,
+    }
+    process_num = process_num or os.cpu_count() or 2
+    results = []
+    reports = {}
+
+    def record(mode, i, wall, report):
+        with open(report, "r", encoding="utf-8") as f:
+            total = json.load(f)["summary"]["total"]
+        results.append({"mode": mode, "run": i, "process_num": process_num, "files": total["files"],
+                        "rows": total["rows"], "wall_s": round(wall, 3)})
+        reports.setdefault(mode, _stable_results(report))
+
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    names = ("PROCESS_NUM", "RUN_TS", "RUN_DIR")
+    saved = {n: getattr(fd, n) for n in names}
+    # 配置在常驻进程池启动时也保持生效（预热日志写到 config 的 LOG_ROOT 下）
+    state = fd.configure(config)
+    try:
+        fd.PROCESS_NUM = process_num
+        for i in range(runs):
+            shutil.rmtree(config["OUTPUT_ROOT"], ignore_errors=True)
+            fd.RUN_TS = f"bench_{stamp}_cold{i}"
+            fd.RUN_DIR = os.path.join(fd.LOG_ROOT, f"run_{fd.RUN_TS}")
+            start = time.perf_counter()
+            report = fd.main()
+            record("cold", i, time.perf_counter() - start, report)
+
+        with faers_daemon.DecodeDaemon(process_num) as daemon:
+            results.append({"mode": "daemon_start", "run": 0, "process_num": process_num, "files": 0, "rows": 0,
+                            "wall_s": daemon.start_seconds})
+            for i in range(runs):
+                shutil.rmtree(config["OUTPUT_ROOT"], ignore_errors=True)
+                start = time.perf_counter()
+                out = daemon.run(config)
+                if out["status"] != "OK":
+                    raise RuntimeError(out.get("traceback") or out.get("error"))
+                record("warm", i, time.perf_counter() - start, out["report"])
+    finally:
+        fd.restore_config(state)
+        for name, value in saved.items():
+            setattr(fd, name, value)
+
+    if reports["cold"] != reports["warm"]:
+        raise AssertionError("warm-start report differs from cold-start report")
+    return results
+
+
+# =========================================================
+# 10) 结果存档与对比
+# =========================================================
+
+def environment() -> dict:
+    import numpy as np
+
+    try:
+        import pyarrow
+
+        pyarrow_version = pyarrow.__version__
+    except ImportError:
+        pyarrow_version = None
+    return {
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "memory_mb": round((fd.total_memory_bytes() or 0) / (1024 * 1024)),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pyarrow_version,
+    }
+
+
+def save_results(sections: dict, out_dir: str = None, params: dict = None) -> str:
+    """各组基准结果 + 运行环境写成 bench_{host}_{时间}.json，返回路径"""
+    out_dir = out_dir or os.path.join(BENCH_ROOT, "results")
+    os.makedirs(out_dir, exist_ok=True)
+    env = environment()
+    path = os.path.join(out_dir, f"bench_{env['host'] or 'host'}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": env, "params": params or {}, "sections": sections}, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def compare_results(old: dict, new: dict) -> list:
+    """
+    两份存档里同名分组、同一组合（全部字符串字段相同）的行逐一对比耗时；
+    ratio = 新耗时 / 旧耗时（> 1 表示变慢）
+    """
+    rows = []
+    for section, new_rows in new["sections"].items():
+        def key(r):
+            return tuple((k, v) for k, v in r.items() if isinstance(v, str) and k != "report")
+
+        old_rows = {key(r): r for r in old["sections"].get(section, [])}
+        for r in new_rows:
+            o = old_rows.get(key(r))
+            time_key = next((k for k in ("seconds", "wall_s", "makespan_s", "compact_s") if k in r), None)
+            if o is None or time_key is None or not o.get(time_key):
+                continue
+            rows.append({
+                "section": section,
+                "case": " ".join(str(v) for _, v in key(r)),
+                "metric": time_key,
+                "old": o[time_key],
+                "new": r[time_key],
+                "ratio": round(r[time_key] / o[time_key], 3),
+            })
+    return rows
+
+
+SUITES = ("micro", "engines", "formats", "memory", "scheduler", "e2e", "warm")
+
+
+def main(argv=None):
+    global BENCH_ROOT
+    ap = argparse.ArgumentParser(description="FAERS decode benchmarks on synthetic data")
+    ap.add_argument("rows", nargs="?", type=int, default=BENCH_ROWS, help="rows per synthetic table")
+    ap.add_argument("--suite", action="append", choices=SUITES, help="run only these suites (repeatable)")
+    ap.add_argument("--root", default=BENCH_ROOT, help="where synthetic data / outputs / results go")
+    ap.add_argument("--years", default="2011-2014", help="year range of the synthetic UNZIP_DATA tree (e2e)")
+    ap.add_argument("--cases", type=int, default=20_000, help="cases in the newest quarter of the tree (e2e)")
+    ap.add_argument("--engines", default="c", help="comma separated parse engines for e2e")
+    ap.add_argument("--formats", default="csv", help="comma separated output formats for e2e")
+    ap.add_argument("--process-num", type=int, default=None)
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved result files and exit")
+    args = ap.parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.compare:
+        loaded = []
+        for path in args.compare:
+            with open(path, "r", encoding="utf-8") as f:
+                loaded.append(json.load(f))
+        print_table(compare_results(*loaded))
+        return
+
+    BENCH_ROOT = args.root
+    suites = args.suite or [s for s in SUITES if s not in ("e2e", "warm")]
+    rows = args.rows
+    print(f"BENCH_ROOT={BENCH_ROOT} | rows={rows} | suites={','.join(suites)}")
+
+    sections = {}
+    if "micro" in suites:
+        print("== micro benchmarks (best of 3) ==")
+        sections["micro"] = bench_micro(rows=rows)
+        print_table(sections["micro"])
+    if "engines" in suites:
+        print("== parse engines (best of 3) ==")
+        sections["engines"] = bench_engines(rows=rows)
+        print_table(sections["engines"])
+    if "formats" in suites:
+        print("== output formats ==")
+        sections["formats"] = bench_output_formats(rows=rows)
+        print_table(sections["formats"])
+    if "memory" in suites:
+        print("== in-memory size: str vs compact dtypes ==")
+        sections["memory"] = bench_memory(rows=rows)
+        print_table(sections["memory"])
+    if "scheduler" in suites:
+        print("== scheduler makespan (simulated skewed corpus) ==")
+        sections["scheduler"] = bench_scheduler() + bench_scheduler(quarters=4) + bench_scheduler(quarters=1)
+        print_table(sections["scheduler"])
+    if "e2e" in suites:
+        start_year, _, end_year = args.years.partition("-")
+        tree_root = os.path.join(BENCH_ROOT, "tree")
+        shutil.rmtree(os.path.join(tree_root, "UNZIP_DATA"), ignore_errors=True)
+        files = write_synthetic_tree(tree_root, int(start_year), int(end_year or start_year), args.cases)
+        print(f"== end to end: {len(files)} files, {sum(f['bytes'] for f in files) / (1024 * 1024):.1f}MB ==")
+        sections["e2e"] = bench_end_to_end(tree_root, args.engines.split(","), args.formats.split(","), args.process_num)
+        print_table([{k: v for k, v in r.items() if k != "report"} for r in sections["e2e"]])
+
+    if "warm" in suites:
+        start_year, _, end_year = args.years.partition("-")
+        tree_root = os.path.join(BENCH_ROOT, "tree")
+        shutil.rmtree(os.path.join(tree_root, "UNZIP_DATA"), ignore_errors=True)
+        files = write_synthetic_tree(tree_root, int(start_year), int(end_year or start_year), args.cases)
+        print(f"== cold vs warm start: {len(files)} files ==")
+        sections["warm"] = bench_warm_start(tree_root, process_num=args.process_num)
+        print_table(sections["warm"])
+
+    params = {k: v for k, v in vars(args).items() if k != "compare"}
+    print(f"Results saved: {save_results(sections, os.path.join(BENCH_ROOT, 'results'), params)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+FAERS 流水线统一命令行入口（安装后为 faers 命令，也可 python faers_cli.py）：
+
+  faers [--config faers.toml] [--base-dir DIR] download [--start-year 2020] [--dry-run]
+  faers ... unzip [--processes 4] [--retry-failed] [--dry-run]
+  faers ... decode [--format parquet] [--set CHUNK_ROWS=200000] [--dry-run]
+  faers ... report summary|compare ...
+
+本模块只导入标准库：--help、参数错误都不会加载 pandas / requests；
+各子命令用到时才导入对应脚本（decode -> faers_decode_final + pandas，download -> requests ...）。
+配置优先级：命令行参数 > 配置文件对应分节 > 脚本里的默认配置项；
+--base-dir / 配置文件顶层 base_dir 通过环境变量 FAERS_BASE_DIR 传给各脚本（含 spawn 出来的 worker）。
+"""
+
+import os
+import sys
+import argparse
+
+import faers_config
+
+# 子命令参数 -> 对应脚本的配置项名（参数为 None 时不覆盖）
+DOWNLOAD_ARGS = {
+    "save_root": "SAVE_ROOT",
+    "start_year": "START_YEAR",
+    "end_year": "END_YEAR",
+    "workers": "MAX_WORKERS",
+    "verify_checksum": "VERIFY_CHECKSUM",
+}
+UNZIP_ARGS = {
+    "raw_root": "RAW_ZIP_ROOT",
+    "unzip_root": "UNZIP_ROOT",
+    "start_year": "START_YEAR",
+    "end_year": "END_YEAR",
+    "processes": "PROCESS_NUM",
+}
+DECODE_ARGS = {
+    "input_root": "INPUT_ROOT",
+    "raw_zip_root": "RAW_ZIP_ROOT",
+    "output_root": "OUTPUT_ROOT",
+    "log_root": "LOG_ROOT",
+    "source": "INPUT_SOURCE",
+    "engine": "PARSE_ENGINE",
+    "format": "OUTPUT_FORMAT",
+    "compression": "CSV_COMPRESSION",
+    "processes": "PROCESS_NUM",
+    "skip_existing": "SKIP_EXISTING",
+    "build_index": "BUILD_INDEX",
+    "build_store": "BUILD_STORE",
+}
+
+
+# =========================================================
+# 1) 参数解析
+# =========================================================
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="faers", description="FAERS pipeline: download / unzip / decode / report")
+    ap.add_argument("--config", default=None, help="JSON / TOML config file (top-level base_dir + per-command sections)")
+    ap.add_argument("--base-dir", default=None, help=f"data root (default ${faers_config.BASE_DIR_ENV} or "
+                                                     f"{faers_config.DEFAULT_BASE_DIR})")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    dp = sub.add_parser("download", help="download FAERS / AERS quarterly ASCII ZIPs")
+    dp.add_argument("--save-root", default=None, help="RAW_ZIP directory (default BASE_DIR/RAW_ZIP)")
+    dp.add_argument("--start-year", type=int, default=None)
+    dp.add_argument("--end-year", type=int, default=None)
+    dp.add_argument("--workers", type=int, default=None, help="concurrent downloads")
+    dp.add_argument("--verify-checksum", action="store_const", const=True, default=None,
+                    help="re-hash every ZIP already in the manifest")
+    dp.add_argument("--dry-run", action="store_true", help="list quarters in range and local presence only")
+
+    up = sub.add_parser("unzip", help="extract the ascii tables from downloaded ZIPs")
+    up.add_argument("--raw-root", default=None, help="RAW_ZIP directory (default BASE_DIR/RAW_ZIP)")
+    up.add_argument("--unzip-root", default=None, help="UNZIP_DATA directory (default BASE_DIR/UNZIP_DATA)")
+    up.add_argument("--start-year", type=int, default=None)
+    up.add_argument("--end-year", type=int, default=None)
+    up.add_argument("--processes", type=int, default=None)
+    up.add_argument("--retry-failed", action="store_true", help="retry the ZIPs listed in FAILED_LOG")
+    up.add_argument("--dry-run", action="store_true", help="list archives and manifest status only")
+
+    cp = sub.add_parser("decode", help="decode quarterly tables to CSV / Parquet")
+    cp.add_argument("--input-root", default=None, help="UNZIP_DATA directory (--source unzip)")
+    cp.add_argument("--raw-zip-root", default=None, help="RAW_ZIP directory (--source zip)")
+    cp.add_argument("--output-root", default=None)
+    cp.add_argument("--log-root", default=None)
+    cp.add_argument("--source", choices=("unzip", "zip"), default=None)
+    cp.add_argument("--engine", choices=("c", "pyarrow", "bytes", "python"), default=None)
+    cp.add_argument("--format", choices=("csv", "parquet"), default=None)
+    cp.add_argument("--compression", choices=("gzip", "zstd"), default=None, help="compress CSV output")
+    cp.add_argument("--processes", type=int, default=None)
+    cp.add_argument("--no-skip-existing", dest="skip_existing", action="store_const", const=False, default=None,
+                    help="rebuild outputs even if the manifest says they are up to date")
+    cp.add_argument("--build-index", action="store_const", const=True, default=None)
+    cp.add_argument("--build-store", action="store_const", const=True, default=None)
+    cp.add_argument("--set", action="append", metavar="KEY=VALUE", help="override any faers_decode_final setting")
+    cp.add_argument("--dry-run", action="store_true", help="discover tasks and plan jobs without decoding")
+
+    # 其余参数原样交给 faers_report（summary / compare）
+    rp = sub.add_parser("report", add_help=False, help="run summary / comparison (faers_report)")
+    rp.add_argument("report_args", nargs=argparse.REMAINDER)
+    return ap
+
+
+def collect_settings(args, section: dict, arg_names: dict) -> dict:
+    """配置文件分节 + 非 None 的命令行参数（后者优先）"""
+    values = dict(section or {})
+    for dest, name in arg_names.items():
+        value = getattr(args, dest, None)
+        if value is not None:
+            values[name] = value
+    return values
+
+
+# =========================================================
+# 2) 子命令（用到时才导入对应脚本）
+# =========================================================
+
+def cmd_download(args, values: dict) -> int:
+    import download_faers_ascii as dl
+
+    faers_config.apply_settings(dl, values)
+    dl.main(dry_run=args.dry_run)
+    return 0
+
+
+def cmd_unzip(args, values: dict) -> int:
+    import unzip_faers_all as uz
+
+    faers_config.apply_settings(uz, values)
+    if args.retry_failed:
+        uz.retry_failed_unzip()
+        return 0
+    result = uz.extract_all(dry_run=args.dry_run)
+    return 1 if result.get("failed") else 0
+
+
+def cmd_decode(args, values: dict) -> int:
+    import faers_decode_final as fd
+
+    # configure 过的配置项随 settings 同步到 spawn worker
+    fd.configure(values)
+    if args.dry_run:
+        fd.dry_run()
+    else:
+        fd.main()
+    return 0
+
+
+def cmd_report(args, values: dict) -> int:
+    import faers_report
+
+    return faers_report.main(args.report_args)
+
+
+COMMANDS = {
+    "download": (cmd_download, DOWNLOAD_ARGS),
+    "unzip": (cmd_unzip, UNZIP_ARGS),
+    "decode": (cmd_decode, DECODE_ARGS),
+    "report": (cmd_report, {}),
+}
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    # REMAINDER 接不住以选项开头的参数（report --help / report compare 之前的选项）：未识别的一并交给 faers_report
+    args, extra = parser.parse_known_args(argv)
+    if args.cmd == "report":
+        args.report_args = extra + args.report_args
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    config = faers_config.load_config_file(args.config) if args.config else {}
+
+    # 必须在导入各脚本之前：它们在 import 时由 base_dir() 推出默认路径
+    base_dir = args.base_dir or config.get("base_dir")
+    if base_dir:
+        os.environ[faers_config.BASE_DIR_ENV] = str(base_dir)
+
+    handler, arg_names = COMMANDS[args.cmd]
+    values = collect_settings(args, config.get(args.cmd), arg_names)
+    if args.cmd == "decode":
+        values.update(faers_config.parse_set(args.set))
+    return handler(args, values)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+各流水线脚本共用的轻量配置工具（只依赖标准库，import 无副作用）：
+
+  base_dir()            数据根目录：环境变量 FAERS_BASE_DIR，未设置时为原来的默认目录
+  load_config_file()    读取 JSON / TOML 配置文件：按子命令分节，键为对应脚本的配置项名
+  parse_set()           命令行 --set KEY=VALUE -> {配置项名: 值}
+  apply_settings()      把 {配置项名: 值} 写入某个脚本模块的配置全局量，返回旧值供 restore_settings 还原
+  ascii_table_member()  ZIP 成员 -> ascii 目录下 8 张表之一的 stem（解压与流式解码共用，不必为此导入 pandas）
+
+配置文件示例（faers.toml）：
+  base_dir = "D:/FAERS_DATA"
+
+  [decode]
+  OUTPUT_FORMAT = "parquet"
+  CHUNK_ROWS = 200000
+
+  [unzip]
+  START_YEAR = 2020
+"""
+
+import os
+
+BASE_DIR_ENV = "FAERS_BASE_DIR"
+DEFAULT_BASE_DIR = r"C:\Users\venture\first\FAERS_DATA"
+
+# FAERS / AERS 季度包里的 8 张表
+FAERS_TABLES = ("DEMO", "DRUG", "INDI", "OUTC", "REAC", "RPSR", "STAT", "THER")
+
+
+def base_dir() -> str:
+    return os.environ.get(BASE_DIR_ENV) or DEFAULT_BASE_DIR
+
+
+# =========================================================
+# 1) 配置文件
+# =========================================================
+
+def load_config_file(path: str) -> dict:
+    """.toml（tomllib）或 .json -> dict；顶层 base_dir 与各子命令分节（decode / download / unzip ...）"""
+    if path.lower().endswith(".toml"):
+        import tomllib
+
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    import json
+
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def parse_set(items) -> dict:
+    """KEY=VALUE；VALUE 按 JSON 解析（false / null / 数字 / 列表），否则当字符串"""
+    import json
+
+    config = {}
+    for item in items or []:
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--set expects KEY=VALUE, got {item!r}")
+        try:
+            config[name] = json.loads(value)
+        except ValueError:
+            config[name] = value
+    return config
+
+
+# =========================================================
+# 2) 覆盖模块配置项
+# =========================================================
+
+def apply_settings(module, values: dict, fixed=()) -> dict:
+    """
+    values 的键必须是 module 里已有的大写配置项（不在 fixed 中），否则 ValueError 且不做任何修改。
+    JSON / TOML 没有 set / tuple / Path：列表与字符串按当前值的类型还原（TABLE_PREFIXES、SAVE_ROOT 等）
+    """
+    saved = {}
+    try:
+        for name, value in (values or {}).items():
+            if not name.isupper() or name in fixed or not hasattr(module, name):
+                raise ValueError(f"Unknown or fixed setting for {module.__name__}: {name!r}")
+            current = getattr(module, name)
+            if isinstance(value, list) and isinstance(current, (set, frozenset, tuple)):
+                value = type(current)(value)
+            elif isinstance(value, str) and isinstance(current, os.PathLike):
+                value = type(current)(value)
+            saved[name] = current
+            setattr(module, name, value)
+    except Exception:
+        restore_settings(module, saved)
+        raise
+    return saved
+
+
+def restore_settings(module, saved: dict):
+    for name, value in saved.items():
+        setattr(module, name, value)
+
+
+# =========================================================
+# 3) ZIP 成员识别
+# =========================================================
+
+def ascii_table_member(info, prefixes=FAERS_TABLES):
+    """ZIP 成员（zipfile.ZipInfo）属于 ascii 目录且是 prefixes 之一的 .txt -> 返回 stem（如 DRUG24Q1），否则 None"""
+    if info.is_dir():
+        return None
+    dir_name, fname = os.path.split(info.filename.replace("\\", "/"))
+    if not dir_name.lower().endswith("ascii"):
+        return None
+    stem, ext = os.path.splitext(fname)
+    if ext.lower() != ".txt" or stem[:4].upper() not in prefixes:
+        return None
+    return stem
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+常驻解码服务：spawn 进程池只启动一次，worker 预热后常驻（pandas / pyarrow 已导入，
+药名规范化缓存与字符串驻留字典跨批次保留），之后每批任务直接派给热 worker，
+省掉每次运行的进程启动 + 重新 import。适合一天多次、每次只有少量变化季度的增量解码。
+
+提交通道是一个任务队列目录（不占端口，Windows / Linux 相同）：
+  QUEUE_DIR/inbox/{id}.json     客户端提交：{"id": ..., "config": {"INPUT_ROOT": ..., "SKIP_EXISTING": false}, ...}
+  QUEUE_DIR/running/{id}.json   服务取走后移到这里（服务重启时放回 inbox 重做）
+  QUEUE_DIR/done/{id}.json      结果：status / report（report_*.json 路径）/ run_dir / counts / 排队与运行秒数
+  QUEUE_DIR/STOP                出现后服务处理完当前批次即退出
+每批按 config 临时覆盖 faers_decode_final 的配置项（faers_decode_final.configure，随 settings
+同步到常驻 worker），再调用 faers_decode_final.main(pool=...)：
+任务发现、增量清单、拆分拼接、RUN_DIR 下的 report / telemetry / 日志与单次运行完全相同。
+
+用法：
+  python faers_daemon.py serve [--queue-dir DIR] [--processes N]
+  python faers_daemon.py submit [--queue-dir DIR] [--set SKIP_EXISTING=false --set OUTPUT_FORMAT=parquet] [--no-wait]
+  python faers_daemon.py stop [--queue-dir DIR]
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import traceback
+from datetime import datetime
+from multiprocessing import get_context
+
+import faers_config
+import faers_decode_final as fd
+
+# =========================================================
+# 0) 配置区
+# =========================================================
+
+# 任务队列目录
+QUEUE_DIR = os.path.join(fd.BASE_DIR, "DECODE_QUEUE")
+
+# 常驻 worker 数；None -> CPU 核数
+PROCESS_NUM = None
+
+# 轮询 inbox / done 的间隔（秒）
+POLL_SEC = 0.5
+
+# 由服务自身决定、不接受按批次覆盖的配置项
+FIXED_NAMES = {"PROCESS_NUM", "RUN_TS", "RUN_DIR"}
+
+
+# =========================================================
+# 1) 按批次覆盖配置
+# =========================================================
+
+def apply_config(config: dict) -> dict:
+    """把 config 写入 faers_decode_final 的模块配置（不接受 FIXED_NAMES），返回 restore_config 用的旧状态"""
+    return fd.configure(config, FIXED_NAMES)
+
+
+def restore_config(state: dict):
+    fd.restore_config(state)
+
+
+def new_job_id() -> str:
+    """按时间排序即按提交顺序"""
+    return f"{datetime.now():%Y%m%d_%H%M%S_%f}_{os.getpid()}"
+
+
+# =========================================================
+# 2) 常驻进程池
+# =========================================================
+
+class DecodeDaemon:
+    """
+    with DecodeDaemon(processes) as daemon:   # 启动并预热进程池
+        daemon.run(config)                    # 同进程直接跑一批（benchmark / 测试）
+        daemon.serve(queue_dir)               # 轮询任务队列目录
+    """
+
+    def __init__(self, processes: int = None):
+        self.processes = max(1, int(processes or PROCESS_NUM or os.cpu_count() or 2))
+        self.pool = None
+        self.start_seconds = None
+        self.jobs = 0
+
+    def start(self):
+        start = time.perf_counter()
+        # 预热前的 worker 日志；每批开始时 worker 按该批的 settings 改写到其 RUN_DIR
+        run_dir = os.path.join(fd.LOG_ROOT, "daemon")
+        os.makedirs(run_dir, exist_ok=True)
+        self.pool = get_context("spawn").Pool(self.processes, initializer=fd.worker_init,
+                                              initargs=({"run_dir": run_dir},))
+        self.pool.map(fd.warm_worker, range(self.processes), chunksize=1)
+        self.start_seconds = round(time.perf_counter() - start, 3)
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self.start() if self.pool is None else self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, config: dict = None, job_id: str = None) -> dict:
+        """跑一批：与 faers_decode_final.main() 的单次运行相同，只是用常驻进程池"""
+        job_id = job_id or new_job_id()
+        out = {"id": job_id, "status": "FAIL", "report": None}
+        start = time.perf_counter()
+        saved = {n: getattr(fd, n) for n in FIXED_NAMES}
+        state = None
+        try:
+            state = apply_config(config)
+            fd.PROCESS_NUM = self.processes
+            fd.RUN_TS = f"daemon_{job_id}"
+            fd.RUN_DIR = os.path.join(fd.LOG_ROOT, f"run_{fd.RUN_TS}")
+            out["run_dir"] = fd.RUN_DIR
+            report = fd.main(pool=self.pool)
+            out["status"] = "OK"
+            out["report"] = report
+            if report:
+                with open(report, "r", encoding="utf-8") as f:
+                    out["counts"] = json.load(f)["counts"]
+        except Exception as e:
+            out["error"] = f"{type(e).__name__}: {e}"
+            out["traceback"] = traceback.format_exc()
+        finally:
+            if state is not None:
+                restore_config(state)
+            for name, value in saved.items():
+                setattr(fd, name, value)
+        out["run_sec"] = round(time.perf_counter() - start, 3)
+        self.jobs += 1
+        return out
+
+    def serve(self, queue_dir: str = None, poll_sec: float = None, max_jobs: int = None):
+        """按提交顺序处理 inbox；STOP 文件或处理满 max_jobs 批后返回"""
+        dirs = queue_dirs(queue_dir)
+        poll_sec = POLL_SEC if poll_sec is None else poll_sec
+        # 上次异常退出时正在跑的批次放回 inbox
+        for path in glob.glob(os.path.join(dirs["running"], "*.json")):
+            os.replace(path, os.path.join(dirs["inbox"], os.path.basename(path)))
+        print(f"[DAEMON] serving {dirs['root']} with {self.processes} warm workers (start {self.start_seconds}s)")
+
+        while not (max_jobs and self.jobs >= max_jobs):
+            if os.path.exists(dirs["stop"]):
+                os.remove(dirs["stop"])
+                break
+            pending = sorted(glob.glob(os.path.join(dirs["inbox"], "*.json")))
+            if not pending:
+                time.sleep(poll_sec)
+                continue
+
+            name = os.path.basename(pending[0])
+            running = os.path.join(dirs["running"], name)
+            os.replace(pending[0], running)
+            job_id = os.path.splitext(name)[0]
+            try:
+                with open(running, "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except (OSError, ValueError) as e:
+                job = None
+                result = {"id": job_id, "status": "FAIL", "report": None, "error": f"BAD_JOB_FILE: {e}"}
+                self.jobs += 1
+            if job is not None:
+                result = self.run(job.get("config"), job_id)
+                result["queued_sec"] = round(max(0.0, time.time() - job.get("submitted_at", time.time())
+                                                 - result["run_sec"]), 3)
+            _write_json(os.path.join(dirs["done"], name), result)
+            os.remove(running)
+            print(f"[DAEMON] {job_id} {result['status']} run={result['run_sec']}s report={result.get('report')}")
+
+
+# =========================================================
+# 3) 队列目录与客户端
+# =========================================================
+
+def queue_dirs(queue_dir: str = None) -> dict:
+    root = queue_dir or QUEUE_DIR
+    dirs = {"root": root, "stop": os.path.join(root, "STOP")}
+    for name in ("inbox", "running", "done"):
+        dirs[name] = os.path.join(root, name)
+        os.makedirs(dirs[name], exist_ok=True)
+    return dirs
+
+
+def _write_json(path: str, obj: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def submit(config: dict = None, queue_dir: str = None, wait: bool = True, timeout: float = None,
+           poll_sec: float = None) -> dict:
+    """提交一批；wait=True 时等服务写出 done/{id}.json 并返回其内容"""
+    dirs = queue_dirs(queue_dir)
+    job_id = new_job_id()
+    # 先写 .tmp 再改名：服务只会看到完整的任务文件
+    _write_json(os.path.join(dirs["inbox"], f"{job_id}.json"),
+                {"id": job_id, "config": config or {}, "submitted_at": time.time()})
+    if not wait:
+        return {"id": job_id, "status": "QUEUED"}
+
+    done = os.path.join(dirs["done"], f"{job_id}.json")
+    deadline = None if timeout is None else time.time() + timeout
+    while not os.path.exists(done):
+        if deadline is not None and time.time() > deadline:
+            raise TimeoutError(f"Job {job_id} not finished after {timeout}s")
+        time.sleep(POLL_SEC if poll_sec is None else poll_sec)
+    with open(done, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def stop(queue_dir: str = None):
+    with open(queue_dirs(queue_dir)["stop"], "w", encoding="utf-8"):
+        pass
+
+
+# =========================================================
+# 4) 命令行
+# =========================================================
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="FAERS decode daemon: warm worker pool fed from a job-queue directory")
+    ap.add_argument("--queue-dir", default=None, help="job-queue directory (default QUEUE_DIR)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("serve", help="start the warm pool and process submitted batches")
+    sp.add_argument("--processes", type=int, default=None, help="warm workers (default PROCESS_NUM / CPU count)")
+    sp.add_argument("--max-jobs", type=int, default=None, help="exit after this many batches")
+    bp = sub.add_parser("submit", help="queue one decode batch and (by default) wait for its result")
+    bp.add_argument("--set", action="append", metavar="KEY=VALUE", help="override a faers_decode_final setting")
+    bp.add_argument("--no-wait", action="store_true")
+    bp.add_argument("--timeout", type=float, default=None)
+    sub.add_parser("stop", help="ask a running daemon to exit after the current batch")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        with DecodeDaemon(args.processes) as daemon:
+            daemon.serve(args.queue_dir, max_jobs=args.max_jobs)
+        return 0
+    if args.cmd == "stop":
+        stop(args.queue_dir)
+        return 0
+
+    result = submit(faers_config.parse_set(args.set), args.queue_dir, wait=not args.no_wait, timeout=args.timeout)
+    print(json.dumps({k: v for k, v in result.items() if k != "traceback"}, ensure_ascii=False, indent=2))
+    return 0 if result["status"] in ("OK", "QUEUED") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,35 +1,64 @@
 import os
 import sys
 import gc
+import io
 import csv
+import gzip
 import json
+import mmap
 import time
 import glob
+import queue
+import shutil
+import hashlib
 import logging
 import traceback
+import zipfile
+import warnings
 from datetime import datetime
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
 from multiprocessing import get_context, current_process
 
+import numpy as np
 import pandas as pd
 
+import faers_config
+import faers_drugnorm
+import faers_report
+import faers_schema
+
 
 # =========================================================
 # 0) 用户可配置项（你主要改这里）
 # =========================================================
 
-BASE_DIR = r"C:\Users\venture\first\FAERS_DATA"
+# 数据根目录：环境变量 FAERS_BASE_DIR（faers_cli --base-dir 会设置），未设置时为默认目录
+BASE_DIR = faers_config.base_dir()
 
 # 输入根目录：UNZIP_DATA\{year}\{Q1..Q4}\ascii\*.txt
 INPUT_ROOT = os.path.join(BASE_DIR, "UNZIP_DATA")
 
+# 输入来源："unzip"（扫描 UNZIP_DATA 下已解压的 txt）/ "zip"（直接流式读取 RAW_ZIP 下 ZIP 里的 ascii/*.txt，不落地解压）
+INPUT_SOURCE = "unzip"
+INPUT_SOURCES = ("unzip", "zip")
+
+# ZIP 根目录：RAW_ZIP\{year}\{Q1..Q4}\*.zip（download_faers_ascii.py 的保存结构）
+RAW_ZIP_ROOT = os.path.join(BASE_DIR, "RAW_ZIP")
+
 # 输出根目录：CSV_DATA\{year}\{Q1..Q4}\*.csv
 OUTPUT_ROOT = os.path.join(BASE_DIR, "CSV_DATA")
 
 # 日志根目录：LOGS\faers_decode\run_时间戳\
 LOG_ROOT = os.path.join(BASE_DIR, "LOGS", "faers_decode")
 
-# 是否跳过已存在的输出（建议 True，方便断点续跑）
+# 是否跳过已是最新的输出（建议 True，方便断点续跑）
+# 依据 OUTPUT_ROOT 下的清单：输入 size/mtime/快速哈希 + 配置指纹 + 输出大小都一致才跳过
 SKIP_EXISTING = True
+MANIFEST_NAME = "_decode_manifest.json"
+
+# 快速哈希：对输入文件头 / 中 / 尾各取这么多字节做 blake2b
+FAST_HASH_SAMPLE_BYTES = 1024 * 1024
 
 # 并行进程数：None 自动；或手动填 2/4/8
 PROCESS_NUM = None
@@ -38,22 +67,125 @@ PROCESS_NUM = None
 MAX_RETRIES = 3
 BASE_BACKOFF_SEC = 2
 
-# 大文件分块阈值与每块行数
+# 大文件分块阈值与每块行数（ADAPTIVE_CHUNKING 关闭、或拿不到内存信息时使用）
 CHUNK_THRESHOLD_MB = 300
 CHUNK_ROWS = 300_000
 
+# 自适应分块：按每个进程的内存预算逐文件决定 full / chunk 与每块行数。
+# 从文件头取样解析，测出 每行原始字节 / 每行内存，估算整表峰值，再扣掉进程当前 RSS；
+# MemoryError 后下一次尝试改用减半的块，而不是原样重来
+ADAPTIVE_CHUNKING = True
+
+# 每个进程的内存预算（MB）：None -> 物理内存 × MEMORY_BUDGET_FRACTION ÷ 进程数
+MEMORY_BUDGET_MB = None
+MEMORY_BUDGET_FRACTION = 0.6
+
+# 解析后 DataFrame 内存 × 该系数 = 单行峰值（清理 / 统一表头 / 写出时的临时副本）
+PEAK_MEMORY_FACTOR = 3.0
+
+# 取样字节数与每块行数上下限
+SAMPLE_BYTES = 1024 * 1024
+MIN_CHUNK_ROWS = 20_000
+MAX_CHUNK_ROWS = 2_000_000
+
+# 小文件免取样：大小 × 该膨胀上界 × PEAK_MEMORY_FACTOR 仍在预算内时直接 full
+# （取样解析的开销与解析整个小文件相当；FAERS 表解析后内存约为原始字节的 1.5–5 倍）
+SAMPLE_SKIP_EXPANSION = 10
+
+# 调度：按输入大小从大到小派发（最长任务优先，避免最后只剩一个进程在跑大文件）
+# 超过 CHUNK_THRESHOLD_MB 的文件按行对齐的字节区间拆成子任务，由多个进程并行解码后拼接
+SPLIT_LARGE_FILES = True
+SPLIT_PART_MB = 128
+
+# 大文件至少拆成几份：None -> 进程数（单个 DRUG / REAC 大表也能用满所有进程）
+SPLIT_MIN_PARTS = None
+
+# 同时在途的大任务（>= SPLIT_PART_MB）上限，防止多个大文件同时占满内存；None -> 进程数的一半
+MAX_LARGE_IN_FLIGHT = None
+
+# 解码结束后刷新 primaryid / caseid 索引（faers_index.py；按文件增量，未变的季度不重建）
+BUILD_INDEX = False
+
+# 解码结束后把输出增量装入本地 SQLite（faers_store.py；只装新增 / 变化的文件）
+BUILD_STORE = False
+
 # FAERS ASCII 常见设置
 INPUT_ENCODING = "latin1"
 DELIM = "$"
 
+# 解析引擎："c"（pandas C 引擎）/ "pyarrow" / "bytes"（手写 $ 分词）/ "python"（最慢）
+# 快速引擎拒绝某个文件时，该文件自动回退到 "python" 引擎
+PARSE_ENGINE = "c"
+PARSE_ENGINES = ("c", "pyarrow", "bytes", "python")
+
+# 分块模式下 pandas C 引擎会保留（截断）恰好落在块首的字段过多行，不按坏行丢弃：
+# 分块解析时 "c" 改用该引擎（"bytes" 与 C 引擎同样补齐短行、丢弃长行，输出一致；pyarrow 拒绝短行，不适用）
+C_CHUNK_ENGINE = "bytes"
+
+# bytes / pyarrow 引擎每次读取的字节块大小
+READ_BLOCK_BYTES = 64 * 1024 * 1024
+
+# 单遍扫描：解析器读入的同一批字节顺带做向量化扫描（行数 / 每行分隔符数 / 畸形行位置 / 是否以换行结尾），
+# 结果写入任务结果的 "scan"，并与输出行数交叉核对；开启后前置校验不再单独读文件头
+SCAN_INPUT = True
+
+# 每类畸形行（字段过多 / 过少）最多记录的行号个数
+MALFORMED_SAMPLE = 20
+
 # 你要处理的表（按前缀过滤）
-TABLE_PREFIXES = {"DEMO", "DRUG", "INDI", "OUTC", "REAC", "RPSR", "STAT", "THER"}
+TABLE_PREFIXES = set(faers_config.FAERS_TABLES)
+
+# 输出格式："csv"（UTF-8 CSV）/ "parquet"（zstd + 字典编码，按表类型化）
+OUTPUT_FORMAT = "csv"
+OUTPUT_FORMATS = ("csv", "parquet")
+PARQUET_COMPRESSION = "zstd"
+
+# CSV 写出方式："direct"：整个任务只开一次 tmp 文件（大写缓冲），按列数组直接拼出 UTF-8 行字节写入，
+#              输出与 to_csv 逐字节一致；"pandas"：逐块 DataFrame.to_csv(mode="a")（对照用）
+CSV_WRITER = "direct"
+CSV_WRITERS = ("direct", "pandas")
+WRITE_BUFFER_BYTES = 8 * 1024 * 1024
+# direct 每次渲染的行数（渲染结果在内存里整批写出）
+WRITE_BATCH_ROWS = 100_000
+
+# CSV 边写边压缩：None / "gzip"（输出 *.csv.gz）/ "zstd"（*.csv.zst，需安装 zstandard）；
+# 下游（faers_store / faers_signal / faers_dedup）按扩展名自动解压；压缩输出不建 faers_index 字节偏移索引
+CSV_COMPRESSION = None
+CSV_COMPRESSION_EXTS = {"gzip": ".gz", "zstd": ".zst"}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
 
 # 清理策略
 DROP_ALL_EMPTY_COLS = True
 STRIP_WHITESPACE = True
 FILL_NA_WITH_EMPTY = True
 
+# 紧凑内存表示：解析时即把代码类列读成 category，id / 整数列转 Int64，日期转 Int32（YYYYMMDD 原样数字，
+# 不补位，CSV 输出逐字不变）；转换失败（出现非纯数字）的列保持字符串。关闭则全部为字符串
+COMPACT_DTYPES = True
+
+# 按 faers_schema 的版本化登记表把各时期（AERS ISR/CASE、FAERS 2012Q4、2014Q3…）的列
+# 统一改名、重排为每张表一套规范列，缺失列补 ""；关闭则保留原始表头
+HARMONIZE_SCHEMA = True
+
+# DRUG 表药名规范化（faers_drugnorm.py）：在 drugname / prod_ai 后各追加一列 {列}_norm。
+# 规则只对不同的原始值运行；原始值 -> 规范名缓存在磁盘，所有 worker、所有运行共享
+NORMALIZE_DRUG_NAMES = True
+DRUG_NORM_COLUMNS = ("drugname", "prod_ai")
+
+# 规范化缓存文件（SQLite）；None -> OUTPUT_ROOT/_drugnorm_cache.sqlite
+DRUG_NORM_CACHE = None
+
+# 字符串驻留（CSV 输出）：高重复的字符串列（代码列、pt、药名…）在每个 worker 内按表维护一份跨块、跨任务的字典，
+# 写出前该列换成 int32 编码 + 字典里共享的字符串对象（写 CSV 时不再为每行新建字符串，峰值内存更低）
+INTERN_STRINGS = True
+
+# 单列字典上限（条）；超过后该列在本文件内不再驻留，下一个文件开始时字典清空重建
+INTERN_MAX_ENTRIES = 200_000
+
+# 同时写出 {输出名}.dict.npz 旁路文件：驻留列的逐行编码 + 字典，下游可不解析字符串直接还原为 category
+DICT_SIDECAR = False
+
 
 # =========================================================
 # 1) 运行目录（每次运行单独目录，避免日志/报告混乱）
@@ -61,16 +193,50 @@ FILL_NA_WITH_EMPTY = True
 
 RUN_TS = datetime.now().strftime("%Y%m%d_%H%M%S")
 RUN_DIR = os.path.join(LOG_ROOT, f"run_{RUN_TS}")
-os.makedirs(RUN_DIR, exist_ok=True)
+
+
+# =========================================================
+# 1.1) 运行时覆盖配置（faers_cli 的参数 / 配置文件、faers_daemon 的批次配置）
+# =========================================================
+
+# configure() 覆盖过的配置项；随 settings 带给 worker，spawn 出来的 worker 里同样生效
+CONFIG_OVERRIDES = {}
+
+
+def configure(values: dict, fixed=()) -> dict:
+    """
+    覆盖本模块的配置项（名字须已存在），返回 restore_config 用的旧状态；
+    只改 LOG_ROOT 时 RUN_DIR 随之移到新的 LOG_ROOT 下（RUN_DIR 在 import 时按默认 LOG_ROOT 算好）
+    """
+    global CONFIG_OVERRIDES, RUN_DIR
+    previous = CONFIG_OVERRIDES
+    saved = faers_config.apply_settings(sys.modules[__name__], values, fixed)
+    if "LOG_ROOT" in (values or {}) and "RUN_DIR" not in values:
+        saved.setdefault("RUN_DIR", RUN_DIR)
+        RUN_DIR = os.path.join(LOG_ROOT, f"run_{RUN_TS}")
+    CONFIG_OVERRIDES = {**previous, **(values or {})}
+    return {"values": saved, "overrides": previous}
+
+
+def restore_config(state: dict):
+    global CONFIG_OVERRIDES
+    faers_config.restore_settings(sys.modules[__name__], state["values"])
+    CONFIG_OVERRIDES = state["overrides"]
 
 
 # =========================================================
 # 2) 主进程 logger
 # =========================================================
 
-def build_main_logger() -> logging.Logger:
+def build_main_logger(to_file: bool = True) -> logging.Logger:
+    # 运行目录在这里创建，import 本模块（benchmark / 测试）不会产生目录；to_file=False（dry run）只输出到控制台
+    if to_file:
+        os.makedirs(RUN_DIR, exist_ok=True)
+
     logger = logging.getLogger("MAIN")
     logger.setLevel(logging.INFO)
+    for h in logger.handlers:
+        h.close()
     logger.handlers.clear()
 
     fmt = logging.Formatter("%(asctime)s [%(levelname)s] [MAIN] %(message)s")
@@ -79,26 +245,77 @@ def build_main_logger() -> logging.Logger:
     sh.setFormatter(fmt)
     logger.addHandler(sh)
 
-    fh = logging.FileHandler(os.path.join(RUN_DIR, f"main_{RUN_TS}.log"), encoding="utf-8")
-    fh.setFormatter(fmt)
-    logger.addHandler(fh)
+    if to_file:
+        fh = logging.FileHandler(os.path.join(RUN_DIR, f"main_{RUN_TS}.log"), encoding="utf-8")
+        fh.setFormatter(fmt)
+        logger.addHandler(fh)
 
     return logger
 
 
+# =========================================================
+# 2.1) 任务遥测：阶段耗时 + 峰值 RSS（worker 内当前任务）
+# =========================================================
+
+class TaskTelemetry:
+    """
+    一个任务的阶段耗时（validate / sample / parse / clean / write / rename；同名阶段累加，
+    分块模式下即各块合计），以及各阶段结束时采样到的最大 RSS
+    """
+
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.peak_rss = current_rss_bytes()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+            self.peak_rss = max(self.peak_rss, current_rss_bytes())
+
+    def checkpoint(self) -> dict:
+        return dict(self.phases)
+
+    def restore(self, phases: dict):
+        """失败的尝试不计入阶段耗时（其代价记在 retry_seconds）"""
+        self.phases = defaultdict(float, phases)
+
+    def as_dict(self) -> dict:
+        return {k: round(v, 4) for k, v in self.phases.items()}
+
+
+# 当前任务的遥测；None 时 phase() 不计时（测试 / benchmark 直接调用解码函数）
+TASK_TELEMETRY = None
+
+
+def phase(name: str):
+    return TASK_TELEMETRY.phase(name) if TASK_TELEMETRY is not None else nullcontext()
+
+
 # =========================================================
 # 3) 前置校验
 # =========================================================
 
-def basic_file_validate(path: str) -> (bool, str):
+def basic_file_validate(path: str, member: str = None, check_head: bool = True) -> (bool, str):
+    """
+    存在 / 非空检查；check_head=True 时另读前 4KB 看有没有 '$'。
+    SCAN_INPUT 开启时由解析时的单遍扫描负责表头 / 行的检查（check_head=False，不为此多开一次文件）
+    """
     if not os.path.exists(path):
         return False, "NOT_FOUND"
+    if member is not None:
+        return _zip_member_validate(path, member, check_head)
     try:
         size = os.path.getsize(path)
     except OSError:
         return False, "CANNOT_STAT"
     if size == 0:
         return False, "EMPTY_FILE"
+    if not check_head:
+        return True, "OK"
 
     # 轻量检查：前 4KB 是否出现 '$'（只 warning，不作为硬失败）
     try:
@@ -112,41 +329,619 @@ def basic_file_validate(path: str) -> (bool, str):
     return True, "OK"
 
 
+def _zip_member_validate(path: str, member: str, check_head: bool = True) -> (bool, str):
+    try:
+        with zipfile.ZipFile(path) as zf:
+            info = zf.getinfo(member)
+            if info.file_size == 0:
+                return False, "EMPTY_FILE"
+            if not check_head:
+                return True, "OK"
+            with zf.open(info) as f:
+                head = f.read(4096)
+    except KeyError:
+        return False, "MEMBER_NOT_FOUND"
+    except (OSError, zipfile.BadZipFile):
+        return False, "BAD_ZIP"
+    except Exception:
+        return False, "CANNOT_READ_HEAD"
+    if b"$" not in head:
+        return True, "NO_DELIM_IN_HEAD_WARN"
+    return True, "OK"
+
+
 # =========================================================
-# 4) pandas read_csv 兼容封装
+# 4) 解析引擎封装（c / pyarrow / bytes / python）
 # =========================================================
 
-def read_faers_full(path: str) -> pd.DataFrame:
-    common_kwargs = dict(
+def _read_csv_kwargs(engine: str) -> dict:
+    return dict(
         sep=DELIM,
         encoding=INPUT_ENCODING,
         dtype=str,
-        engine="python",
+        engine=engine,
         quoting=csv.QUOTE_NONE,
         keep_default_na=False,
         na_values=[],
     )
+
+
+def _pandas_read(path: str, engine: str, **extra):
+    common_kwargs = _read_csv_kwargs(engine)
+    common_kwargs.update(extra)
     try:
         return pd.read_csv(path, encoding_errors="replace", on_bad_lines="warn", **common_kwargs)
     except TypeError:
         return pd.read_csv(path, **common_kwargs)
 
 
-def read_faers_chunks(path: str):
-    common_kwargs = dict(
-        sep=DELIM,
+def _header_names(header_line: str) -> list:
+    """与 pandas 一致的表头处理：空列名 -> Unnamed: i，重复列名 -> name.1 / name.2 ..."""
+    names = []
+    counts = {}
+    for i, raw in enumerate(header_line.split(DELIM)):
+        name = raw if raw != "" else f"Unnamed: {i}"
+        cur = counts.get(name, 0)
+        while cur > 0:
+            counts[name] = cur + 1
+            name = f"{name}.{cur}"
+            cur = counts.get(name, 0)
+        counts[name] = cur + 1
+        names.append(name)
+    return names
+
+
+def _warn_bad_line(line_no: int, expected: int, saw: int):
+    warnings.warn(
+        f"Skipping line {line_no}: expected {expected} fields, saw {saw}",
+        pd.errors.ParserWarning,
+        stacklevel=3,
+    )
+
+
+def _fields_to_frame(fields: list, names: list) -> pd.DataFrame:
+    """fields 为按行展开的扁平字段列表（每行恰好 len(names) 个），按步长切成列"""
+    ncol = len(names)
+    data = {i: pd.Series(np.array(fields[i::ncol], dtype=object), dtype=str) for i in range(ncol)}
+    return pd.DataFrame(data).set_axis(names, axis=1)
+
+
+def _iter_bytes_frames(f, chunk_rows: int):
+    """
+    手写 $ 分词器：从二进制流按字节块读取，在最后一个换行处切分。
+    规整行拼成一个大字符串后只做一次 split，再按步长切列（避免逐行建 list）。
+    行为对齐 pandas(QUOTE_NONE)：空行跳过，短行补空值，长行 warn 后丢弃。
+    """
+    header = f.readline().decode(INPUT_ENCODING, errors="replace").rstrip("\r\n")
+    names = _header_names(header)
+    ncol = len(names)
+    want = ncol - 1
+
+    pending = []
+    pending_rows = 0
+    line_no = 1
+    rest = b""
+    emitted = False
+    while True:
+        block = f.read(READ_BLOCK_BYTES)
+        if block:
+            block = rest + block
+            cut = block.rfind(b"\n")
+            if cut < 0:
+                rest = block
+                continue
+            text = block[:cut].decode(INPUT_ENCODING, errors="replace")
+            rest = block[cut + 1:]
+        else:
+            text = rest.decode(INPUT_ENCODING, errors="replace")
+            rest = b""
+
+        lines = text.split("\n") if text else []
+        good = []
+        for line in lines:
+            line_no += 1
+            if line.endswith("\r"):
+                line = line[:-1]
+            if not line:
+                continue
+            n = line.count(DELIM)
+            if n < want:
+                line += DELIM * (want - n)
+            elif n > want:
+                _warn_bad_line(line_no, ncol, n + 1)
+                continue
+            good.append(line)
+
+        while good:
+            take = len(good) if not chunk_rows else min(len(good), chunk_rows - pending_rows)
+            pending.append(good[:take])
+            pending_rows += take
+            good = good[take:]
+            if chunk_rows and pending_rows >= chunk_rows:
+                yield _fields_to_frame(DELIM.join(l for part in pending for l in part).split(DELIM), names)
+                emitted = True
+                pending = []
+                pending_rows = 0
+
+        if not block:
+            break
+
+    if pending_rows or not emitted:
+        rows = [l for part in pending for l in part]
+        fields = DELIM.join(rows).split(DELIM) if rows else []
+        yield _fields_to_frame(fields, names)
+
+
+def _pyarrow_options(path: str, member: str = None):
+    import pyarrow.csv as pacsv
+
+    with _open_source(path, member=member) as f:
+        header = f.readline().decode(INPUT_ENCODING, errors="replace").rstrip("\r\n")
+    names = _header_names(header)
+    ncol = len(names)
+
+    def on_invalid_row(row):
+        # 长行：与 pandas 一致，warn 后跳过；短行 pyarrow 无法补齐 -> 报错并回退 python
+        if row.actual_columns is not None and row.actual_columns > ncol:
+            _warn_bad_line(row.number or -1, ncol, row.actual_columns)
+            return "skip"
+        return "error"
+
+    read_opts = pacsv.ReadOptions(
+        column_names=names,
+        skip_rows=1,
         encoding=INPUT_ENCODING,
-        dtype=str,
-        engine="python",
-        quoting=csv.QUOTE_NONE,
-        keep_default_na=False,
-        na_values=[],
-        chunksize=CHUNK_ROWS,
+        block_size=min(READ_BLOCK_BYTES, 1 << 30),
     )
+    parse_opts = pacsv.ParseOptions(
+        delimiter=DELIM,
+        quote_char=False,
+        double_quote=False,
+        escape_char=False,
+        newlines_in_values=False,
+        ignore_empty_lines=True,
+        invalid_row_handler=on_invalid_row,
+    )
+    import pyarrow as pa
+    convert_opts = pacsv.ConvertOptions(
+        column_types={n: pa.string() for n in names},
+        null_values=[],
+        strings_can_be_null=False,
+        quoted_strings_can_be_null=False,
+    )
+    return names, read_opts, parse_opts, convert_opts
+
+
+def _arrow_to_frame(table, names: list) -> pd.DataFrame:
+    df = table.to_pandas()
+    df.columns = names
+    return df
+
+
+def _read_pyarrow_full(src, path: str, member: str = None) -> pd.DataFrame:
+    import pyarrow.csv as pacsv
+
+    names, read_opts, parse_opts, convert_opts = _pyarrow_options(path, member)
+    table = pacsv.read_csv(src, read_options=read_opts, parse_options=parse_opts, convert_options=convert_opts)
+    return _arrow_to_frame(table, names)
+
+
+def _iter_pyarrow_frames(src, path: str, chunk_rows: int, member: str = None):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    names, read_opts, parse_opts, convert_opts = _pyarrow_options(path, member)
+    reader = pacsv.open_csv(src, read_options=read_opts, parse_options=parse_opts, convert_options=convert_opts)
+
+    pending = []
+    pending_rows = 0
+    emitted = False
+    for batch in reader:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= chunk_rows:
+            table = pa.Table.from_batches(pending, schema=reader.schema)
+            yield _arrow_to_frame(table.slice(0, chunk_rows), names)
+            emitted = True
+            table = table.slice(chunk_rows)
+            pending = table.to_batches()
+            pending_rows = table.num_rows
+
+    if pending_rows or not emitted:
+        table = pa.Table.from_batches(pending, schema=reader.schema)
+        yield _arrow_to_frame(table, names)
+
+
+class _ByteRangeStream(io.RawIOBase):
+    """
+    只读流：文件表头行 + [start, end) 区间的字节，供各解析引擎把一个区间当成完整文件读。
+    通过 mmap 直接从页缓存拷到解析器的缓冲区，不经过额外的 read() 中间副本。
+    """
+
+    def __init__(self, path: str, start: int, end: int):
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        nl = self._mm.find(b"\n")
+        header_end = len(self._mm) if nl < 0 else nl + 1
+        self._segments = [(0, header_end), (start, end)]
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._segments:
+            pos, end = self._segments[0]
+            if pos >= end:
+                self._segments.pop(0)
+                continue
+            k = min(len(b), end - pos)
+            b[:k] = self._view[pos:pos + k]
+            self._segments[0] = (pos + k, end)
+            return k
+        return 0
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+            self._mm.close()
+            self._f.close()
+        super().close()
+
+
+class _ZipMemberStream(io.RawIOBase):
+    """ZIP 内单个成员的只读解压流（边读边解压，不落地）；关闭时一并关闭 ZipFile"""
+
+    def __init__(self, path: str, member: str):
+        self._zf = zipfile.ZipFile(path)
+        self._f = self._zf.open(member)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._f.readinto(b)
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+            self._zf.close()
+        super().close()
+
+
+def _open_source(path: str, byte_range=None, member: str = None, scanner=None):
+    """scanner 不为 None 时，解析器读到的每一段字节都先经过 scanner.feed（不额外读一遍文件）"""
+    if member is not None:
+        if byte_range is not None:
+            raise ValueError("byte_range is not supported for zip members")
+        raw = _ZipMemberStream(path, member)
+    elif byte_range is not None:
+        raw = _ByteRangeStream(path, *byte_range)
+    elif scanner is None:
+        return open(path, "rb")
+    else:
+        raw = io.FileIO(path, "rb")
+    if scanner is not None:
+        raw = _ScanningStream(raw, scanner)
+    return io.BufferedReader(raw, buffer_size=1024 * 1024)
+
+
+def _drain(src, scanner):
+    """解析器没读到末尾时（如 pyarrow 遇到错误前）把剩余字节读完，保证扫描统计覆盖整个输入"""
+    if scanner is not None:
+        while src.read(READ_BLOCK_BYTES):
+            pass
+
+
+def read_faers_full(path: str, engine: str = None, byte_range=None, member: str = None,
+                    compact: bool = None, scanner=None) -> pd.DataFrame:
+    """
+    byte_range=(start, end) 时只解析该区间（区间须按行对齐，表头取自文件首行）；
+    member 不为空时 path 是 ZIP，解析其中的该成员；
+    compact（默认 COMPACT_DTYPES）：按表的类型表返回紧凑 dtype，见 compact_frame；
+    scanner（LineScanner）：解析的同时扫描同一批字节，统计见 LineScanner.result。
+    """
+    engine = engine or PARSE_ENGINE
+    table = _compact_table(path, member, compact)
+    with _open_source(path, byte_range, member, scanner) as src:
+        try:
+            if engine == "bytes":
+                df = next(_iter_bytes_frames(src, chunk_rows=0))
+            elif engine == "pyarrow":
+                df = _read_pyarrow_full(src, path, member)
+            else:
+                df = _pandas_read(src, engine, **_parse_dtype_kwargs(table))
+        finally:
+            _drain(src, scanner)
+    return compact_frame(df, table) if table else df
+
+
+def chunk_engine(engine: str = None) -> str:
+    """分块解析实际使用的引擎（"c" -> C_CHUNK_ENGINE，见配置区说明）"""
+    engine = engine or PARSE_ENGINE
+    return C_CHUNK_ENGINE if engine == "c" else engine
+
+
+def read_faers_chunks(path: str, engine: str = None, chunk_rows: int = None, byte_range=None, member: str = None,
+                      compact: bool = None, scanner=None):
+    engine = chunk_engine(engine)
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    table = _compact_table(path, member, compact)
+    with _open_source(path, byte_range, member, scanner) as src:
+        if engine == "bytes":
+            frames = _iter_bytes_frames(src, chunk_rows)
+        elif engine == "pyarrow":
+            frames = _iter_pyarrow_frames(src, path, chunk_rows, member)
+        else:
+            frames = _pandas_read(src, engine, chunksize=chunk_rows, **_parse_dtype_kwargs(table))
+        try:
+            for df in frames:
+                yield compact_frame(df, table) if table else df
+            _drain(src, scanner)
+        finally:
+            frames.close()
+
+
+# =========================================================
+# 4.2) 单遍扫描：行数 / 每行分隔符 / 畸形行（与解析器共用同一读缓冲）
+# =========================================================
+
+class LineScanner:
+    """
+    逐块喂入原始字节（跨块的半行带到下一块），numpy 向量化统计每行的分隔符数。
+    首行为表头，其分隔符数即期望值；与 pandas(QUOTE_NONE) 的处理对应：
+    空行跳过、字段过少的行补空（short）、字段过多的行丢弃（long）。
+    行号与 pandas 的 "Skipping line N" 一致（表头为第 1 行）。
+    cr_breaks：孤立的 \r（后面不是 \n）也算换行，与 c / python / pyarrow 引擎一致；
+    "bytes" 引擎只按 \n 分行（\r 留在字段里），见 scan_cr_breaks。
+    """
+
+    def __init__(self, delim: str = None, sample: int = None, cr_breaks: bool = False):
+        self.delim = (delim or DELIM).encode(INPUT_ENCODING)[0]
+        self.sample = MALFORMED_SAMPLE if sample is None else sample
+        self.cr_breaks = cr_breaks
+        self.expected = None        # 表头分隔符数
+        self.header_has_delim = False
+        self.physical_lines = 0     # 含表头、空行
+        self.data_lines = 0
+        self.blank_lines = 0
+        self.long_rows = 0
+        self.short_rows = 0
+        self.long_lines = []
+        self.short_lines = []
+        self.bytes = 0
+        self.header_bytes = 0
+        self._partial_delims = 0
+        self._partial_len = 0
+        self._last_byte = -1
+
+    def feed(self, block):
+        arr = np.frombuffer(block, dtype=np.uint8)
+        if arr.size == 0:
+            return
+        self.bytes += arr.size
+        ends = arr == 10
+        if self.cr_breaks:
+            if self._last_byte == 13 and arr[0] != 10:
+                # 上一块末尾的 \r 是孤立的：半行到此结束
+                if self.expected is None:
+                    self.header_bytes = self._partial_len
+                self._count(np.array([self._partial_delims]), np.array([self._partial_len == 1]))
+                self._partial_delims = self._partial_len = 0
+                self._last_byte = -1
+            bare = arr == 13
+            bare[:-1] &= arr[1:] != 10
+            bare[-1] = False        # 块尾的 \r 要看下一块首字节
+            ends |= bare
+        nl = np.flatnonzero(ends)
+        dl = np.flatnonzero(arr == self.delim)
+        if nl.size == 0:
+            self._partial_delims += dl.size
+            self._partial_len += arr.size
+            self._last_byte = int(arr[-1])
+            return
+
+        # 每个完整行的分隔符数与长度（首行接上一块留下的半行）
+        per_line = np.diff(np.searchsorted(dl, nl), prepend=0)
+        per_line[0] += self._partial_delims
+        lengths = np.diff(nl, prepend=-1) - 1
+        lengths[0] += self._partial_len
+        has_cr = np.zeros(nl.size, dtype=bool)
+        prev = nl - 1
+        inside = prev >= 0
+        has_cr[inside] = arr[prev[inside]] == 13
+        if not inside[0]:
+            has_cr[0] = self._last_byte == 13
+        has_cr &= arr[nl] == 10
+        if self.expected is None:
+            self.header_bytes = int(lengths[0]) + 1
+        self._count(per_line, (lengths - has_cr) == 0)
+
+        tail = arr[nl[-1] + 1:]
+        self._partial_delims = int(np.count_nonzero(tail == self.delim))
+        self._partial_len = tail.size
+        self._last_byte = int(arr[-1])
+
+    def _count(self, per_line, blank):
+        base = self.physical_lines
+        self.physical_lines += per_line.size
+        if self.expected is None:
+            self.expected = int(per_line[0])
+            self.header_has_delim = self.expected > 0
+            per_line, blank, base = per_line[1:], blank[1:], base + 1
+        data = ~blank
+        self.blank_lines += int(np.count_nonzero(blank))
+        self.data_lines += int(np.count_nonzero(data))
+        for attr, mask in (("long", data & (per_line > self.expected)), ("short", data & (per_line < self.expected))):
+            idx = np.flatnonzero(mask)
+            setattr(self, f"{attr}_rows", getattr(self, f"{attr}_rows") + idx.size)
+            found = getattr(self, f"{attr}_lines")
+            if len(found) < self.sample:
+                found.extend(int(i) + base + 1 for i in idx[:self.sample - len(found)])
+
+    def result(self) -> dict:
+        """扫描统计；未以换行结尾的最后一行按一行计（ends_with_newline=False 常意味着文件被截断）"""
+        ends_with_newline = self._last_byte == 10 or (self.cr_breaks and self._last_byte == 13) or self.bytes == 0
+        if self._partial_len:
+            cr = self._last_byte == 13
+            self._count(np.array([self._partial_delims]), np.array([self._partial_len - cr == 0]))
+            self._partial_len = self._partial_delims = 0
+        return {
+            "bytes": self.bytes,
+            "header_bytes": self.header_bytes,
+            "physical_lines": self.physical_lines,
+            "data_lines": self.data_lines,
+            "blank_lines": self.blank_lines,
+            "expected_fields": (self.expected or 0) + 1,
+            "long_rows": self.long_rows,
+            "short_rows": self.short_rows,
+            "long_lines": self.long_lines,
+            "short_lines": self.short_lines,
+            "expected_rows": self.data_lines - self.long_rows,
+            "header_has_delim": self.header_has_delim,
+            "ends_with_newline": ends_with_newline,
+        }
+
+
+def scan_cr_breaks(engine: str = None) -> bool:
+    """该引擎是否把孤立的 \r 当换行（LineScanner 须按同一规则分行，行数才可核对）"""
+    return (engine or PARSE_ENGINE) in ("c", "python", "pyarrow")
+
+
+def merge_scans(scans: list) -> dict:
+    """
+    同一文件各区间（按 part 顺序）的扫描结果 -> 整文件结果：每个区间都带一遍表头，
+    区间内行号换算为文件行号（偏移 = 之前各区间的行数，不含各自的表头）
+    """
+    merged = dict(scans[0])
+    merged["long_lines"], merged["short_lines"] = [], []
+    offset = 0
+    for scan in scans:
+        for kind in ("long_lines", "short_lines"):
+            room = MALFORMED_SAMPLE - len(merged[kind])
+            merged[kind] += [offset + line for line in scan[kind][:max(0, room)]]
+        offset += scan["physical_lines"] - 1
+    for key in ("data_lines", "blank_lines", "long_rows", "short_rows", "expected_rows"):
+        merged[key] = sum(scan[key] for scan in scans)
+    merged["physical_lines"] = offset + 1
+    merged["bytes"] = sum(scan["bytes"] for scan in scans) - scans[0]["header_bytes"] * (len(scans) - 1)
+    merged["ends_with_newline"] = scans[-1]["ends_with_newline"]
+    return merged
+
+
+class _ScanningStream(io.RawIOBase):
+    """把底层只读流读到的字节原样交给解析器，同时喂给 LineScanner"""
+
+    def __init__(self, raw, scanner: LineScanner):
+        self._raw = raw
+        self._scanner = scanner
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._raw.readinto(b)
+        if n:
+            self._scanner.feed(memoryview(b)[:n])
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+
+# =========================================================
+# 4.1) 紧凑 dtype：代码列 category / id 与整数列 Int64 / 日期 Int32
+# =========================================================
+
+# 低基数代码列（按规范列名；AERS 旧名经 faers_schema 别名反查）
+TABLE_CATEGORY_COLUMNS = {
+    "DEMO": {"i_f_code", "rept_cod", "age_cod", "age_grp", "sex", "e_sub", "wt_cod", "to_mfr", "occp_cod",
+             "reporter_country", "occr_country", "mfr_sndr", "image", "confid"},
+    "DRUG": {"role_cod", "route", "val_vbm", "dechal", "rechal", "cum_dose_unit", "dose_unit", "dose_form",
+             "dose_freq"},
+    "INDI": set(),
+    "OUTC": {"outc_cod"},
+    "REAC": {"drug_rec_act"},
+    "RPSR": {"rpsr_cod"},
+    "STAT": {"stat_cod"},
+    "THER": {"dur_cod"},
+}
+
+
+def _compact_table(path: str, member: str, compact: bool):
+    """需要紧凑 dtype 时返回表名，否则 None"""
+    if not (COMPACT_DTYPES if compact is None else compact):
+        return None
+    table = table_of(os.path.basename(member or path))
+    return table if table in TABLE_CATEGORY_COLUMNS else None
+
+
+def _parse_dtype_kwargs(table) -> dict:
+    """pandas 引擎：代码列在解析时直接建成 category（不先生成整列 Python 字符串）"""
+    if not table:
+        return {}
+    names = set()
+    aliases = faers_schema.TABLE_SCHEMAS.get(table, {}).get("aliases", {})
+    for col in TABLE_CATEGORY_COLUMNS[table]:
+        names.update({col, col.upper()})
+        for raw, canon in aliases.items():
+            if canon == col:
+                names.update({raw, raw.upper()})
+    return {"dtype": defaultdict(lambda: str, {n: "category" for n in names})}
+
+
+_PLAIN_INT_RE = r"^(0|[1-9][0-9]*)$"
+
+
+def _to_nullable_int(col: pd.Series, dtype: str):
+    """
+    非空值全部为不带前导零的十进制数字（转整数后写回文本逐字不变）-> Int64 / Int32，否则返回 None。
+    有 pyarrow 时用 Arrow 计算核（正则校验 + cast，约为 pd.to_numeric 的 8 倍速）。
+    """
     try:
-        return pd.read_csv(path, encoding_errors="replace", on_bad_lines="warn", **common_kwargs)
-    except TypeError:
-        return pd.read_csv(path, **common_kwargs)
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        s = col.fillna("")
+        ok = (s == "") | (s.str.isdigit() & (~s.str.startswith("0") | (s.str.len() == 1)))
+        if not ok.all():
+            return None
+        return pd.to_numeric(s.replace("", None), errors="coerce").astype(dtype)
+
+    arr = pa.array(col, type=pa.string(), from_pandas=True)
+    empty = pc.fill_null(pc.equal(arr, ""), True)
+    if not pc.all(pc.or_(empty, pc.match_substring_regex(arr, _PLAIN_INT_RE))).as_py():
+        return None
+    target = pa.int64() if dtype == "Int64" else pa.int32()
+    ints = pc.cast(pc.if_else(empty, pa.scalar(None, pa.string()), arr), target)
+    out = ints.to_pandas(types_mapper={target: pd.Int64Dtype() if dtype == "Int64" else pd.Int32Dtype()}.get)
+    out.index = col.index
+    return out
+
+
+def compact_frame(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """
+    id / 整数列 -> Int64，日期列 -> Int32（YYYYMMDD / YYYYMM / YYYY 原样），代码列 -> category。
+    只转换能无损往返文本的列；任何一个非空值不是纯数字时该列保持字符串。
+    整列只有空串（可夹杂短行补的 NaN）时也保持字符串：转成 Int 后全为 <NA>，
+    clean_df 会把它当全空列删掉，而字符串路径保留该列（如全空的 event_dt）。
+    """
+    for i, name in enumerate(df.columns):
+        col = df.iloc[:, i]
+        canon = faers_schema.canonical_name(table, name)
+        kind = column_kind(table, canon)
+        if kind in ("int64", "date"):
+            if not pd.api.types.is_string_dtype(col.dtype):
+                continue
+            num = _to_nullable_int(col, "Int64" if kind == "int64" else "Int32")
+            if num is None or (not num.notna().any() and col.notna().any()):
+                continue
+            df.isetitem(i, num)
+        elif canon in TABLE_CATEGORY_COLUMNS.get(table, ()) and not isinstance(col.dtype, pd.CategoricalDtype):
+            df.isetitem(i, col.astype("category"))
+    return df
 
 
 # =========================================================
@@ -154,59 +949,707 @@ def read_faers_chunks(path: str):
 # =========================================================
 
 def clean_df(df: pd.DataFrame) -> pd.DataFrame:
-    if DROP_ALL_EMPTY_COLS:
-        df = df.dropna(axis=1, how="all")
-    if FILL_NA_WITH_EMPTY:
-        df = df.fillna("")
-    if STRIP_WHITESPACE:
-        df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+    """
+    列级向量化清理：删全空列 -> fillna("") -> 去首尾空白。
+    逐列原地替换（不再逐单元格调用 Python 函数，也不复制整张表）；
+    输出与旧版 applymap(str.strip) 完全一致。
+    """
+    if DROP_ALL_EMPTY_COLS and df.shape[1]:
+        empty = df.isna().all(axis=0).to_numpy()
+        if empty.any():
+            df = df.iloc[:, ~empty]
+
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            df.isetitem(i, _clean_categorical(col))
+            continue
+        if not pd.api.types.is_string_dtype(col.dtype):
+            # 紧凑 dtype 的 Int64 / Int32：缺失保持 <NA>（写出时即为空串），无需 strip
+            continue
+        changed = False
+        if FILL_NA_WITH_EMPTY and col.hasnans:
+            col = col.fillna("")
+            changed = True
+        if STRIP_WHITESPACE:
+            col = col.str.strip()
+            changed = True
+        if changed:
+            df.isetitem(i, col)
     return df
 
 
+def _clean_categorical(col: pd.Series) -> pd.Series:
+    """category 列只处理类别表（通常几十个值），不逐行处理"""
+    if STRIP_WHITESPACE:
+        cats = col.cat.categories
+        stripped = cats.str.strip()
+        if not stripped.equals(cats):
+            if stripped.is_unique:
+                col = col.cat.rename_categories(stripped)
+            else:
+                col = col.astype(str).where(col.notna()).str.strip().astype("category")
+    if FILL_NA_WITH_EMPTY and col.hasnans:
+        if "" not in col.cat.categories:
+            col = col.cat.add_categories("")
+        col = col.fillna("")
+    return col
+
+
 # =========================================================
 # 6) 安全输出（tmp -> replace）
 # =========================================================
 
-def atomic_write_csv(df: pd.DataFrame, out_path: str):
+def output_suffix(output_format: str, compression: str = None) -> str:
+    """输出扩展名：.csv / .csv.gz / .csv.zst / .parquet"""
+    if output_format == "parquet":
+        return ".parquet"
+    return ".csv" + (CSV_COMPRESSION_EXTS[compression] if compression else "")
+
+
+# 下游识别的输出扩展名（长的在前）
+OUTPUT_SUFFIXES = (".csv.gz", ".csv.zst", ".csv", ".parquet")
+
+
+def split_output_name(name: str) -> (str, str):
+    """"DRUG24Q1.csv.gz" -> ("DRUG24Q1", ".csv.gz")；不认识的扩展名按 os.path.splitext"""
+    for suffix in OUTPUT_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)], suffix
+    return os.path.splitext(name)
+
+
+def csv_compression_of(path: str):
+    """按扩展名判断 CSV 压缩方式（None = 不压缩）"""
+    for name, ext in CSV_COMPRESSION_EXTS.items():
+        if path.endswith(".csv" + ext):
+            return name
+    return None
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("CSV_COMPRESSION='zstd' requires the zstandard package (pip install zstandard)") from None
+    return zstandard
+
+
+def open_compressed(raw, compression: str):
+    """在已打开的二进制句柄外套一层流式压缩器；关闭压缩器不关闭 raw"""
+    if compression == "gzip":
+        return gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=GZIP_LEVEL, mtime=0)
+    if compression == "zstd":
+        return _zstandard().ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=False)
+    raise ValueError(f"CSV_COMPRESSION must be one of {(None,) + tuple(CSV_COMPRESSION_EXTS)}, got {compression!r}")
+
+
+def open_output_text(path: str):
+    """读 CSV 输出（按扩展名透明解压）"""
+    compression = csv_compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    if compression == "zstd":
+        return _zstandard().open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+# ---------- direct CSV：列数组 -> 行字节 ----------
+
+# QUOTE_MINIMAL：含分隔符、引号或换行的字段才加引号（与 csv 模块 / to_csv 相同）
+_CSV_QUOTE_RE = r'[,"\r\n]'
+
+
+def escape_csv_fields(arr):
+    """Arrow large_string 数组按 QUOTE_MINIMAL 转义（缺失保持 null）"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    need = pc.match_substring_regex(arr, _CSV_QUOTE_RE)
+    if not pc.any(need).as_py():
+        return arr
+    quote = pa.scalar('"', pa.large_string())
+    quoted = pc.binary_join_element_wise(quote, pc.replace_substring(arr, '"', '""'), quote,
+                                         pa.scalar("", pa.large_string()))
+    return pc.if_else(need, quoted, arr)
+
+
+def _python_fields(col: pd.Series) -> list:
+    """其余 dtype（浮点 / 布尔 / 混合 object）：与 to_csv 相同的 str()，缺失为空串"""
+    return ["" if v is None or (not isinstance(v, str) and pd.isna(v)) else str(v) for v in col.astype(object)]
+
+
+def _arrow_fields(col: pd.Series, escaped_categories=None):
+    """一列 -> 已转义的 Arrow large_string 字段数组（缺失为 ""）"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    dtype = col.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        # 只转义类别（驻留列用字典里缓存的转义结果），逐行按编码 take
+        cats = escaped_categories
+        if cats is None:
+            cats = escape_csv_fields(pa.array(_python_fields(pd.Series(dtype.categories)), type=pa.large_string()))
+        codes = col.cat.codes.to_numpy()
+        arr = cats.take(pa.array(codes, mask=codes < 0))
+    elif pd.api.types.is_integer_dtype(dtype):
+        arr = pa.array(col, from_pandas=True).cast(pa.large_string())
+    elif pd.api.types.is_string_dtype(dtype) and dtype != object:
+        arr = escape_csv_fields(pa.array(col, from_pandas=True).cast(pa.large_string()))
+    else:
+        arr = escape_csv_fields(pa.array(_python_fields(col), type=pa.large_string()))
+    return pc.fill_null(arr, "")
+
+
+def render_csv_rows(df: pd.DataFrame, categories=None) -> bytes:
+    """
+    DataFrame -> CSV 正文字节（UTF-8，行尾 os.linesep，无表头），与 df.to_csv(header=False, index=False) 逐字节一致。
+    有 pyarrow 时整列向量化拼接，直接取 Arrow 值缓冲区，不逐行生成 Python 字符串；否则走 csv 模块。
+    categories(列名) -> 该 category 列已转义的类别数组或 None
+    """
+    if df.shape[1] == 0:
+        return os.linesep.encode() * len(df)
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator=os.linesep).writerows(
+            zip(*[_python_fields(df.iloc[:, i]) for i in range(df.shape[1])]))
+        return buf.getvalue().encode("utf-8")
+
+    fields = []
+    for i, name in enumerate(df.columns):
+        col = df.iloc[:, i]
+        cats = categories(name) if categories is not None and isinstance(col.dtype, pd.CategoricalDtype) else None
+        fields.append(_arrow_fields(col, cats))
+    if len(fields) == 1:
+        # csv 模块把只有一个空字段的行写成 ""（否则与空行无法区分）
+        fields[0] = pc.if_else(pc.equal(fields[0], ""), pa.scalar('""', pa.large_string()), fields[0])
+    string = pa.large_string()
+    row = fields[0] if len(fields) == 1 else pc.binary_join_element_wise(*fields, pa.scalar(",", string))
+    lines = pc.binary_join_element_wise(row, pa.scalar(os.linesep, string), pa.scalar("", string))
+    if isinstance(lines, pa.ChunkedArray):
+        lines = lines.combine_chunks()
+    if len(lines) == 0:
+        return b""
+    offsets = np.frombuffer(lines.buffers()[1], dtype=np.int64)
+    start, end = offsets[lines.offset], offsets[lines.offset + len(lines)]
+    return memoryview(lines.buffers()[2])[start:end]
+
+
+def render_csv_header(columns) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator=os.linesep).writerow([str(c) for c in columns])
+    return buf.getvalue().encode("utf-8")
+
+
+class CsvStreamWriter:
+    """
+    一个输出文件一个：tmp 文件整个任务只打开一次（WRITE_BUFFER_BYTES 写缓冲），可选外套 gzip / zstd 流式压缩；
+    write_header(columns) / write_frame(df, categories) / close()（可重复调用）
+    """
+
+    def __init__(self, tmp_path: str, compression: str = None, buffer_bytes: int = None, batch_rows: int = None):
+        self.batch_rows = batch_rows or WRITE_BATCH_ROWS
+        self.raw = open(tmp_path, "wb", buffering=buffer_bytes or WRITE_BUFFER_BYTES)
+        try:
+            self.stream = open_compressed(self.raw, compression) if compression else self.raw
+        except Exception:
+            self.raw.close()
+            raise
+
+    def write_header(self, columns):
+        self.stream.write(render_csv_header(columns))
+
+    def write_frame(self, df: pd.DataFrame, categories=None):
+        for i in range(0, len(df), self.batch_rows):
+            self.stream.write(render_csv_rows(df.iloc[i:i + self.batch_rows], categories))
+
+    def close(self):
+        if self.raw.closed:
+            return
+        try:
+            if self.stream is not self.raw:
+                self.stream.close()
+        finally:
+            self.raw.close()
+
+
+def atomic_write_csv(df: pd.DataFrame, out_path: str, table: str = None, interner=None, writer: str = None):
+    atomic_write_csv_chunks([df], out_path, None, clean=False, table=table, interner=interner, writer=writer)
+
+
+def atomic_write_csv_chunks(chunks, out_path: str, logger: logging.Logger, clean: bool = True, table: str = None,
+                            interner=None, writer: str = None) -> (int, int):
+    """
+    interner（StringInterner）：驻留列写出前换成共享字典的 category，可选写出编码旁路文件；
+    writer（默认 CSV_WRITER）："direct" 一个句柄写到底 / "pandas" 逐块 to_csv 追加；压缩方式由 out_path 扩展名决定
+    """
+    writer = writer or CSV_WRITER
+    if writer not in CSV_WRITERS:
+        raise ValueError(f"CSV_WRITER must be one of {CSV_WRITERS}, got {writer!r}")
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     tmp_path = out_path + ".tmp"
-    df.to_csv(tmp_path, index=False, encoding="utf-8")
-    os.replace(tmp_path, out_path)
+    compression = csv_compression_of(out_path)
+    session = interner.session(table, out_path) if interner is not None else None
+    stream = CsvStreamWriter(tmp_path, compression) if writer == "direct" else None
+    categories = session.escaped_categories if session is not None else None
+
+    total_rows = 0
+    names = None
+    first = True
+
+    try:
+        for chunk in chunks:
+            if clean:
+                chunk = clean_df(chunk)
+
+            # 列以首个 chunk 为准，按列名对齐（某块删掉了全空列时补空列、多出的列丢弃）
+            if names is None:
+                names = list(chunk.columns)
+            elif list(chunk.columns) != names:
+                logger.warning(f"Chunk column mismatch: expected={len(names)}, got={chunk.shape[1]} -> align by reindex")
+                chunk = chunk.reindex(columns=names, fill_value="")
+
+            with phase("write"):
+                if session is not None:
+                    chunk = session.intern(chunk)
+                if stream is not None:
+                    if first:
+                        stream.write_header(chunk.columns)
+                    stream.write_frame(chunk, categories)
+                else:
+                    chunk.to_csv(
+                        tmp_path,
+                        mode="w" if first else "a",
+                        header=first,
+                        index=False,
+                        encoding="utf-8",
+                        compression=compression,
+                    )
+            first = False
+            total_rows += len(chunk)
+
+        with phase("write"):
+            if first:
+                if stream is not None:
+                    stream.write_header([])
+                else:
+                    pd.DataFrame().to_csv(tmp_path, index=False, encoding="utf-8", compression=compression)
+            if stream is not None:
+                stream.close()
+            if session is not None:
+                session.finish()
+    finally:
+        if stream is not None:
+            stream.close()
+
+    with phase("rename"):
+        os.replace(tmp_path, out_path)
+    return total_rows, len(names or ())
+
+
+# =========================================================
+# 6.1) Parquet 输出（按表 schema：id 为整数、日期为 date32，其余字符串字典编码）
+# =========================================================
+
+# 所有表共有的整数 id 列（含 AERS 旧版 ISR / CASE）
+ID_COLUMNS = {"primaryid", "caseid", "isr", "case"}
+
+# 各表的日期列（FAERS 日期为 YYYYMMDD，部分为 YYYYMM / YYYY）
+TABLE_DATE_COLUMNS = {
+    "DEMO": {"event_dt", "mfr_dt", "init_fda_dt", "fda_dt", "rept_dt"},
+    "DRUG": {"exp_dt"},
+    "INDI": set(),
+    "OUTC": set(),
+    "REAC": set(),
+    "RPSR": set(),
+    "STAT": set(),
+    "THER": {"start_dt", "end_dt"},
+}
+
+# 各表的其他整数列
+TABLE_INT_COLUMNS = {
+    "DEMO": {"caseversion"},
+    "DRUG": {"drug_seq"},
+    "INDI": {"indi_drug_seq"},
+    "OUTC": set(),
+    "REAC": set(),
+    "RPSR": set(),
+    "STAT": set(),
+    "THER": {"dsg_drug_seq"},
+}
+
+
+def table_of(stem: str) -> str:
+    return stem[:4].upper()
+
+
+def column_kind(table: str, col) -> str:
+    name = str(col).strip().lower()
+    if name in ID_COLUMNS or name in TABLE_INT_COLUMNS.get(table, ()):
+        return "int64"
+    if name in TABLE_DATE_COLUMNS.get(table, ()):
+        return "date"
+    return "string"
+
+
+def arrow_schema(table: str, columns) -> "pa.Schema":
+    import pyarrow as pa
+
+    types = {"int64": pa.int64(), "date": pa.date32(), "string": pa.string()}
+    return pa.schema([pa.field(str(c), types[column_kind(table, c)]) for c in columns])
+
+
+def _parse_faers_dates(col: pd.Series) -> pd.Series:
+    """YYYYMMDD -> 日期；YYYYMM / YYYY 补到当月 / 当年第一天；无法解析 -> null"""
+    s = col.astype("string").fillna("").str.strip()
+    n = s.str.len()
+    s = s.where(n != 6, s + "01").where(n != 4, s + "0101")
+    return pd.to_datetime(s, format="%Y%m%d", errors="coerce")
+
+
+def to_arrow_table(df: pd.DataFrame, table: str, schema=None) -> "pa.Table":
+    import pyarrow as pa
+
+    schema = schema or arrow_schema(table, df.columns)
+    arrays = []
+    for i, field in enumerate(schema):
+        col = df.iloc[:, i]
+        if pa.types.is_int64(field.type):
+            col = pd.to_numeric(col.replace("", None), errors="coerce").astype("Int64")
+            arrays.append(pa.array(col, type=pa.int64(), from_pandas=True))
+        elif pa.types.is_date32(field.type):
+            arrays.append(pa.array(_parse_faers_dates(col), from_pandas=True).cast(pa.date32()))
+        else:
+            arrays.append(pa.array(col.astype(object), type=pa.string(), from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _parquet_writer(tmp_path: str, schema):
+    import pyarrow.parquet as pq
+
+    return pq.ParquetWriter(tmp_path, schema, compression=PARQUET_COMPRESSION, use_dictionary=True)
+
+
+def atomic_write_parquet(df: pd.DataFrame, out_path: str, table: str):
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    with phase("write"):
+        arrow = to_arrow_table(df, table)
+        with _parquet_writer(tmp_path, arrow.schema) as writer:
+            writer.write_table(arrow, row_group_size=CHUNK_ROWS)
+    with phase("rename"):
+        os.replace(tmp_path, out_path)
 
 
-def atomic_write_csv_chunks(chunks, out_path: str, logger: logging.Logger) -> (int, int):
+def atomic_write_parquet_chunks(chunks, out_path: str, table: str, logger: logging.Logger,
+                                clean: bool = True) -> (int, int):
+    """每个 chunk 写成一个 row group；列以首个 chunk 为准（与 CSV 分块路径一致地对齐）"""
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     tmp_path = out_path + ".tmp"
 
     total_rows = 0
-    cols = None
-    first = True
+    names = None
+    schema = None
+    writer = None
+    try:
+        for chunk in chunks:
+            if clean:
+                chunk = clean_df(chunk)
+
+            if names is None:
+                names = list(chunk.columns)
+                schema = arrow_schema(table, names)
+                writer = _parquet_writer(tmp_path, schema)
+            elif list(chunk.columns) != names:
+                logger.warning(f"Chunk column mismatch: expected={len(names)}, got={chunk.shape[1]} -> align by reindex")
+                chunk = chunk.reindex(columns=names, fill_value="")
+
+            with phase("write"):
+                writer.write_table(to_arrow_table(chunk, table, schema), row_group_size=CHUNK_ROWS)
+            total_rows += len(chunk)
+
+        if writer is None:
+            writer = _parquet_writer(tmp_path, arrow_schema(table, []))
+    finally:
+        if writer is not None:
+            with phase("write"):
+                writer.close()
+
+    with phase("rename"):
+        os.replace(tmp_path, out_path)
+    return total_rows, len(names or [])
+
+
+def atomic_write(df: pd.DataFrame, out_path: str, table: str, output_format: str = "csv", interner=None,
+                 writer: str = None):
+    if output_format == "parquet":
+        atomic_write_parquet(df, out_path, table)
+    else:
+        atomic_write_csv(df, out_path, table, interner, writer)
 
-    for chunk in chunks:
-        chunk = clean_df(chunk)
-
-        if cols is None:
-            cols = chunk.shape[1]
-        elif chunk.shape[1] != cols:
-            logger.warning(f"Chunk column mismatch: expected={cols}, got={chunk.shape[1]} -> align by reindex")
-            chunk = chunk.reindex(columns=list(range(cols)), fill_value="")
-
-        chunk.to_csv(
-            tmp_path,
-            mode="w" if first else "a",
-            header=first,
-            index=False,
-            encoding="utf-8"
-        )
-        first = False
-        total_rows += len(chunk)
 
-    if first:
-        pd.DataFrame().to_csv(tmp_path, index=False, encoding="utf-8")
-        cols = 0
+def atomic_write_chunks(chunks, out_path: str, table: str, logger: logging.Logger, output_format: str = "csv",
+                        clean: bool = True, interner=None, writer: str = None) -> (int, int):
+    """
+    clean=False：chunks 已由调用方清理过（避免重复一遍 strip）；
+    interner / writer 只作用于 CSV（Parquet 自带字典编码）
+    """
+    if output_format == "parquet":
+        return atomic_write_parquet_chunks(chunks, out_path, table, logger, clean)
+    return atomic_write_csv_chunks(chunks, out_path, logger, clean, table, interner, writer)
 
-    os.replace(tmp_path, out_path)
-    return total_rows, (cols or 0)
+
+# =========================================================
+# 6.2) 读回解码输出（下游阶段用）：统一成字符串列，日期还原为 YYYYMMDD
+# =========================================================
+
+def arrow_to_output_frame(batch) -> pd.DataFrame:
+    """Parquet 的 RecordBatch / Table -> 与 CSV 输出一致的全字符串 DataFrame"""
+    import pyarrow as pa
+
+    df = batch.to_pandas()
+    for i, name in enumerate(df.columns):
+        col = df.iloc[:, i]
+        if pa.types.is_date32(batch.schema.field(name).type) or pd.api.types.is_datetime64_any_dtype(col):
+            col = pd.to_datetime(col).dt.strftime("%Y%m%d")
+        elif pd.api.types.is_integer_dtype(col):
+            col = col.astype("Int64").astype(str).replace("<NA>", "")
+        df.isetitem(i, col.fillna("").astype(str))
+    return df
+
+
+def read_output_chunks(path: str, columns=None, chunk_rows: int = None):
+    """
+    按块读取 CSV（含 .csv.gz / .csv.zst）/ Parquet 输出，产出与 CSV 输出逐字一致的全字符串 DataFrame（缺失 -> ""）。
+    columns 为空读全部列；列名不存在时忽略。
+    """
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        names = pf.schema_arrow.names
+        use = names if columns is None else [c for c in columns if c in names]
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=use):
+            yield arrow_to_output_frame(batch)
+        return
+
+    with open_output_text(path) as f:
+        names = next(csv.reader(f), [])
+    use = None if columns is None else [c for c in columns if c in names]
+    if not names:
+        return
+    with pd.read_csv(path, dtype=str, keep_default_na=False, usecols=use, chunksize=chunk_rows,
+                     encoding="utf-8", compression=csv_compression_of(path)) as reader:
+        yield from reader
+
+
+def output_columns(path: str) -> list:
+    """只读表头 / schema，不读数据"""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return list(pq.read_schema(path).names)
+    with open_output_text(path) as f:
+        return next(csv.reader(f), [])
+
+
+# =========================================================
+# 6.3) 字符串驻留：每个 worker 按表维护跨块字典 + 编码旁路文件（{输出名}.dict.npz）
+# =========================================================
+
+# 代码列（TABLE_CATEGORY_COLUMNS）之外也高度重复的字符串列
+TABLE_INTERN_COLUMNS = {
+    "DRUG": {"drugname", "drugname_norm", "prod_ai", "prod_ai_norm"},
+    "INDI": {"indi_pt"},
+    "REAC": {"pt"},
+}
+
+
+def intern_columns(table: str) -> set:
+    return TABLE_CATEGORY_COLUMNS.get(table, set()) | TABLE_INTERN_COLUMNS.get(table, set())
+
+
+def sidecar_path(out_path: str) -> str:
+    return split_output_name(out_path)[0] + ".dict.npz"
+
+
+class StringDictionary:
+    """一列的字典：只追加（已发的编码一直有效）；每块只对块内不同的值查表"""
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or INTERN_MAX_ENTRIES
+        self.index = pd.Index([], dtype=object)
+        self.full = False
+        self._escaped = None
+
+    def reset(self):
+        self.index = pd.Index([], dtype=object)
+        self.full = False
+        self._escaped = None
+
+    def escaped(self):
+        """字典条目按 CSV 规则转义后的 Arrow 数组（direct 写出按编码 take）；只对新追加的条目转义"""
+        import pyarrow as pa
+
+        done = 0 if self._escaped is None else len(self._escaped)
+        if done < len(self.index):
+            new = escape_csv_fields(pa.array(self.index[done:].to_numpy(), type=pa.large_string()))
+            self._escaped = new if self._escaped is None else pa.concat_arrays([self._escaped, new])
+        return self._escaped
+
+    def encode(self, col: pd.Series):
+        """-> int32 编码（缺失为 -1）；字典将超上限时返回 None 并标记 full"""
+        codes, uniques = pd.factorize(col)
+        uniques = np.asarray(uniques, dtype=object)
+        mapped = self.index.get_indexer(uniques)
+        new = mapped < 0
+        if new.any():
+            if len(self.index) + int(new.sum()) > self.max_entries:
+                self.full = True
+                return None
+            self.index = self.index.append(pd.Index(uniques[new], dtype=object))
+            mapped[new] = np.arange(len(self.index) - int(new.sum()), len(self.index))
+        mapped = np.append(mapped, -1).astype(np.int32)
+        return mapped[codes]
+
+
+class StringInterner:
+    """
+    worker 级：{(表, 列): StringDictionary}，跨块、跨任务复用。
+    interner.session(table, out_path) 对应一个输出文件：intern(chunk) 逐块替换驻留列，finish() 写 / 清旁路文件
+    """
+
+    def __init__(self, sidecar: bool = False, max_entries: int = None):
+        self.sidecar = sidecar
+        self.max_entries = max_entries
+        self.dictionaries = {}
+
+    def dictionary(self, table: str, column: str) -> StringDictionary:
+        key = (table, column)
+        d = self.dictionaries.get(key)
+        if d is None:
+            d = self.dictionaries[key] = StringDictionary(self.max_entries)
+        return d
+
+    def session(self, table: str, out_path: str) -> "_InternSession":
+        return _InternSession(self, table, out_path)
+
+
+class _InternSession:
+    def __init__(self, interner: StringInterner, table: str, out_path: str):
+        self.interner = interner
+        self.table = table
+        self.out_path = out_path
+        self.wanted = intern_columns(table) if table else set()
+        self.codes = defaultdict(list)
+        self.dropped = set()
+        for (t, _), d in interner.dictionaries.items():
+            if t == table and d.full:
+                d.reset()
+
+    def intern(self, df: pd.DataFrame) -> pd.DataFrame:
+        for i, name in enumerate(df.columns):
+            canon = faers_schema.canonical_name(self.table, name)
+            if canon not in self.wanted or name in self.dropped:
+                continue
+            col = df.iloc[:, i]
+            if not (pd.api.types.is_string_dtype(col.dtype) or isinstance(col.dtype, pd.CategoricalDtype)):
+                continue
+            d = self.interner.dictionary(self.table, canon)
+            codes = None if d.full else d.encode(col)
+            if codes is None:
+                # 自由文本列：本文件内不再驻留，旁路文件里也不出现（必须逐行完整）
+                self.dropped.add(name)
+                self.codes.pop(name, None)
+                continue
+            df.isetitem(i, pd.Series(pd.Categorical.from_codes(codes, categories=d.index), index=col.index,
+                                     name=col.name))
+            if self.interner.sidecar:
+                self.codes[name].append(codes)
+        return df
+
+    def escaped_categories(self, name):
+        """本文件内驻留中的列 -> 其字典的转义数组；其他列 None"""
+        canon = faers_schema.canonical_name(self.table, name)
+        if canon not in self.wanted or name in self.dropped:
+            return None
+        d = self.interner.dictionaries.get((self.table, canon))
+        if d is None or d.full:
+            return None
+        try:
+            return d.escaped()
+        except ImportError:
+            return None
+
+    def finish(self):
+        path = sidecar_path(self.out_path)
+        if not self.interner.sidecar:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        arrays = {}
+        for name, parts in self.codes.items():
+            codes = np.concatenate(parts)
+            d = self.interner.dictionary(self.table, faers_schema.canonical_name(self.table, name))
+            # 只留本文件用到的条目，编码重排为 0..k-1，并按条目数选最窄的整数类型
+            used = np.flatnonzero(np.bincount(codes[codes >= 0], minlength=len(d.index)))
+            lookup = np.full(len(d.index) + 1, -1, dtype=np.int64)
+            lookup[used] = np.arange(len(used))
+            values = d.index.to_numpy()[used].tolist()
+            arrays[f"{name}.codes"] = lookup[codes].astype(_code_dtype(len(values)))
+            arrays[f"{name}.dict"] = np.frombuffer("\n".join(values).encode("utf-8"), dtype=np.uint8)
+            arrays[f"{name}.size"] = np.int64(len(values))
+        write_sidecar(path, arrays)
+
+
+def _code_dtype(n: int):
+    return np.int8 if n < 2 ** 7 else np.int16 if n < 2 ** 15 else np.int32
+
+
+def write_sidecar(path: str, arrays: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def read_sidecar(path: str) -> dict:
+    """旁路文件 -> {列名: pd.Categorical}（逐行，与 CSV 输出同序）"""
+    out = {}
+    with np.load(path) as z:
+        names = sorted({k.rsplit(".", 1)[0] for k in z.files})
+        for name in names:
+            n = int(z[f"{name}.size"])
+            values = z[f"{name}.dict"].tobytes().decode("utf-8").split("\n") if n else []
+            out[name] = pd.Categorical.from_codes(z[f"{name}.codes"], categories=pd.Index(values, dtype=object))
+    return out
+
+
+def stitch_sidecars(paths: list, out_path: str):
+    """拆分任务：各分片的旁路文件按分片顺序拼接（字典取并集、编码重映射）；任一分片缺少则不生成"""
+    final = sidecar_path(out_path)
+    sides = [sidecar_path(p) for p in paths]
+    if not all(os.path.exists(p) for p in sides):
+        for p in sides + [final]:
+            if os.path.exists(p):
+                os.remove(p)
+        return
+    parts = [read_sidecar(p) for p in sides]
+    common = set(parts[0]).intersection(*parts[1:])
+    arrays = {}
+    for name in sorted(common):
+        cats = [p[name] for p in parts]
+        merged = pd.api.types.union_categoricals(cats, ignore_order=True)
+        arrays[f"{name}.codes"] = merged.codes.astype(_code_dtype(len(merged.categories)))
+        arrays[f"{name}.dict"] = np.frombuffer("\n".join(merged.categories).encode("utf-8"), dtype=np.uint8)
+        arrays[f"{name}.size"] = np.int64(len(merged.categories))
+    write_sidecar(final, arrays)
+    for p in sides:
+        os.remove(p)
 
 
 # =========================================================
@@ -214,6 +1657,9 @@ def atomic_write_csv_chunks(chunks, out_path: str, logger: logging.Logger) -> (i
 # =========================================================
 
 def discover_tasks(main_logger: logging.Logger):
+    if INPUT_SOURCE == "zip":
+        return discover_zip_tasks(main_logger)
+
     tasks = []
 
     if not os.path.isdir(INPUT_ROOT):
@@ -233,10 +1679,12 @@ def discover_tasks(main_logger: logging.Logger):
             if not os.path.isdir(ascii_dir):
                 continue
 
-            # 只取 ascii 目录里的 .txt
-            for txt_path in glob.glob(os.path.join(ascii_dir, "*.txt")):
-                fname = os.path.basename(txt_path)
-                stem, _ = os.path.splitext(fname)
+            # 只取 ascii 目录里的 .txt（AERS 时期为大写 .TXT；Linux 上 glob 区分大小写）
+            for fname in sorted(os.listdir(ascii_dir)):
+                stem, ext = os.path.splitext(fname)
+                if ext.lower() != ".txt":
+                    continue
+                txt_path = os.path.join(ascii_dir, fname)
 
                 # 过滤：只处理那 8 张表
                 prefix = stem[:4].upper()
@@ -244,7 +1692,7 @@ def discover_tasks(main_logger: logging.Logger):
                     continue
 
                 out_dir = os.path.join(OUTPUT_ROOT, year, q)
-                out_path = os.path.join(out_dir, f"{stem}.csv")
+                out_path = os.path.join(out_dir, stem + output_suffix(OUTPUT_FORMAT, CSV_COMPRESSION))
 
                 tasks.append({
                     "year": year,
@@ -259,20 +1707,657 @@ def discover_tasks(main_logger: logging.Logger):
     return tasks
 
 
+def ascii_table_member(info: zipfile.ZipInfo):
+    """ZIP 成员属于 ascii 目录且是 TABLE_PREFIXES 之一的 .txt -> 返回 stem（如 DRUG24Q1），否则 None"""
+    return faers_config.ascii_table_member(info, TABLE_PREFIXES)
+
+
+def discover_zip_tasks(main_logger: logging.Logger):
+    """
+    直接扫描 RAW_ZIP/{year}/{Qn}/*.zip，只登记 ZIP 中 ascii 目录下且属于 8 张表的 .txt 成员。
+    成员在解码时边解压边解析，省掉 UNZIP_DATA 整棵中间目录的写盘与再读。
+    """
+    tasks = []
+
+    if not os.path.isdir(RAW_ZIP_ROOT):
+        raise FileNotFoundError(f"RAW_ZIP_ROOT not found: {RAW_ZIP_ROOT}")
+
+    years = sorted(
+        d for d in os.listdir(RAW_ZIP_ROOT)
+        if os.path.isdir(os.path.join(RAW_ZIP_ROOT, d)) and d.isdigit() and len(d) == 4
+    )
+
+    for year in years:
+        for q in ["Q1", "Q2", "Q3", "Q4"]:
+            for zip_path in sorted(glob.glob(os.path.join(RAW_ZIP_ROOT, year, q, "*.zip"))):
+                try:
+                    with zipfile.ZipFile(zip_path) as zf:
+                        infos = zf.infolist()
+                except (OSError, zipfile.BadZipFile) as e:
+                    main_logger.warning(f"[ZIP_SKIP] {zip_path} | {type(e).__name__}: {e}")
+                    continue
+
+                for info in infos:
+                    stem = ascii_table_member(info)
+                    if stem is None:
+                        continue
+
+                    out_path = os.path.join(OUTPUT_ROOT, year, q, stem + output_suffix(OUTPUT_FORMAT, CSV_COMPRESSION))
+                    tasks.append({
+                        "year": year,
+                        "quarter": q,
+                        "stem": stem,
+                        "input_path": zip_path,
+                        "member": info.filename,
+                        "size_bytes": info.file_size,
+                        "output_path": out_path,
+                    })
+
+    main_logger.info(f"Discovered years (zip): {len(years)} -> {years[:5]}{'...' if len(years) > 5 else ''}")
+    main_logger.info(f"Discovered tasks (zip): {len(tasks)}")
+    return tasks
+
+
+# =========================================================
+# 7.1) 增量重建清单（输入签名 + 配置指纹 -> 输出）
+# =========================================================
+
+def fast_file_hash(path: str, sample_bytes: int = FAST_HASH_SAMPLE_BYTES) -> str:
+    """大小 + 头/中/尾采样的 blake2b；小文件（<= 3 个采样块）整体哈希"""
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(size).encode())
+    with open(path, "rb") as f:
+        if size <= 3 * sample_bytes:
+            h.update(f.read())
+        else:
+            for offset in (0, size // 2 - sample_bytes // 2, size - sample_bytes):
+                f.seek(offset)
+                h.update(f.read(sample_bytes))
+    return h.hexdigest()
+
+
+def input_signature(path: str, with_hash: bool = True, member: str = None) -> dict:
+    """
+    普通文件：size + mtime + 采样哈希；
+    ZIP 成员：成员解压后大小 + ZIP 的 mtime + 中央目录里的 CRC32（无需解压即可得到内容指纹）。
+    """
+    st = os.stat(path)
+    if member is None:
+        sig = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        if with_hash:
+            sig["hash"] = fast_file_hash(path)
+        return sig
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(member)
+    sig = {"size": info.file_size, "mtime_ns": st.st_mtime_ns}
+    if with_hash:
+        sig["hash"] = f"crc32:{info.CRC:08x}"
+    return sig
+
+
+def config_fingerprint(settings: dict) -> str:
+    """影响输出内容的配置；任一变化 -> 全部重建"""
+    conf = {
+        "delim": DELIM,
+        "encoding": INPUT_ENCODING,
+        "drop_all_empty_cols": DROP_ALL_EMPTY_COLS,
+        "strip_whitespace": STRIP_WHITESPACE,
+        "fill_na_with_empty": FILL_NA_WITH_EMPTY,
+        "schema_version": faers_schema.SCHEMA_VERSION if HARMONIZE_SCHEMA else None,
+        "drug_norm_version": faers_drugnorm.NORM_VERSION if settings.get("normalize_drugs") else None,
+        "dict_sidecar": bool(settings.get("dict_sidecar")) and settings["output_format"] == "csv",
+        "csv_compression": settings.get("csv_compression"),
+        "compact_dtypes": COMPACT_DTYPES,
+        "parse_engine": settings["parse_engine"],
+        "output_format": settings["output_format"],
+    }
+    return hashlib.blake2b(json.dumps(conf, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+
+def manifest_path() -> str:
+    return os.path.join(OUTPUT_ROOT, MANIFEST_NAME)
+
+
+def journal_path(path: str) -> str:
+    return path + ".journal"
+
+
+def load_manifest(path: str) -> dict:
+    """清单快照 + 重放日志（上次运行中途退出时，已完成任务的结果只在日志里）"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f).get("entries", {})
+    except (OSError, ValueError):
+        entries = {}
+    try:
+        with open(journal_path(path), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # 空行 / 崩溃时写了一半的行
+                if rec.get("entry") is None:
+                    entries.pop(rec["key"], None)
+                else:
+                    entries[rec["key"]] = rec["entry"]
+    except OSError:
+        pass
+    return entries
+
+
+def append_manifest(path: str, key: str, entry: dict = None):
+    """单个任务的结果追加到日志（entry=None 表示删除该条）；不重写整个清单，运行结束时由 save_manifest 压实"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(journal_path(path), "a", encoding="utf-8") as f:
+        # 换行写在记录前面：即使上一条只写了一半，这一条也独占一行
+        f.write("\n" + json.dumps({"key": key, "entry": entry}, ensure_ascii=False))
+
+
+def save_manifest(path: str, entries: dict):
+    """写出完整快照并删除日志（先替换快照再删日志：中途退出时重放日志也不会出错）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "entries": entries}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    if os.path.exists(journal_path(path)):
+        os.remove(journal_path(path))
+
+
+def manifest_key(task: dict) -> str:
+    return os.path.relpath(task["output_path"], OUTPUT_ROOT).replace(os.sep, "/")
+
+
+def is_up_to_date(task: dict, entry: dict, fingerprint: str) -> bool:
+    """
+    只看元数据：输出存在且大小与记录一致、配置指纹一致、输入 size+mtime 一致。
+    仅当 mtime 变了而 size 没变时才读采样块算快速哈希（touch 过但内容未变 -> 仍跳过）。
+    """
+    if not entry or entry.get("config") != fingerprint:
+        return False
+    try:
+        out_size = os.path.getsize(task["output_path"])
+        sig = input_signature(task["input_path"], with_hash=False, member=task.get("member"))
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return False
+    if out_size != entry.get("output_size"):
+        return False
+    recorded = entry.get("input", {})
+    if sig["size"] != recorded.get("size"):
+        return False
+    if sig["mtime_ns"] != recorded.get("mtime_ns"):
+        try:
+            current = input_signature(task["input_path"], member=task.get("member"))["hash"]
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return False
+        if current != recorded.get("hash"):
+            return False
+        recorded["mtime_ns"] = sig["mtime_ns"]
+    return True
+
+
+def manifest_entry(result: dict, fingerprint: str) -> dict:
+    return {
+        "input_path": result["input_path"],
+        "member": result.get("member"),
+        "input": result["input_sig"],
+        "config": fingerprint,
+        "output_size": os.path.getsize(result["output_path"]),
+        "rows": result["rows"],
+        "cols": result["cols"],
+        "decoded_at": RUN_TS,
+    }
+
+
+# =========================================================
+# 7.2) 调度：大任务优先 + 行对齐字节区间拆分 + 内存准入
+# =========================================================
+
+def line_aligned_ranges(path: str, part_bytes: int) -> list:
+    """
+    mmap 输入，把表头之后的数据区切成约 part_bytes 大小的 [start, end) 区间。
+    每个切点都取在换行符之后：跨切点的那一行整行归前一个区间，区间都从行首开始。
+    切点之后的第一行必须与表头字段数一致（解析器按首行推断列数 / 隐式索引），
+    不一致的畸形行顺延归入前一个区间，与串行解析时的处理相同。
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    delim = DELIM.encode(INPUT_ENCODING)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        nl = mm.find(b"\n")
+        if nl < 0:
+            return [(size, size)]
+        want = mm[:nl].count(delim)
+        bounds = [nl + 1]
+        pos = bounds[0] + part_bytes
+        while pos < size:
+            # 从 pos - 1 开始找：切点恰好落在行首时直接在这里切
+            nl = mm.find(b"\n", pos - 1)
+            while 0 <= nl < size - 1:
+                nxt = mm.find(b"\n", nl + 1)
+                line_end = size if nxt < 0 else nxt
+                if mm[nl + 1:line_end].count(delim) == want:
+                    break
+                nl = nxt
+            if nl < 0 or nl + 1 >= size:
+                break
+            bounds.append(nl + 1)
+            pos = nl + 1 + part_bytes
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a] or [(bounds[0], size)]
+
+
+def plan_jobs(tasks: list, split: bool = True, threshold_mb: float = None, part_mb: float = None,
+              min_parts: int = 1) -> list:
+    """
+    任务 -> 派发单元（job）：大文件拆成按行对齐的区间子任务，
+    全部按字节数从大到小排序（LPT），返回新列表，不修改 tasks。
+    min_parts：大文件至少拆成这么多份（通常为进程数），保证单个大表也能用满所有进程。
+    """
+    threshold = (threshold_mb if threshold_mb is not None else CHUNK_THRESHOLD_MB) * 1024 * 1024
+    max_part_bytes = int((part_mb if part_mb is not None else SPLIT_PART_MB) * 1024 * 1024)
+
+    jobs = []
+    for task in tasks:
+        size = task.get("size_bytes")
+        if size is None:
+            try:
+                size = os.path.getsize(task["input_path"])
+            except OSError:
+                size = 0
+
+        ranges = []
+        # ZIP 成员是压缩流，无法按字节区间随机读取 -> 不拆分
+        if split and size >= threshold and task.get("member") is None:
+            parts = max(-(-size // max_part_bytes), min_parts)
+            ranges = line_aligned_ranges(task["input_path"], max(1, -(-size // parts)))
+        if len(ranges) > 1:
+            for i, (start, end) in enumerate(ranges):
+                jobs.append({
+                    **task,
+                    "output_path": part_path(task["output_path"], i),
+                    "final_output_path": task["output_path"],
+                    "byte_range": (start, end),
+                    "part": i,
+                    "parts": len(ranges),
+                    "size_bytes": end - start,
+                })
+        else:
+            jobs.append({**task, "size_bytes": size})
+
+    jobs.sort(key=lambda j: j["size_bytes"], reverse=True)
+    return jobs
+
+
+def part_path(out_path: str, i: int) -> str:
+    """分片一律不压缩（拼接时按字节追加，压缩留到拼接时一次完成）"""
+    stem, ext = split_output_name(out_path)
+    if csv_compression_of(out_path):
+        ext = ".csv"
+    return f"{stem}.part{i:04d}{ext}"
+
+
+def run_scheduled(pool, jobs: list, max_in_flight: int, max_large: int, large_bytes: int, settings: dict = None):
+    """
+    按 jobs 顺序（已按大小降序）派发：在途任务 <= max_in_flight，在途大任务 <= max_large；
+    大任务名额占满时先派后面的小任务；没有任务在途时至少放行一个大任务（max_large < 1 也不会卡死）。
+    按完成顺序 yield (job, result)。
+    settings：常驻进程池（faers_daemon）的 worker 是按别的运行初始化的，随任务带上本次运行的 settings
+    """
+    done_q = queue.Queue()
+    pending = list(jobs)
+    in_flight = 0
+    large_in_flight = 0
+
+    def submit(job):
+        pool.apply_async(
+            *((convert_task_with_retry, (job,)) if settings is None else (run_pooled_task, (job, settings))),
+            callback=lambda res: done_q.put((job, res, None)),
+            error_callback=lambda err: done_q.put((job, None, err)),
+        )
+
+    while pending or in_flight:
+        i = 0
+        while in_flight < max_in_flight and i < len(pending):
+            job = pending[i]
+            large = job["size_bytes"] >= large_bytes
+            if large and large_in_flight >= max_large and in_flight:
+                i += 1
+                continue
+            pending.pop(i)
+            submit(job)
+            in_flight += 1
+            large_in_flight += large
+
+        job, res, err = done_q.get()
+        in_flight -= 1
+        large_in_flight -= job["size_bytes"] >= large_bytes
+        if err is not None:
+            res = new_result(job)
+            res["reason"] = f"WORKER_ERROR: {err!r}"
+        yield job, res
+
+
+def _append_file(dst, src, offset: int):
+    """把 src 从 offset 起的内容追加到 dst；Linux 上走 copy_file_range（内核内拷贝，不经过用户态）"""
+    size = os.fstat(src.fileno()).st_size
+    dst.flush()
+    copy = getattr(os, "copy_file_range", None)
+    if copy is not None:
+        try:
+            while offset < size:
+                n = copy(src.fileno(), dst.fileno(), size - offset, offset)
+                if n == 0:
+                    break
+                offset += n
+            return
+        except OSError:
+            pass  # 跨文件系统 / 不支持 -> 普通拷贝
+    src.seek(offset)
+    shutil.copyfileobj(src, dst, 16 * 1024 * 1024)
+
+
+def stitch_parts(part_results: list, out_path: str, output_format: str):
+    """
+    把各区间的输出按顺序拼成最终文件（tmp -> replace），并删除分片。
+    CSV：只比对各分片表头，正文按字节追加，不再解析（压缩输出：分片未压缩，追加时经流式压缩器写入）；
+    Parquet：按 row group 原样搬运（不重新解析 / 清理）。
+    列不一致（例如某区间的全空列被删掉）时抛 PART_COLUMNS_MISMATCH，由调用方改走串行。
+    """
+    part_results = sorted(part_results, key=lambda r: r["part"])
+    paths = [r["output_path"] for r in part_results]
+    tmp_path = out_path + ".tmp"
+
+    try:
+        if output_format == "parquet":
+            import pyarrow.parquet as pq
+
+            schema = pq.read_schema(paths[0])
+            with _parquet_writer(tmp_path, schema) as writer:
+                for path in paths:
+                    pf = pq.ParquetFile(path)
+                    if not pf.schema_arrow.equals(schema):
+                        raise ValueError(f"PART_COLUMNS_MISMATCH: {path}")
+                    for i in range(pf.num_row_groups):
+                        writer.write_table(pf.read_row_group(i))
+        else:
+            compression = csv_compression_of(out_path)
+            with open(tmp_path, "wb", buffering=WRITE_BUFFER_BYTES) as raw:
+                out = open_compressed(raw, compression) if compression else raw
+                header = None
+                for path in paths:
+                    with open(path, "rb") as f:
+                        first = f.readline()
+                        if header is None:
+                            header = first
+                            out.write(first)
+                        elif first != header:
+                            raise ValueError(f"PART_COLUMNS_MISMATCH: {path}")
+                        if compression:
+                            shutil.copyfileobj(f, out, 16 * 1024 * 1024)
+                        else:
+                            _append_file(out, f, len(first))
+                if out is not raw:
+                    out.close()
+            stitch_sidecars(paths, out_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, out_path)
+    for path in paths:
+        os.remove(path)
+
+
+def unsplit_task(job: dict) -> dict:
+    """区间子任务 -> 原始整文件任务"""
+    task = {k: v for k, v in job.items() if k not in ("final_output_path", "byte_range", "part", "parts", "size_bytes")}
+    task["output_path"] = job["final_output_path"]
+    return task
+
+
+def merge_part_results(job: dict, part_results: list, output_format: str, logger: logging.Logger) -> dict:
+    """某文件的全部区间完成后：全部 OK 则拼接，合并为一个文件级结果"""
+    part_results = sorted(part_results, key=lambda r: r["part"])
+    merged = new_result({**job, "output_path": job["final_output_path"]})
+    merged.update({
+        "attempts": max(r["attempts"] for r in part_results),
+        "rows": sum(r["rows"] for r in part_results),
+        "cols": max(r["cols"] for r in part_results),
+        "seconds": round(sum(r["seconds"] for r in part_results), 3),
+        "mode": "split",
+        "engine": part_results[0]["engine"],
+        "engine_fallback": any(r["engine_fallback"] for r in part_results),
+        "schema_era": part_results[0].get("schema_era", ""),
+        "part": None,
+        "bytes_read": sum(r.get("bytes_read", 0) for r in part_results),
+        "peak_rss_mb": max(r.get("peak_rss_mb", 0.0) for r in part_results),
+        "retry_seconds": round(sum(r.get("retry_seconds", 0.0) for r in part_results), 3),
+    })
+    phases = defaultdict(float)
+    for r in part_results:
+        for name, sec in r.get("phases", {}).items():
+            phases[name] += sec
+    if "input_sig" in part_results[0]:
+        merged["input_sig"] = part_results[0]["input_sig"]
+    if all(r.get("scan") for r in part_results):
+        merged["scan"] = merge_scans([r["scan"] for r in part_results])
+    if all(r.get("drug_norm") for r in part_results):
+        dn = {k: sum(r["drug_norm"][k] for r in part_results) for k in ("distinct", "memory_hits", "disk_hits", "computed")}
+        dn["hit_rate"] = round(1 - dn["computed"] / dn["distinct"], 4) if dn["distinct"] else 1.0
+        merged["drug_norm"] = dn
+
+    failed = [r for r in part_results if r["status"] != "OK"]
+    if failed:
+        merged["status"] = "FAIL"
+        merged["reason"] = f"PART_FAILED: {failed[0]['reason']}"
+    else:
+        try:
+            start = time.perf_counter()
+            stitch_parts(part_results, merged["output_path"], output_format)
+            phases["stitch"] += time.perf_counter() - start
+            merged["status"] = "OK"
+            merged["reason"] = "OK"
+            merged["bytes_written"] = os.path.getsize(merged["output_path"])
+        except Exception as e:
+            merged["status"] = "FAIL"
+            merged["reason"] = str(e)
+            logger.error(traceback.format_exc())
+
+    if merged["status"] != "OK":
+        for r in part_results:
+            for path in (r["output_path"], r["output_path"] + ".tmp"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    merged["phases"] = {k: round(v, 4) for k, v in phases.items()}
+    if merged["seconds"] > 0:
+        merged["rows_per_sec"] = round(merged["rows"] / merged["seconds"], 1)
+        merged["mb_per_sec"] = round(merged["bytes_read"] / (1024 * 1024) / merged["seconds"], 3)
+    return merged
+
+
+# =========================================================
+# 7.1) 内存预算：逐文件决定 full / chunk 与每块行数
+# =========================================================
+
+def total_memory_bytes():
+    """物理内存字节数；取不到返回 None（psutil 可选，其次 sysconf / Windows API）"""
+    try:
+        import psutil
+
+        return psutil.virtual_memory().total
+    except ImportError:
+        pass
+    if hasattr(os, "sysconf"):
+        try:
+            return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        except (ValueError, OSError):
+            return None
+    if sys.platform == "win32":
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        stat = MEMORYSTATUSEX()
+        stat.dwLength = ctypes.sizeof(stat)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(stat)):
+            return stat.ullTotalPhys
+    return None
+
+
+def current_rss_bytes() -> int:
+    """当前进程常驻内存；取不到返回 0（预算里就不扣除基线）"""
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+def memory_budget_bytes(proc_num: int):
+    """每个进程的内存预算；MEMORY_BUDGET_MB 优先，否则按物理内存均分；都拿不到返回 None"""
+    if MEMORY_BUDGET_MB is not None:
+        return int(MEMORY_BUDGET_MB * 1024 * 1024)
+    total = total_memory_bytes()
+    if not total:
+        return None
+    return int(total * MEMORY_BUDGET_FRACTION / max(1, proc_num))
+
+
+def sample_row_profile(path: str, byte_range=None, member: str = None, compact: bool = None):
+    """
+    从（区间 / 成员的）开头取 SAMPLE_BYTES 字节，按完整行截断后解析，
+    返回 {"raw_bytes_per_row", "mem_bytes_per_row", "rows"}；样本里没有数据行返回 None
+    """
+    with _open_source(path, byte_range, member) as src:
+        header = src.readline()
+        body = src.read(SAMPLE_BYTES)
+        if len(body) == SAMPLE_BYTES:
+            extra = src.readline()
+            body += extra
+    if not body.strip():
+        return None
+
+    table = _compact_table(path, member, compact)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        df = _pandas_read(io.BytesIO(header + body), "c", **_parse_dtype_kwargs(table))
+    if table:
+        df = compact_frame(df, table)
+    if len(df) == 0:
+        return None
+    return {
+        "raw_bytes_per_row": len(body) / len(df),
+        "mem_bytes_per_row": float(df.memory_usage(deep=True, index=False).sum()) / len(df),
+        "rows": len(df),
+    }
+
+
+def plan_chunking(size_bytes: int, profile: dict, budget_bytes: int, rss_bytes: int = 0) -> dict:
+    """
+    按预算决定解码方式：估算行数 = 大小 / 每行原始字节，整表峰值 = 行数 × 每行内存 × PEAK_MEMORY_FACTOR；
+    预算扣掉当前 RSS 后放得下 -> full，否则 chunk，每块行数 = 可用内存 / 单行峰值（夹在上下限内）
+    """
+    available = max(budget_bytes - rss_bytes, budget_bytes // 4)
+    row_peak = max(1.0, profile["mem_bytes_per_row"] * PEAK_MEMORY_FACTOR)
+    est_rows = int(size_bytes / max(1.0, profile["raw_bytes_per_row"]))
+    est_peak = est_rows * row_peak
+    chunk_rows = int(min(MAX_CHUNK_ROWS, max(MIN_CHUNK_ROWS, available // row_peak)))
+    return {
+        "use_chunk": est_peak > available,
+        "chunk_rows": chunk_rows,
+        "est_rows": est_rows,
+        "est_peak_mb": round(est_peak / (1024 * 1024), 1),
+        "available_mb": round(available / (1024 * 1024), 1),
+    }
+
+
+def choose_chunking(task: dict, settings: dict, logger: logging.Logger) -> dict:
+    """
+    逐文件选 full / chunk 与每块行数，返回 {"use_chunk", "chunk_rows", "est_rows"}；
+    自适应关闭、没有预算或取样失败时退回 CHUNK_THRESHOLD_MB / CHUNK_ROWS 固定规则（est_rows=None）
+    """
+    input_path = task["input_path"]
+    size_bytes = task.get("size_bytes", os.path.getsize(input_path))
+    fixed = {
+        "use_chunk": size_bytes / (1024 * 1024) >= settings["chunk_threshold_mb"],
+        "chunk_rows": CHUNK_ROWS,
+        "est_rows": None,
+    }
+    budget_mb = settings.get("memory_budget_mb")
+    if not settings.get("adaptive_chunking") or not budget_mb:
+        return fixed
+    if size_bytes * SAMPLE_SKIP_EXPANSION * PEAK_MEMORY_FACTOR <= budget_mb * 1024 * 1024:
+        return {**fixed, "use_chunk": False}
+
+    try:
+        profile = sample_row_profile(input_path, task.get("byte_range"), task.get("member"))
+    except Exception:
+        logger.warning(f"Row sampling failed for {task['stem']}, using fixed chunking")
+        logger.warning(traceback.format_exc())
+        return fixed
+    if profile is None:
+        return fixed
+
+    plan = plan_chunking(size_bytes, profile, int(budget_mb * 1024 * 1024), current_rss_bytes())
+    logger.info(
+        f"Chunk plan {task['stem']}: ~{plan['est_rows']} rows, {profile['raw_bytes_per_row']:.0f}B/row raw, "
+        f"{profile['mem_bytes_per_row']:.0f}B/row in memory | peak~{plan['est_peak_mb']}MB "
+        f"available={plan['available_mb']}MB -> {'chunk' if plan['use_chunk'] else 'full'} rows={plan['chunk_rows']}"
+    )
+    return plan
+
+
+def shrink_chunking(plan: dict) -> dict:
+    """
+    MemoryError 之后的下一次尝试：强制 chunk，块减半（从 min(块行数, 估算行数) 开始减），
+    下限 MIN_CHUNK_ROWS // 4
+    """
+    rows = plan["chunk_rows"]
+    if not plan["use_chunk"] and plan.get("est_rows"):
+        rows = min(rows, plan["est_rows"])
+    return {**plan, "use_chunk": True, "chunk_rows": max(max(1, MIN_CHUNK_ROWS // 4), rows // 2)}
+
+
 # =========================================================
 # 8) Worker：进程级日志隔离 + settings
 # =========================================================
 
 WORKER_LOGGER = None
 WORKER_SETTINGS = None
+WORKER_NORMALIZER = None
+WORKER_INTERNER = None
+WORKER_CONFIG = None
 
 def worker_init(settings: dict):
-    global WORKER_LOGGER, WORKER_SETTINGS
+    global WORKER_LOGGER, WORKER_SETTINGS, WORKER_CONFIG
     WORKER_SETTINGS = settings
 
+    # 主进程 configure() 过的配置项；常驻 worker 换批次时先还原上一批的
+    if WORKER_CONFIG is not None:
+        restore_config(WORKER_CONFIG)
+    WORKER_CONFIG = configure(settings.get("config_overrides"))
+
     proc_name = current_process().name
     logger = logging.getLogger(proc_name)
     logger.setLevel(logging.INFO)
+    for h in logger.handlers:
+        h.close()
     logger.handlers.clear()
 
     fmt = logging.Formatter("%(asctime)s [%(levelname)s] [%(name)s] %(message)s")
@@ -287,11 +2372,211 @@ def worker_init(settings: dict):
     WORKER_LOGGER.info("Worker initialized.")
 
 
+def run_pooled_task(task: dict, settings: dict) -> dict:
+    """常驻 worker：settings（运行目录等）与当前不同时重新初始化日志，规范化器 / 驻留器照常复用"""
+    if settings != WORKER_SETTINGS:
+        worker_init(settings)
+    return convert_task_with_retry(task)
+
+
+def warm_worker(_=None) -> int:
+    """预热：导入解析 / 写出用到的可选依赖（pandas 随模块已导入），返回 pid"""
+    for name in ("pyarrow", "pyarrow.compute", "pyarrow.csv", "pyarrow.parquet"):
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    time.sleep(0.05)  # 让每个 worker 各领到一个
+    return os.getpid()
+
+
+def get_drug_normalizer(settings: dict):
+    """worker 内复用同一个规范化器（进程内缓存跨任务保留）；未开启时返回 None"""
+    global WORKER_NORMALIZER
+    if not settings.get("normalize_drugs"):
+        return None
+    path = settings.get("drug_norm_cache")
+    if WORKER_NORMALIZER is None or WORKER_NORMALIZER.cache_path != path:
+        WORKER_NORMALIZER = faers_drugnorm.DrugNormalizer(path)
+    return WORKER_NORMALIZER
+
+
+def get_string_interner(settings: dict):
+    """worker 内复用同一个驻留器（各表字典跨任务保留）；未开启时返回 None"""
+    global WORKER_INTERNER
+    if not settings.get("intern_strings"):
+        return None
+    if WORKER_INTERNER is None or WORKER_INTERNER.sidecar != bool(settings.get("dict_sidecar")):
+        WORKER_INTERNER = StringInterner(sidecar=bool(settings.get("dict_sidecar")),
+                                         max_entries=settings.get("intern_max_entries"))
+    return WORKER_INTERNER
+
+
+def add_normalized_names(df: pd.DataFrame, table: str, normalizer) -> pd.DataFrame:
+    """DRUG_NORM_COLUMNS 中存在的列，在其后插入 {规范列名}_norm（表头未统一时按别名识别）"""
+    if table != "DRUG":
+        return df
+    names = [faers_schema.canonical_name(table, c) for c in df.columns]
+    for col in DRUG_NORM_COLUMNS:
+        if col not in names or f"{col}_norm" in names:
+            continue
+        i = names.index(col)
+        df.insert(i + 1, f"{col}_norm", normalizer.normalize(df.iloc[:, i]))
+        names.insert(i + 1, f"{col}_norm")
+    return df
+
+
+def prepare_frame(df: pd.DataFrame, table: str, normalizer=None) -> pd.DataFrame:
+    """清理 + （可选）按规范列统一表头 + （可选）药名规范化"""
+    df = clean_df(df)
+    if HARMONIZE_SCHEMA:
+        df = faers_schema.harmonize(df, table)
+    if normalizer is not None:
+        df = add_normalized_names(df, table, normalizer)
+    return df
+
+
+def decode_file(input_path: str, out_path: str, use_chunk: bool, engine: str, result: dict, logger: logging.Logger,
+                output_format: str = "csv", byte_range=None, member: str = None, chunk_rows: int = None,
+                scan: bool = None, normalizer=None, interner=None, writer: str = None):
+    """
+    单个文件（或其一个字节区间 / ZIP 中的一个成员）：解析 -> 清理 -> 统一表头 -> 原子写出；
+    rows/cols/mode/engine/schema_era/chunk_rows 写回 result；
+    scan（默认 SCAN_INPUT）：解析的同时扫描同一批字节，统计写入 result["scan"] 并与输出行数核对；
+    normalizer（faers_drugnorm.DrugNormalizer）：DRUG 表追加规范药名列，缓存命中统计写入 result["drug_norm"]；
+    interner（StringInterner）：CSV 写出时驻留高重复字符串列（可选编码旁路文件）；
+    writer（默认 CSV_WRITER）：CSV 写出方式
+    """
+    table = table_of(os.path.basename(member or input_path))
+    parse_engine = chunk_engine(engine) if use_chunk else engine
+    scanner = LineScanner(cr_breaks=scan_cr_breaks(parse_engine)) if (SCAN_INPUT if scan is None else scan) else None
+    if table != "DRUG":
+        normalizer = None
+    norm_before = normalizer.snapshot() if normalizer is not None else None
+    if use_chunk:
+        def prepared(chunks):
+            while True:
+                with phase("parse"):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                with phase("clean"):
+                    if not result.get("schema_era"):
+                        result["schema_era"] = faers_schema.detect_era(table, chunk.columns)
+                    chunk = prepare_frame(chunk, table, normalizer)
+                yield chunk
+
+        chunk_rows = chunk_rows or CHUNK_ROWS
+        chunks = read_faers_chunks(input_path, engine=engine, chunk_rows=chunk_rows, byte_range=byte_range,
+                                   member=member, scanner=scanner)
+        rows, cols = atomic_write_chunks(prepared(chunks), out_path, table, logger, output_format, clean=False,
+                                         interner=interner, writer=writer)
+        result["rows"] = rows
+        result["cols"] = cols
+        result["mode"] = "chunk"
+        result["chunk_rows"] = chunk_rows
+        engine = chunk_engine(engine)
+    else:
+        with phase("parse"):
+            df = read_faers_full(input_path, engine=engine, byte_range=byte_range, member=member, scanner=scanner)
+        with phase("clean"):
+            result["schema_era"] = faers_schema.detect_era(table, df.columns)
+            df = prepare_frame(df, table, normalizer)
+        result["rows"] = len(df)
+        result["cols"] = df.shape[1]
+        result["mode"] = "full"
+        atomic_write(df, out_path, table, output_format, interner, writer)
+    result["engine"] = engine
+    if normalizer is not None:
+        result["drug_norm"] = normalizer.delta(norm_before)
+
+    if scanner is not None:
+        stats = result["scan"] = scanner.result()
+        if stats["expected_rows"] != result["rows"]:
+            # 解析器与扫描结论不一致（如首个数据行字段过多时 pandas 把首列当索引）：输出不可信，删除并按引擎拒绝处理
+            result["row_mismatch"] = {"engine": engine, "parsed": result["rows"], "expected": stats["expected_rows"],
+                                      "long_lines": stats["long_lines"][:5]}
+            for path in (out_path, sidecar_path(out_path)):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise RowCountMismatch(
+                f"Row count mismatch {os.path.basename(member or input_path)}: engine={engine} parsed={result['rows']} "
+                f"scan expects={stats['expected_rows']} (long rows at lines {stats['long_lines'][:5]})"
+            )
+
+
+class RowCountMismatch(ValueError):
+    """解析行数与单遍扫描的期望行数不一致（ValueError：与快速引擎拒绝输入一样回退 python 引擎）"""
+
+
 # =========================================================
 # 9) 多进程调用函数：带重试
 # =========================================================
 
+def new_result(task: dict) -> dict:
+    return {
+        "year": task["year"],
+        "quarter": task["quarter"],
+        "file": task["stem"],
+        "input_path": task["input_path"],
+        "member": task.get("member"),
+        "output_path": task["output_path"],
+        "status": "FAIL",
+        "reason": "",
+        "attempts": 0,
+        "rows": 0,
+        "cols": 0,
+        "seconds": 0.0,
+        "mode": "",
+        "engine": "",
+        "engine_fallback": False,
+        "row_mismatch": None,
+        "schema_era": "",
+        "chunk_rows": None,
+        "scan": None,
+        "drug_norm": None,
+        "phases": {},
+        "bytes_read": 0,
+        "bytes_written": 0,
+        "rows_per_sec": 0.0,
+        "mb_per_sec": 0.0,
+        "peak_rss_mb": 0.0,
+        "retry_seconds": 0.0,
+        "part": task.get("part"),
+        "parts": task.get("parts"),
+    }
+
+
+def finish_telemetry(result: dict, telemetry: TaskTelemetry, bytes_read: int):
+    """阶段耗时 / 读写字节 / 吞吐 / 峰值 RSS 写回 result"""
+    result["phases"] = telemetry.as_dict()
+    result["bytes_read"] = bytes_read
+    try:
+        result["bytes_written"] = os.path.getsize(result["output_path"]) if result["status"] == "OK" else 0
+    except OSError:
+        result["bytes_written"] = 0
+    seconds = result["seconds"]
+    result["rows_per_sec"] = round(result["rows"] / seconds, 1) if seconds > 0 else 0.0
+    result["mb_per_sec"] = round(bytes_read / (1024 * 1024) / seconds, 3) if seconds > 0 else 0.0
+    result["peak_rss_mb"] = round(telemetry.peak_rss / (1024 * 1024), 1)
+
+
 def convert_task_with_retry(task: dict) -> dict:
+    """解码一个任务并附上遥测（阶段耗时、读写字节、吞吐、峰值 RSS、重试代价）"""
+    global TASK_TELEMETRY
+    telemetry = TASK_TELEMETRY = TaskTelemetry()
+    try:
+        result = _convert_task(task, telemetry)
+    finally:
+        TASK_TELEMETRY = None
+    bytes_read = task.get("size_bytes")
+    if bytes_read is None:
+        bytes_read = os.path.getsize(task["input_path"]) if os.path.exists(task["input_path"]) else 0
+    finish_telemetry(result, telemetry, bytes_read)
+    return result
+
+
+def _convert_task(task: dict, telemetry: TaskTelemetry) -> dict:
     logger = WORKER_LOGGER
     s = WORKER_SETTINGS
 
@@ -299,30 +2584,13 @@ def convert_task_with_retry(task: dict) -> dict:
     q = task["quarter"]
     stem = task["stem"]
     input_path = task["input_path"]
+    member = task.get("member")
     out_path = task["output_path"]
 
-    result = {
-        "year": year,
-        "quarter": q,
-        "file": stem,
-        "input_path": input_path,
-        "output_path": out_path,
-        "status": "FAIL",
-        "reason": "",
-        "attempts": 0,
-        "rows": 0,
-        "cols": 0,
-        "seconds": 0.0,
-        "mode": "",
-    }
-
-    # 跳过已存在输出
-    if s["skip_existing"] and os.path.exists(out_path) and os.path.getsize(out_path) > 0:
-        result["status"] = "SKIP"
-        result["reason"] = "OUTPUT_EXISTS"
-        return result
+    result = new_result(task)
 
-    ok, reason = basic_file_validate(input_path)
+    with telemetry.phase("validate"):
+        ok, reason = basic_file_validate(input_path, member, check_head=not s.get("scan_input", SCAN_INPUT))
     if not ok:
         result["reason"] = reason
         logger.error(f"[{year}/{q}] Precheck failed: {stem} | reason={reason} | path={input_path}")
@@ -330,35 +2598,67 @@ def convert_task_with_retry(task: dict) -> dict:
     if reason == "NO_DELIM_IN_HEAD_WARN":
         logger.warning(f"[{year}/{q}] Precheck warn(no '$' in head): {stem} | path={input_path}")
 
-    size_mb = os.path.getsize(input_path) / (1024 * 1024)
-    use_chunk = size_mb >= s["chunk_threshold_mb"]
+    # 解码前记录输入签名：解码期间输入若被改写，下次运行会重新处理
+    with telemetry.phase("validate"):
+        result["input_sig"] = input_signature(input_path, member=member)
+
+    byte_range = task.get("byte_range")
+    if byte_range is not None:
+        stem = f"{stem}#part{task['part'] + 1}/{task['parts']}"
+    size_mb = task.get("size_bytes", os.path.getsize(input_path)) / (1024 * 1024)
+    with telemetry.phase("sample"):
+        plan = choose_chunking(task, s, logger)
+    engine = s["parse_engine"]
+    normalizer = get_drug_normalizer(s)
+    interner = get_string_interner(s)
 
     for attempt in range(1, s["max_retries"] + 1):
         result["attempts"] = attempt
         start = time.time()
+        before = telemetry.checkpoint()
 
         try:
-            logger.info(f"[{year}/{q}] Start {stem} | attempt={attempt} | {size_mb:.1f}MB | mode={'chunk' if use_chunk else 'full'}")
-
-            if use_chunk:
-                chunks = read_faers_chunks(input_path)
-                rows, cols = atomic_write_csv_chunks(chunks, out_path, logger)
-                result["rows"] = rows
-                result["cols"] = cols
-                result["mode"] = "chunk"
-            else:
-                df = read_faers_full(input_path)
-                df = clean_df(df)
-                result["rows"] = len(df)
-                result["cols"] = df.shape[1]
-                result["mode"] = "full"
-                atomic_write_csv(df, out_path)
+            use_chunk, chunk_rows = plan["use_chunk"], plan["chunk_rows"]
+            logger.info(
+                f"[{year}/{q}] Start {stem} | attempt={attempt} | {size_mb:.1f}MB | "
+                f"mode={f'chunk({chunk_rows})' if use_chunk else 'full'} | engine={engine}"
+            )
+
+            try:
+                decode_file(input_path, out_path, use_chunk, engine, result, logger, s["output_format"], byte_range,
+                            member, chunk_rows, s.get("scan_input", SCAN_INPUT), normalizer, interner,
+                            s.get("csv_writer"))
+            except ValueError:
+                # 快速引擎拒绝输入（ParserError / ArrowInvalid / 不支持的参数）-> 本文件回退 python 引擎
+                if engine == "python":
+                    raise
+                logger.warning(f"[{year}/{q}] Engine '{engine}' rejected {stem}, fallback to python engine")
+                if result["row_mismatch"]:
+                    logger.warning(f"[{year}/{q}] Row count mismatch {stem}: {result['row_mismatch']}")
+                logger.warning(traceback.format_exc())
+                engine = "python"
+                result["engine_fallback"] = True
+                decode_file(input_path, out_path, use_chunk, engine, result, logger, s["output_format"], byte_range,
+                            member, chunk_rows, s.get("scan_input", SCAN_INPUT), normalizer, interner,
+                            s.get("csv_writer"))
 
             result["status"] = "OK"
             result["reason"] = "OK"
             result["seconds"] = round(time.time() - start, 3)
 
             logger.info(f"[{year}/{q}] OK {stem} | rows={result['rows']} cols={result['cols']} sec={result['seconds']}")
+            if result.get("drug_norm"):
+                dn = result["drug_norm"]
+                logger.info(f"[{year}/{q}] Drug names {stem} | distinct={dn['distinct']} computed={dn['computed']} "
+                            f"hit_rate={dn['hit_rate']:.2%}")
+            scan = result.get("scan")
+            if scan and (scan["long_rows"] or scan["short_rows"] or not scan["header_has_delim"]
+                         or not scan["ends_with_newline"]):
+                logger.warning(
+                    f"[{year}/{q}] Data quality {stem} | long_rows={scan['long_rows']} {scan['long_lines'][:5]} "
+                    f"| short_rows={scan['short_rows']} {scan['short_lines'][:5]} "
+                    f"| header_has_delim={scan['header_has_delim']} ends_with_newline={scan['ends_with_newline']}"
+                )
             return result
 
         except MemoryError:
@@ -366,12 +2666,27 @@ def convert_task_with_retry(task: dict) -> dict:
             logger.error(f"[{year}/{q}] MemoryError {stem} attempt={attempt}")
             logger.error(traceback.format_exc())
             gc.collect()
+            # 同样的块大小再试大概率还会失败：下一次改用减半的块
+            plan = shrink_chunking(plan)
+            logger.info(f"[{year}/{q}] Next attempt of {stem} uses chunk mode with {plan['chunk_rows']} rows")
+
+        except RowCountMismatch:
+            # python 引擎同样不一致：重试结果不会变，直接判失败
+            result["seconds"] = round(time.time() - start, 3)
+            result["status"] = "FAIL"
+            result["reason"] = "ROW_COUNT_MISMATCH"
+            logger.error(f"[{year}/{q}] FAIL {stem}: {traceback.format_exc(limit=0).strip()}")
+            return result
 
         except Exception:
             result["seconds"] = round(time.time() - start, 3)
             logger.error(f"[{year}/{q}] Exception {stem} attempt={attempt}")
             logger.error(traceback.format_exc())
 
+        # 失败尝试的耗时（含下面的退避等待）记为重试代价，不计入阶段耗时
+        telemetry.restore(before)
+        result["retry_seconds"] = round(result["retry_seconds"] + time.time() - start, 3)
+
         # 清理 tmp
         try:
             tmp_path = out_path + ".tmp"
@@ -384,6 +2699,7 @@ def convert_task_with_retry(task: dict) -> dict:
             backoff = s["base_backoff_sec"] * attempt
             logger.info(f"[{year}/{q}] Retry {stem} after {backoff}s...")
             time.sleep(backoff)
+            result["retry_seconds"] = round(result["retry_seconds"] + backoff, 3)
         else:
             result["status"] = "FAIL"
             result["reason"] = "FAILED_AFTER_RETRIES"
@@ -395,10 +2711,82 @@ def convert_task_with_retry(task: dict) -> dict:
 # 10) 主流程：发现任务 -> 多进程 -> 汇总 -> 失败清单
 # =========================================================
 
-def main():
+def validate_config():
+    if PARSE_ENGINE not in PARSE_ENGINES:
+        raise ValueError(f"PARSE_ENGINE must be one of {PARSE_ENGINES}, got {PARSE_ENGINE!r}")
+    if OUTPUT_FORMAT not in OUTPUT_FORMATS:
+        raise ValueError(f"OUTPUT_FORMAT must be one of {OUTPUT_FORMATS}, got {OUTPUT_FORMAT!r}")
+    if INPUT_SOURCE not in INPUT_SOURCES:
+        raise ValueError(f"INPUT_SOURCE must be one of {INPUT_SOURCES}, got {INPUT_SOURCE!r}")
+    if CSV_WRITER not in CSV_WRITERS:
+        raise ValueError(f"CSV_WRITER must be one of {CSV_WRITERS}, got {CSV_WRITER!r}")
+    if CSV_COMPRESSION is not None and CSV_COMPRESSION not in CSV_COMPRESSION_EXTS:
+        raise ValueError(f"CSV_COMPRESSION must be one of {(None,) + tuple(CSV_COMPRESSION_EXTS)}, got {CSV_COMPRESSION!r}")
+    if CSV_COMPRESSION == "zstd" and OUTPUT_FORMAT == "csv":
+        _zstandard()
+
+
+def run_settings(budget_mb=None) -> dict:
+    """传给 worker 的运行配置（也是配置指纹的来源）"""
+    return {
+        "run_dir": RUN_DIR,
+        "max_retries": MAX_RETRIES,
+        "base_backoff_sec": BASE_BACKOFF_SEC,
+        "chunk_threshold_mb": CHUNK_THRESHOLD_MB,
+        "adaptive_chunking": ADAPTIVE_CHUNKING,
+        "memory_budget_mb": budget_mb,
+        "scan_input": SCAN_INPUT,
+        "normalize_drugs": NORMALIZE_DRUG_NAMES,
+        "drug_norm_cache": DRUG_NORM_CACHE or os.path.join(OUTPUT_ROOT, "_drugnorm_cache.sqlite"),
+        "intern_strings": INTERN_STRINGS,
+        "intern_max_entries": INTERN_MAX_ENTRIES,
+        "dict_sidecar": DICT_SIDECAR,
+        "csv_writer": CSV_WRITER,
+        "csv_compression": CSV_COMPRESSION if OUTPUT_FORMAT == "csv" else None,
+        "skip_existing": SKIP_EXISTING,
+        "parse_engine": PARSE_ENGINE,
+        "output_format": OUTPUT_FORMAT,
+        "config_overrides": dict(CONFIG_OVERRIDES),
+    }
+
+
+def dry_run(logger: logging.Logger = None) -> dict:
+    """只做任务发现 + 增量清单比对 + 调度规划：不建运行目录、不启动进程池、不写任何文件"""
+    validate_config()
+    logger = logger or build_main_logger(to_file=False)
+    tasks = discover_tasks(logger)
+    fingerprint = config_fingerprint(run_settings())
+    manifest = load_manifest(manifest_path())
+    todo = [t for t in tasks
+            if not (SKIP_EXISTING and is_up_to_date(t, manifest.get(manifest_key(t)), fingerprint))]
+    proc_num = max(1, int(PROCESS_NUM if PROCESS_NUM is not None else min(os.cpu_count() or 2, len(tasks) or 1)))
+    min_parts = SPLIT_MIN_PARTS if SPLIT_MIN_PARTS is not None else proc_num
+    jobs = plan_jobs(todo, split=SPLIT_LARGE_FILES, min_parts=min_parts) if todo else []
+    plan = {
+        "tasks": len(tasks),
+        "up_to_date": len(tasks) - len(todo),
+        "to_build": len(todo),
+        "jobs": len(jobs),
+        "input_mb": round(sum(j["size_bytes"] for j in jobs) / (1024 * 1024), 1),
+        "process_num": proc_num,
+        "config": fingerprint,
+    }
+    logger.info("Dry run: " + " | ".join(f"{k}={v}" for k, v in plan.items()))
+    for t in todo:
+        logger.info(f"  to build: {t['year']}/{t['quarter']} {t['stem']} -> {t['output_path']}")
+    return plan
+
+
+def main(pool=None):
+    """
+    pool：已启动的常驻进程池（faers_daemon，worker 以 warm_worker 预热过）；None 时本次运行新建 spawn 进程池。
+    返回 report_*.json 路径（未发现任务时为 None）
+    """
+    validate_config()
+
     main_logger = build_main_logger()
     main_logger.info("===== FAERS DECODE (ALL YEARS/QUARTERS) START =====")
-    main_logger.info(f"INPUT_ROOT : {INPUT_ROOT}")
+    main_logger.info(f"INPUT_ROOT : {RAW_ZIP_ROOT if INPUT_SOURCE == 'zip' else INPUT_ROOT} (source={INPUT_SOURCE})")
     main_logger.info(f"OUTPUT_ROOT: {OUTPUT_ROOT}")
     main_logger.info(f"RUN_DIR    : {RUN_DIR}")
 
@@ -406,36 +2794,99 @@ def main():
     total = len(tasks)
     if total == 0:
         main_logger.warning("No tasks discovered. Check directory structure and file extensions.")
-        return
+        return None
 
     cpu = os.cpu_count() or 2
     proc_num = PROCESS_NUM if PROCESS_NUM is not None else min(cpu, total)
     proc_num = max(1, int(proc_num))
 
     main_logger.info(f"CPU_COUNT={cpu} | PROCESS_NUM={proc_num} | MAX_RETRIES={MAX_RETRIES} | SKIP_EXISTING={SKIP_EXISTING}")
-    main_logger.info(f"CHUNK_THRESHOLD_MB={CHUNK_THRESHOLD_MB} | CHUNK_ROWS={CHUNK_ROWS}")
+    main_logger.info(f"CHUNK_THRESHOLD_MB={CHUNK_THRESHOLD_MB} | CHUNK_ROWS={CHUNK_ROWS} | PARSE_ENGINE={PARSE_ENGINE} | OUTPUT_FORMAT={OUTPUT_FORMAT}")
+    main_logger.info(f"CSV_WRITER={CSV_WRITER} | CSV_COMPRESSION={CSV_COMPRESSION}")
+    budget = memory_budget_bytes(proc_num) if ADAPTIVE_CHUNKING else None
+    budget_mb = round(budget / (1024 * 1024), 1) if budget else None
+    main_logger.info(
+        f"ADAPTIVE_CHUNKING={ADAPTIVE_CHUNKING} | memory budget per worker={budget_mb}MB"
+        + ("" if budget or not ADAPTIVE_CHUNKING else " (memory size unknown -> fixed CHUNK_THRESHOLD_MB / CHUNK_ROWS)")
+    )
 
-    settings = {
-        "run_dir": RUN_DIR,
-        "max_retries": MAX_RETRIES,
-        "base_backoff_sec": BASE_BACKOFF_SEC,
-        "chunk_threshold_mb": CHUNK_THRESHOLD_MB,
-        "skip_existing": SKIP_EXISTING,
-    }
+    settings = run_settings(budget_mb)
 
-    ctx = get_context("spawn")  # Windows 友好
     start_all = time.time()
     results = []
 
-    with ctx.Pool(processes=proc_num, initializer=worker_init, initargs=(settings,)) as pool:
-        completed = 0
-        for res in pool.imap_unordered(convert_task_with_retry, tasks):
+    # 增量：按清单只做元数据比对，已是最新的任务不进进程池
+    fingerprint = config_fingerprint(settings)
+    mf_path = manifest_path()
+    manifest = load_manifest(mf_path)
+    todo = []
+    for task in tasks:
+        if SKIP_EXISTING and is_up_to_date(task, manifest.get(manifest_key(task)), fingerprint):
+            res = new_result(task)
+            res["status"] = "SKIP"
+            res["reason"] = "UP_TO_DATE"
             results.append(res)
-            completed += 1
-            main_logger.info(
-                f"[{completed}/{total}] {res['status']} {res['year']}/{res['quarter']} {res['file']} "
-                f"| rows={res.get('rows')} cols={res.get('cols')} sec={res.get('seconds')} mode={res.get('mode')} reason={res.get('reason')}"
-            )
+        else:
+            todo.append(task)
+    main_logger.info(f"Manifest: {mf_path} | up-to-date={len(results)} | to-build={len(todo)} | config={fingerprint}")
+    if os.path.exists(journal_path(mf_path)):
+        # 上次运行没走到最后：先把日志压实，本次的追加从空日志开始
+        save_manifest(mf_path, manifest)
+
+    if todo:
+        min_parts = SPLIT_MIN_PARTS if SPLIT_MIN_PARTS is not None else proc_num
+        jobs = plan_jobs(todo, split=SPLIT_LARGE_FILES, min_parts=min_parts)
+        proc_num = min(proc_num, len(jobs))
+        max_large = max(1, MAX_LARGE_IN_FLIGHT if MAX_LARGE_IN_FLIGHT is not None else proc_num // 2)
+        large_bytes = SPLIT_PART_MB * 1024 * 1024
+        main_logger.info(
+            f"Scheduled jobs: {len(jobs)} (from {len(todo)} files, largest first) | "
+            f"MAX_LARGE_IN_FLIGHT={max_large} | SPLIT_LARGE_FILES={SPLIT_LARGE_FILES} | "
+            f"SPLIT_PART_MB={SPLIT_PART_MB} | SPLIT_MIN_PARTS={min_parts}"
+        )
+
+        ctx = get_context("spawn")  # Windows 友好
+        parts_done = {}
+        own_pool = pool is None
+        with (ctx.Pool(processes=proc_num, initializer=worker_init, initargs=(settings,)) if own_pool
+              else nullcontext(pool)) as pool:
+            completed = len(results)
+            while jobs:
+                serial_retry = []
+                for job, res in run_scheduled(pool, jobs, proc_num, max_large, large_bytes,
+                                              None if own_pool else settings):
+                    if job.get("byte_range") is not None:
+                        done = parts_done.setdefault(job["final_output_path"], [])
+                        done.append(res)
+                        main_logger.info(
+                            f"  part {job['part'] + 1}/{job['parts']} {res['status']} {res['year']}/{res['quarter']} {res['file']} "
+                            f"| rows={res.get('rows')} sec={res.get('seconds')}"
+                        )
+                        if len(done) < job["parts"]:
+                            continue
+                        res = merge_part_results(job, parts_done.pop(job["final_output_path"]), OUTPUT_FORMAT, main_logger)
+                        if res["reason"].startswith("PART_COLUMNS_MISMATCH"):
+                            main_logger.warning(f"{res['year']}/{res['quarter']} {res['file']}: parts disagree on columns -> re-run serially")
+                            serial_retry.append(unsplit_task(job))
+                            continue
+
+                    results.append(res)
+                    completed += 1
+                    main_logger.info(
+                        f"[{completed}/{total}] {res['status']} {res['year']}/{res['quarter']} {res['file']} "
+                        f"| rows={res.get('rows')} cols={res.get('cols')} sec={res.get('seconds')} mode={res.get('mode')} reason={res.get('reason')}"
+                    )
+                    key = manifest_key(res)
+                    if res["status"] == "OK":
+                        manifest[key] = manifest_entry(res, fingerprint)
+                    else:
+                        manifest.pop(key, None)
+                    append_manifest(mf_path, key, manifest.get(key))
+
+                jobs = plan_jobs(serial_retry, split=False)
+
+    # 压实日志；全部最新时也落盘一次，保存只刷新了 mtime 的条目
+    save_manifest(mf_path, manifest)
 
     elapsed = round(time.time() - start_all, 3)
 
@@ -452,6 +2903,7 @@ def main():
 
     failed_txt = os.path.join(RUN_DIR, f"failed_files_{RUN_TS}.txt")
     report_json = os.path.join(RUN_DIR, f"report_{RUN_TS}.json")
+    telemetry_jsonl = os.path.join(RUN_DIR, f"telemetry_{RUN_TS}.jsonl")
 
     if fail_list:
         with open(failed_txt, "w", encoding="utf-8") as f:
@@ -461,15 +2913,40 @@ def main():
     else:
         main_logger.info("No failed files.")
 
+    results = sorted(results, key=lambda x: (x["year"], x["quarter"], x["file"]))
+    summary = faers_report.summarize(results)
+    for line in faers_report.format_summary(summary).splitlines():
+        main_logger.info(line)
+    if summary["total"]["norm_distinct"]:
+        main_logger.info(
+            f"Drug name cache: distinct lookups={summary['total']['norm_distinct']} "
+            f"computed={summary['total']['norm_computed']} hit_rate={summary['total']['norm_hit_rate']:.2%}"
+        )
+
+    # 每个任务一行遥测（阶段耗时 / 读写字节 / 吞吐 / 峰值 RSS / 重试代价），便于逐行追加分析
+    with open(telemetry_jsonl, "w", encoding="utf-8") as f:
+        for r in results:
+            f.write(json.dumps({"run_ts": RUN_TS, **r}, ensure_ascii=False) + "\n")
+    main_logger.info(f"Telemetry saved: {telemetry_jsonl}")
+
     report = {
         "run_ts": RUN_TS,
-        "input_root": INPUT_ROOT,
+        "input_root": RAW_ZIP_ROOT if INPUT_SOURCE == "zip" else INPUT_ROOT,
+        "input_source": INPUT_SOURCE,
         "output_root": OUTPUT_ROOT,
         "process_num": proc_num,
         "max_retries": MAX_RETRIES,
         "skip_existing": SKIP_EXISTING,
         "chunk_threshold_mb": CHUNK_THRESHOLD_MB,
         "chunk_rows": CHUNK_ROWS,
+        "adaptive_chunking": ADAPTIVE_CHUNKING,
+        "memory_budget_mb": budget_mb,
+        "parse_engine": PARSE_ENGINE,
+        "output_format": OUTPUT_FORMAT,
+        "csv_writer": CSV_WRITER,
+        "csv_compression": CSV_COMPRESSION,
+        "split_large_files": SPLIT_LARGE_FILES,
+        "split_part_mb": SPLIT_PART_MB,
         "elapsed_sec": elapsed,
         "counts": {
             "total": total,
@@ -477,7 +2954,8 @@ def main():
             "skip": len(skip_list),
             "fail": len(fail_list),
         },
-        "results": sorted(results, key=lambda x: (x["year"], x["quarter"], x["file"])),
+        "summary": summary,
+        "results": results,
     }
 
     with open(report_json, "w", encoding="utf-8") as f:
@@ -485,7 +2963,19 @@ def main():
 
     main_logger.info(f"Report saved: {report_json}")
     main_logger.info(f"Process logs in: {RUN_DIR}")
+
+    if BUILD_INDEX:
+        import faers_index
+
+        faers_index.build_index(OUTPUT_ROOT, logger=main_logger)
+
+    if BUILD_STORE:
+        import faers_store
+
+        faers_store.load_store(OUTPUT_ROOT, logger=main_logger)
+
     main_logger.info("===== FAERS DECODE END =====")
+    return report_json
 
 
 if __name__ == "__main__":
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+FAERS 跨季度去重：同一 caseid 只保留最新版本（fda_dt 最大，其次 primaryid 最大，再次季度最新），
+其余 6 张表只保留被选中版本在其所属季度里的行。
+
+内存与年份数无关：
+  1) DEMO 的 (caseid, primaryid, fda_dt, 季度) 按 caseid 哈希分区落盘
+  2) 每个分区单独排序取最新 -> 幸存的 (primaryid, 季度) 再按 primaryid 哈希分区落盘
+  3) 各表逐块读取、按 primaryid 哈希分区落盘；每个分区只与同分区的幸存集合过滤
+任何时刻每个进程只持有一个数据块或一个分区。
+"""
+
+import os
+import glob
+import time
+import shutil
+import logging
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+import faers_decode_final as fd
+
+# =========================================================
+# 0) 配置区
+# =========================================================
+
+# 输入：faers_decode_final 的输出根目录（CSV 或 Parquet，按扩展名自动识别）
+INPUT_ROOT = fd.OUTPUT_ROOT
+
+# 输出：DEDUP_DATA\{TABLE}\part-000.{csv|parquet}
+DEDUP_ROOT = os.path.join(fd.BASE_DIR, "DEDUP_DATA")
+
+# 输出格式（None = 跟随解码输出 fd.OUTPUT_FORMAT）
+OUTPUT_FORMAT = None
+
+# 哈希分区数：单个分区约为总量 / N_PARTITIONS，决定每个进程的峰值内存
+N_PARTITIONS = 64
+
+# 进程数（None = CPU 核数）
+PROCESS_NUM = None
+
+# 年份范围（None = 不限）
+START_YEAR = None
+END_YEAR = None
+
+# 需要按幸存 primaryid 过滤的表（DEMO 本身也过滤，只留幸存版本）
+DEDUP_TABLES = ("DEMO", "DRUG", "REAC", "OUTC", "INDI", "THER", "RPSR")
+
+# AERS 旧版（2004–2012Q3）列名 -> FAERS 列名
+ID_ALIASES = {"isr": "primaryid", "case": "caseid"}
+
+# id 落盘记录：季度键 qkey = year * 10 + quarter
+ID_DTYPE = np.dtype([("caseid", "<i8"), ("primaryid", "<i8"), ("fda_dt", "<i8"), ("qkey", "<i8")])
+KEEP_DTYPE = np.dtype([("primaryid", "<i8"), ("qkey", "<i8")])
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+# =========================================================
+# 1) 工具
+# =========================================================
+
+def get_logger() -> logging.Logger:
+    logger = logging.getLogger("faers_dedup")
+    if not logger.handlers:
+        h = logging.StreamHandler()
+        h.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+        logger.addHandler(h)
+        logger.setLevel(logging.INFO)
+    return logger
+
+
+def partition_of(ids: np.ndarray, n: int) -> np.ndarray:
+    """乘法哈希（Fibonacci hashing）：连续 id 也能均匀打散到各分区"""
+    with np.errstate(over="ignore"):
+        h = ids.astype(np.uint64) * _GOLDEN
+    return ((h >> np.uint64(32)) % np.uint64(n)).astype(np.int64)
+
+
+def to_int64(col: pd.Series) -> np.ndarray:
+    """字符串 id -> int64；空值 / 非数字 -> -1"""
+    return pd.to_numeric(col, errors="coerce").fillna(-1).astype("int64").to_numpy()
+
+
+def dates_to_int(col: pd.Series) -> np.ndarray:
+    """YYYYMMDD / YYYYMM / YYYY -> int YYYYMMDD（不足位补 01）；无法解析 -> 0"""
+    s = col.astype(str).str.strip()
+    n = s.str.len()
+    s = s.where(n != 6, s + "01").where(n != 4, s + "0101")
+    return pd.to_numeric(s, errors="coerce").fillna(0).astype("int64").to_numpy()
+
+
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    return df.rename(columns=lambda c: ID_ALIASES.get(c.lower(), c.lower()))
+
+
+def discover_outputs(input_root: str, start_year=None, end_year=None) -> dict:
+    """{TABLE: [(qkey, path), ...]}，按季度排序；同一季度同表若有 csv 与 parquet 两份，取 parquet"""
+    found = {}
+    for path in glob.glob(os.path.join(input_root, "*", "Q[1-4]", "*.*")):
+        year = os.path.basename(os.path.dirname(os.path.dirname(path)))
+        quarter = os.path.basename(os.path.dirname(path))
+        stem, ext = fd.split_output_name(os.path.basename(path))
+        if not (year.isdigit() and len(year) == 4) or ext not in fd.OUTPUT_SUFFIXES or ".part" in stem:
+            continue
+        if (start_year and int(year) < start_year) or (end_year and int(year) > end_year):
+            continue
+        table = fd.table_of(stem)
+        if table not in DEDUP_TABLES:
+            continue
+        qkey = int(year) * 10 + int(quarter[1])
+        prev = found.setdefault(table, {}).get(qkey)
+        if prev is None or ext == ".parquet":
+            found[table][qkey] = path
+    return {t: sorted(d.items()) for t, d in found.items()}
+
+
+def _append_records(path: str, arr: np.ndarray):
+    with open(path, "ab") as f:
+        arr.tofile(f)
+
+
+# =========================================================
+# 2) 各阶段的进程函数（顶层函数，spawn 可 pickle）
+# =========================================================
+
+def spill_demo_ids(qkey: int, path: str, work_dir: str, n_parts: int, chunk_rows: int) -> int:
+    """阶段 1：一个季度的 DEMO -> 按 caseid 分区的定长二进制记录（每个输入文件各写各的，互不加锁）"""
+    rows = 0
+    for df in fd.read_output_chunks(path, columns=None, chunk_rows=chunk_rows):
+        df = normalize_columns(df)
+        rec = np.empty(len(df), dtype=ID_DTYPE)
+        rec["caseid"] = to_int64(df["caseid"])
+        rec["primaryid"] = to_int64(df["primaryid"])
+        rec["fda_dt"] = dates_to_int(df["fda_dt"]) if "fda_dt" in df.columns else 0
+        rec["qkey"] = qkey
+        rec = rec[(rec["caseid"] >= 0) & (rec["primaryid"] >= 0)]
+        parts = partition_of(rec["caseid"], n_parts)
+        for p in np.unique(parts):
+            _append_records(os.path.join(work_dir, "ids", f"p{p:03d}", f"{qkey}.bin"), rec[parts == p])
+        rows += len(rec)
+    return rows
+
+
+def select_latest(p: int, work_dir: str, n_parts: int) -> (int, int):
+    """阶段 2：一个 caseid 分区内每个 caseid 取最新版本；幸存者按 primaryid 重新分区落盘"""
+    files = glob.glob(os.path.join(work_dir, "ids", f"p{p:03d}", "*.bin"))
+    if not files:
+        return 0, 0
+    rec = np.concatenate([np.fromfile(f, dtype=ID_DTYPE) for f in files])
+    # 按 (caseid, fda_dt, primaryid, qkey) 升序，每个 caseid 的最后一条即最新版本
+    order = np.lexsort((rec["qkey"], rec["primaryid"], rec["fda_dt"], rec["caseid"]))
+    rec = rec[order]
+    last = np.ones(len(rec), dtype=bool)
+    last[:-1] = rec["caseid"][1:] != rec["caseid"][:-1]
+    keep = np.empty(int(last.sum()), dtype=KEEP_DTYPE)
+    keep["primaryid"] = rec["primaryid"][last]
+    keep["qkey"] = rec["qkey"][last]
+
+    parts = partition_of(keep["primaryid"], n_parts)
+    for q in np.unique(parts):
+        _append_records(os.path.join(work_dir, "keep", f"p{q:03d}", f"from{p:03d}.bin"), keep[parts == q])
+    return len(rec), len(keep)
+
+
+def spill_table(table: str, qkey: int, path: str, columns: list, work_dir: str, n_parts: int,
+                chunk_rows: int) -> int:
+    """阶段 3a：一个季度的某表 -> 按 primaryid 分区的 CSV（列统一为该表全部季度的并集）"""
+    rows = 0
+    for df in fd.read_output_chunks(path, chunk_rows=chunk_rows):
+        df = normalize_columns(df).reindex(columns=columns, fill_value="")
+        pid = to_int64(df["primaryid"])
+        df.insert(0, "_qkey", qkey)
+        parts = partition_of(pid, n_parts)
+        for p in np.unique(parts):
+            out = os.path.join(work_dir, "rows", table, f"p{p:03d}", f"{qkey}.csv")
+            sub = df[parts == p]
+            sub.to_csv(out, mode="a", header=not os.path.exists(out), index=False, encoding="utf-8")
+        rows += len(df)
+    return rows
+
+
+def filter_partition(table: str, p: int, work_dir: str, out_path: str, output_format: str,
+                     chunk_rows: int) -> (int, int):
+    """阶段 3b：一个 primaryid 分区的行只保留 (primaryid, 季度) 命中幸存集合的，原子写出（无幸存行的分区不留文件）"""
+    row_files = sorted(glob.glob(os.path.join(work_dir, "rows", table, f"p{p:03d}", "*.csv")))
+    if not row_files:
+        return 0, 0
+    keep_files = glob.glob(os.path.join(work_dir, "keep", f"p{p:03d}", "*.bin"))
+    keep = np.concatenate([np.fromfile(f, dtype=KEEP_DTYPE) for f in keep_files]) if keep_files \
+        else np.empty(0, dtype=KEEP_DTYPE)
+    keep_keys = np.sort(keep["primaryid"] * 100_000 + keep["qkey"])
+
+    seen = set()
+    counts = {"in": 0, "out": 0}
+
+    def chunks():
+        for f in row_files:
+            with pd.read_csv(f, dtype=str, keep_default_na=False, chunksize=chunk_rows, encoding="utf-8") as reader:
+                for df in reader:
+                    counts["in"] += len(df)
+                    keys = to_int64(df["primaryid"]) * 100_000 + df["_qkey"].astype("int64").to_numpy()
+                    hit = np.zeros(len(df), dtype=bool)
+                    if len(keep_keys):
+                        pos = np.minimum(np.searchsorted(keep_keys, keys), len(keep_keys) - 1)
+                        hit = keep_keys[pos] == keys
+                    df = df[hit]
+                    if table == "DEMO":
+                        # 同一季度文件内重复的 DEMO 行只留一条
+                        dup = df["primaryid"].isin(seen) | df["primaryid"].duplicated()
+                        df = df[~dup]
+                        seen.update(df["primaryid"])
+                    if len(df):
+                        counts["out"] += len(df)
+                        yield df.drop(columns="_qkey")
+
+    fd.atomic_write_chunks(chunks(), out_path, table, get_logger(), output_format)
+    if counts["out"] == 0:
+        os.remove(out_path)
+    return counts["in"], counts["out"]
+
+
+# =========================================================
+# 3) 主流程
+# =========================================================
+
+def run_dedup(input_root: str = None, dedup_root: str = None, output_format: str = None,
+              n_parts: int = None, process_num: int = None, start_year: int = None, end_year: int = None,
+              chunk_rows: int = None) -> dict:
+    logger = get_logger()
+    input_root = input_root or INPUT_ROOT
+    dedup_root = dedup_root or DEDUP_ROOT
+    output_format = output_format or OUTPUT_FORMAT or fd.OUTPUT_FORMAT
+    n_parts = n_parts or N_PARTITIONS
+    chunk_rows = chunk_rows or fd.CHUNK_ROWS
+    start_year = start_year or START_YEAR
+    end_year = end_year or END_YEAR
+
+    outputs = discover_outputs(input_root, start_year, end_year)
+    if "DEMO" not in outputs:
+        raise FileNotFoundError(f"No DEMO outputs under {input_root}")
+
+    work_dir = os.path.join(dedup_root, "_work")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    for p in range(n_parts):
+        os.makedirs(os.path.join(work_dir, "ids", f"p{p:03d}"))
+        os.makedirs(os.path.join(work_dir, "keep", f"p{p:03d}"))
+        for table in outputs:
+            os.makedirs(os.path.join(work_dir, "rows", table, f"p{p:03d}"))
+
+    proc = process_num or PROCESS_NUM or os.cpu_count() or 1
+    ctx = get_context("spawn")
+    t0 = time.time()
+    summary = {"tables": {}}
+
+    with ctx.Pool(processes=proc) as pool:
+        # 阶段 1
+        demo = outputs["DEMO"]
+        n_ids = sum(pool.starmap(spill_demo_ids, [(q, path, work_dir, n_parts, chunk_rows) for q, path in demo]))
+        logger.info(f"[1/3] DEMO ids spilled: {n_ids} rows from {len(demo)} quarters | {time.time() - t0:.1f}s")
+
+        # 阶段 2
+        res = pool.starmap(select_latest, [(p, work_dir, n_parts) for p in range(n_parts)])
+        summary["demo_versions"] = sum(r[0] for r in res)
+        summary["cases"] = sum(r[1] for r in res)
+        logger.info(f"[2/3] cases kept: {summary['cases']} of {summary['demo_versions']} versions | {time.time() - t0:.1f}s")
+
+        # 阶段 3
+        for table, files in outputs.items():
+            columns = []
+            for _, path in files:
+                for c in normalize_columns(pd.DataFrame(columns=fd.output_columns(path))).columns:
+                    if c not in columns:
+                        columns.append(c)
+            if "primaryid" not in columns:
+                logger.warning(f"[SKIP] {table}: no primaryid/isr column")
+                continue
+            pool.starmap(spill_table, [(table, q, path, columns, work_dir, n_parts, chunk_rows) for q, path in files])
+
+            out_dir = os.path.join(dedup_root, table)
+            os.makedirs(out_dir, exist_ok=True)
+            for old in glob.glob(os.path.join(out_dir, "part-*")):
+                os.remove(old)
+            res = pool.starmap(filter_partition, [
+                (table, p, work_dir, os.path.join(out_dir, f"part-{p:03d}.{output_format}"), output_format, chunk_rows)
+                for p in range(n_parts)
+            ])
+            rows_in, rows_out = sum(r[0] for r in res), sum(r[1] for r in res)
+            summary["tables"][table] = {"rows_in": rows_in, "rows_out": rows_out}
+            logger.info(f"[3/3] {table}: {rows_in} -> {rows_out} rows | {time.time() - t0:.1f}s")
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    summary["seconds"] = round(time.time() - t0, 3)
+    return summary
+
+
+if __name__ == "__main__":
+    run_dedup()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+DRUG 表药名（drugname / prod_ai）规范化：大小写、标点、括号注释、剂量、剂型、盐型。
+
+规则全部是 pandas 向量化字符串操作，且只作用于“去重后的”原始值：
+一个季度的 DRUG 有几百万行，但不同的药名只有几万个，同一药名跨季度反复出现。
+原始值 -> 规范名 的映射缓存在三层：
+  1) 进程内 dict（worker 跨任务复用）
+  2) 磁盘 SQLite（所有 worker、所有运行共享；WAL + busy timeout，多进程并发写安全）
+  3) 都未命中才跑规则，结果批量写回磁盘
+规则变化时 NORM_VERSION 加 1：旧缓存整体作废，解码清单的配置指纹随之变化，DRUG 输出自动重建。
+
+例：
+  "Lipitor 20mg tablets"          -> "LIPITOR"
+  "ATORVASTATIN CALCIUM."         -> "ATORVASTATIN"
+  "Tylenol (paracetamol) 500 MG"  -> "TYLENOL"
+  "MAGNESIUM SULFATE"             -> "MAGNESIUM SULFATE"（去掉盐型后只剩阳离子名时不去）
+"""
+
+import os
+import re
+import sqlite3
+
+import pandas as pd
+
+# 规则版本：改动下面任何规则 / 词表时加 1
+NORM_VERSION = 1
+
+# 进程内缓存上限（条）；超过后清空重新积累
+MEMORY_ENTRIES = 500_000
+
+# 一次 SQL IN (...) 查询的参数个数（SQLite 默认上限 999）
+SQL_BATCH = 900
+
+# 剂量：数字 + 单位（可带 /ML、/KG 等分母）
+_DOSE_RE = (
+    r"\b\d+(?:[.,]\d+)?\s*(?:MG|MCG|UG|G|GM|GRAMS?|ML|L|IU|UNITS?|MEQ|MMOL|%)"
+    r"(?:\s*/\s*\d*(?:[.,]\d+)?\s*(?:ML|L|KG|HR|H|DOSE|ACTUATION|SPRAY|G))?(?=\s|$|/|\))"
+)
+
+# 剂型 / 给药途径词
+DOSAGE_FORMS = (
+    "TABLETS", "TABLET", "TABS", "TAB", "CAPSULES", "CAPSULE", "CAPS", "CAP", "INJECTION", "INJ", "SOLUTION",
+    "SOLN", "SUSPENSION", "SUSP", "CREAM", "OINTMENT", "ORAL", "SYRUP", "ELIXIR", "POWDER", "SPRAY", "DROPS",
+    "GEL", "LOTION", "PATCH", "FILM COATED", "FILM-COATED", "EXTENDED RELEASE", "DELAYED RELEASE", "INHALER",
+    "INTRAVENOUS", "SUBCUTANEOUS", "TOPICAL", "VIAL", "AMPOULE",
+)
+_FORM_RE = r"\b(?:" + "|".join(re.escape(w) for w in sorted(DOSAGE_FORMS, key=len, reverse=True)) + r")\b"
+
+# 盐型 / 水合物（只去掉名称末尾的，且前面还有别的词）
+SALT_FORMS = (
+    "HYDROCHLORIDE", "HCL", "DIHYDROCHLORIDE", "HYDROBROMIDE", "SODIUM", "POTASSIUM", "CALCIUM", "MAGNESIUM",
+    "MESYLATE", "MALEATE", "SULFATE", "SULPHATE", "ACETATE", "TARTRATE", "BITARTRATE", "SUCCINATE", "FUMARATE",
+    "BESYLATE", "CITRATE", "PHOSPHATE", "BROMIDE", "HYCLATE", "DIHYDRATE", "MONOHYDRATE", "TRIHYDRATE",
+    "HYDRATE", "ANHYDROUS", "DISODIUM", "DIPROPIONATE", "PROPIONATE", "VALERATE",
+)
+_SALT_RE = r"\s+(?:" + "|".join(SALT_FORMS) + r")$"
+_SALT_SET = set(SALT_FORMS)
+
+
+# =========================================================
+# 1) 向量化规则（输入为去重后的原始值）
+# =========================================================
+
+def normalize_names(values: pd.Series) -> pd.Series:
+    """原始药名 -> 规范名；规则删光的（如只有剂量）退回大写 + 压空白后的原文"""
+    s = values.astype(str).str.upper().str.replace(r"\s+", " ", regex=True).str.strip()
+    base = s
+    s = s.str.replace(r"\([^)]*\)|\[[^\]]*\]", " ", regex=True)
+    s = s.str.replace(_DOSE_RE, " ", regex=True)
+    s = s.str.replace(_FORM_RE, " ", regex=True)
+    s = s.str.replace(r"[.,;:'\"*#!?\\]+", " ", regex=True)
+    s = s.str.replace(r"\s*([/+])\s*", r"\1", regex=True).str.strip(" /+-")
+    s = s.str.replace(r"\s+", " ", regex=True).str.strip()
+    # 末尾盐型最多去两层（"... SODIUM SUCCINATE"）；去掉后只剩一个盐型词（"MAGNESIUM"）则保留原样
+    for _ in range(2):
+        stripped = s.str.replace(_SALT_RE, "", regex=True)
+        s = stripped.where(~stripped.isin(_SALT_SET), s)
+    return s.where(s != "", base)
+
+
+# =========================================================
+# 2) 带持久缓存的规范化器
+# =========================================================
+
+class DrugNormalizer:
+    """
+    norm = DrugNormalizer(cache_path)       # cache_path=None：只用进程内缓存
+    norm.normalize(series) -> 与输入等长的规范名 Series
+    stats：distinct（查询的不同原始值个数）/ memory_hits / disk_hits / computed
+    """
+
+    def __init__(self, cache_path: str = None):
+        self.cache_path = cache_path
+        self.memory = {}
+        self.stats = {"distinct": 0, "memory_hits": 0, "disk_hits": 0, "computed": 0}
+        self._con = None
+
+    # ---------- 磁盘缓存 ----------
+
+    def _connect(self):
+        if self._con is None and self.cache_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+            con = sqlite3.connect(self.cache_path, timeout=60)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            with con:
+                con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                con.execute("CREATE TABLE IF NOT EXISTS names (raw TEXT PRIMARY KEY, norm TEXT NOT NULL) WITHOUT ROWID")
+                row = con.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+                if row is None or int(row[0]) != NORM_VERSION:
+                    con.execute("DELETE FROM names")
+                    con.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(NORM_VERSION),))
+            self._con = con
+        return self._con
+
+    def _disk_lookup(self, raws: list) -> dict:
+        con = self._connect()
+        found = {}
+        if con is None:
+            return found
+        for i in range(0, len(raws), SQL_BATCH):
+            batch = raws[i:i + SQL_BATCH]
+            marks = ",".join("?" * len(batch))
+            found.update(con.execute(f"SELECT raw, norm FROM names WHERE raw IN ({marks})", batch).fetchall())
+        return found
+
+    def _disk_store(self, pairs: dict):
+        con = self._connect()
+        if con is None or not pairs:
+            return
+        with con:
+            con.executemany("INSERT OR IGNORE INTO names VALUES (?, ?)", pairs.items())
+
+    def close(self):
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    # ---------- 查询 ----------
+
+    def lookup(self, raws: list) -> list:
+        """不同原始值的列表 -> 规范名列表（三层缓存）"""
+        self.stats["distinct"] += len(raws)
+        out = {}
+        missing = []
+        for r in raws:
+            v = self.memory.get(r)
+            if v is None:
+                missing.append(r)
+            else:
+                out[r] = v
+        self.stats["memory_hits"] += len(raws) - len(missing)
+
+        if missing:
+            disk = self._disk_lookup(missing)
+            self.stats["disk_hits"] += len(disk)
+            out.update(disk)
+            todo = [r for r in missing if r not in disk]
+            if todo:
+                computed = dict(zip(todo, normalize_names(pd.Series(todo, dtype=object)).tolist()))
+                self.stats["computed"] += len(computed)
+                self._disk_store(computed)
+                out.update(computed)
+            if len(self.memory) + len(missing) > MEMORY_ENTRIES:
+                self.memory.clear()
+            self.memory.update((r, out[r]) for r in missing)
+        return [out[r] for r in raws]
+
+    def normalize(self, col: pd.Series) -> pd.Series:
+        """逐列：先 factorize 出不同值，只对不同值查缓存 / 跑规则，再按编码展开"""
+        codes, uniques = pd.factorize(col)
+        norms = self.lookup([str(u) for u in uniques])
+        values = pd.array(norms + [""], dtype=col.dtype if pd.api.types.is_string_dtype(col.dtype) else object)
+        return pd.Series(values.take(codes), index=col.index, name=col.name)
+
+    def snapshot(self) -> dict:
+        return dict(self.stats)
+
+    def delta(self, before: dict) -> dict:
+        d = {k: self.stats[k] - before.get(k, 0) for k in self.stats}
+        d["hit_rate"] = round(1 - d["computed"] / d["distinct"], 4) if d["distinct"] else 1.0
+        return d
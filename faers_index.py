@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""
+primaryid / caseid 持久化索引：按需点查某个病例在各表各季度的全部行，无需扫描 CSV_DATA。
+
+每个输出文件一份索引（INDEX_ROOT 下与输出同构的目录）：
+  {stem}.pid.npy     [(key=primaryid, loc)]，按 key 排序；loc = CSV 行首字节偏移 / Parquet row group 序号
+  {stem}.case.npy    仅 DEMO：[(key=caseid, loc=primaryid)]，按 key 排序
+查询时 np.load(mmap_mode="r") + searchsorted，只读命中的行 / row group。
+_catalog.json 记录每个输出文件的大小、mtime 与 key 范围：
+  - 构建时输出未变则跳过（按季度增量）
+  - 查询时先按 key 范围筛掉绝大多数文件（primaryid 随季度递增，范围几乎不重叠）
+
+用法：
+  python faers_index.py build
+  python faers_index.py lookup --primaryid 100012345 [--table DRUG]
+  python faers_index.py lookup --caseid 10001234
+"""
+
+import os
+import io
+import csv
+import sys
+import glob
+import json
+import mmap
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import faers_decode_final as fd
+
+# =========================================================
+# 0) 配置区
+# =========================================================
+
+# 被索引的输出根目录（faers_decode_final.OUTPUT_ROOT）
+OUTPUT_ROOT = fd.OUTPUT_ROOT
+
+# 索引根目录
+INDEX_ROOT = os.path.join(fd.BASE_DIR, "INDEX_DATA")
+
+CATALOG_NAME = "_catalog.json"
+
+# 索引格式版本：变更存储结构时加 1，旧索引自动重建
+INDEX_VERSION = 1
+
+# 主键列（含 AERS 旧版别名）
+PID_COLUMNS = ("primaryid", "isr")
+CASE_COLUMNS = ("caseid", "case")
+
+INDEX_DTYPE = np.dtype([("key", "<i8"), ("loc", "<i8")])
+
+
+# =========================================================
+# 1) 工具
+# =========================================================
+
+def find_column(names, candidates):
+    lower = {n.lower(): n for n in names}
+    for c in candidates:
+        if c in lower:
+            return lower[c]
+    return None
+
+
+def to_int64(col: pd.Series) -> np.ndarray:
+    return pd.to_numeric(col, errors="coerce").fillna(-1).astype("int64").to_numpy()
+
+
+def sorted_index(keys: np.ndarray, locs: np.ndarray) -> np.ndarray:
+    arr = np.empty(len(keys), dtype=INDEX_DTYPE)
+    arr["key"] = keys
+    arr["loc"] = locs
+    arr = arr[arr["key"] >= 0]
+    # 稳定排序：同一 primaryid 的多行保持文件内原顺序
+    return arr[np.argsort(arr["key"], kind="stable")]
+
+
+def discover_outputs(output_root: str, suffixes=(".csv", ".parquet")) -> list:
+    """
+    [(rel_path, abs_path)]：{year}/{Qn}/{stem}.csv|parquet，不含拆分临时件；
+    压缩 CSV（.csv.gz / .csv.zst）不能按字节偏移定位，默认不收（faers_store 传 fd.OUTPUT_SUFFIXES）
+    """
+    out = []
+    for path in sorted(glob.glob(os.path.join(output_root, "*", "Q[1-4]", "*.*"))):
+        stem, ext = fd.split_output_name(os.path.basename(path))
+        if ext not in suffixes or ".part" in stem:
+            continue
+        if fd.table_of(stem) not in fd.TABLE_PREFIXES:
+            continue
+        out.append((os.path.relpath(path, output_root).replace(os.sep, "/"), path))
+    return out
+
+
+def index_paths(index_root: str, rel: str) -> (str, str):
+    base = os.path.join(index_root, os.path.splitext(rel)[0])
+    return base + ".pid.npy", base + ".case.npy"
+
+
+def load_catalog(index_root: str) -> dict:
+    try:
+        with open(os.path.join(index_root, CATALOG_NAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != INDEX_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def save_catalog(index_root: str, files: dict):
+    os.makedirs(index_root, exist_ok=True)
+    path = os.path.join(index_root, CATALOG_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "files": files}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def _save_npy(path: str, arr: np.ndarray):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+# =========================================================
+# 2) 单个输出文件的索引
+# =========================================================
+
+def _csv_row_offsets(path: str) -> np.ndarray:
+    """每个数据行的行首字节偏移（输出由按行切分的输入生成，字段内不含换行）"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return np.empty(0, dtype=np.int64)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        nl = np.flatnonzero(np.frombuffer(mm, dtype=np.uint8) == 10)
+    starts = nl + 1
+    # 去掉表头行；文件末尾换行后面没有数据行
+    return starts[starts < size].astype(np.int64)
+
+
+def _csv_keys_python(path: str, pid_col: str, case_col: str):
+    """慢路径：逐行解析（行数与换行数对不上时，例如字段里有被引号包住的换行）"""
+    offsets, pids, cases = [], [], []
+    with open(path, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8")]))
+        ip = header.index(pid_col)
+        ic = header.index(case_col) if case_col else None
+        while True:
+            pos = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            row = next(csv.reader(io.StringIO(line.decode("utf-8"))), [])
+            offsets.append(pos)
+            pids.append(row[ip] if ip < len(row) else "")
+            cases.append(row[ic] if ic is not None and ic < len(row) else "")
+    return (np.asarray(offsets, dtype=np.int64), to_int64(pd.Series(pids, dtype=object)),
+            to_int64(pd.Series(cases, dtype=object)) if case_col else None)
+
+
+def build_file_index(path: str, table: str) -> dict:
+    """返回 {"pid": ndarray, "case": ndarray|None, "rows": n}"""
+    names = fd.output_columns(path)
+    pid_col = find_column(names, PID_COLUMNS)
+    case_col = find_column(names, CASE_COLUMNS) if table == "DEMO" else None
+    if pid_col is None:
+        return {"pid": np.empty(0, dtype=INDEX_DTYPE), "case": None, "rows": 0}
+    cols = [pid_col] + ([case_col] if case_col else [])
+
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        pids, cases, locs = [], [], []
+        for rg in range(pf.num_row_groups):
+            t = pf.read_row_group(rg, columns=cols)
+            pids.append(to_int64(t.column(pid_col).to_pandas()))
+            if case_col:
+                cases.append(to_int64(t.column(case_col).to_pandas()))
+            locs.append(np.full(t.num_rows, rg, dtype=np.int64))
+        pid = np.concatenate(pids) if pids else np.empty(0, dtype=np.int64)
+        loc = np.concatenate(locs) if locs else np.empty(0, dtype=np.int64)
+        case = (np.concatenate(cases) if cases else np.empty(0, dtype=np.int64)) if case_col else None
+    else:
+        loc = _csv_row_offsets(path)
+        ids = pd.concat(list(fd.read_output_chunks(path, columns=cols)) or [pd.DataFrame(columns=cols)])
+        if len(ids) == len(loc):
+            pid = to_int64(ids[pid_col])
+            case = to_int64(ids[case_col]) if case_col else None
+        else:
+            loc, pid, case = _csv_keys_python(path, pid_col, case_col)
+
+    return {
+        "pid": sorted_index(pid, loc),
+        "case": sorted_index(case, pid) if case is not None else None,
+        "rows": int(len(pid)),
+    }
+
+
+# =========================================================
+# 3) 构建（按文件增量）
+# =========================================================
+
+def build_index(output_root: str = None, index_root: str = None, logger=None) -> dict:
+    output_root = output_root or OUTPUT_ROOT
+    index_root = index_root or INDEX_ROOT
+    log = logger.info if logger else print
+    catalog = load_catalog(index_root)
+    t0 = time.time()
+    built = skipped = 0
+
+    outputs = discover_outputs(output_root)
+    live = {rel for rel, _ in outputs}
+    for rel in list(catalog):
+        if rel not in live:
+            for p in index_paths(index_root, rel):
+                if os.path.exists(p):
+                    os.remove(p)
+            del catalog[rel]
+
+    for rel, path in outputs:
+        st = os.stat(path)
+        entry = catalog.get(rel)
+        pid_path, case_path = index_paths(index_root, rel)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns \
+                and os.path.exists(pid_path):
+            skipped += 1
+            continue
+
+        table = fd.table_of(os.path.basename(rel))
+        idx = build_file_index(path, table)
+        _save_npy(pid_path, idx["pid"])
+        if idx["case"] is not None:
+            _save_npy(case_path, idx["case"])
+        elif os.path.exists(case_path):
+            os.remove(case_path)
+
+        year, quarter = rel.split("/")[:2]
+        catalog[rel] = {
+            "table": table,
+            "year": year,
+            "quarter": quarter,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "rows": idx["rows"],
+            "pid_min": int(idx["pid"]["key"][0]) if len(idx["pid"]) else None,
+            "pid_max": int(idx["pid"]["key"][-1]) if len(idx["pid"]) else None,
+            "case_min": int(idx["case"]["key"][0]) if idx["case"] is not None and len(idx["case"]) else None,
+            "case_max": int(idx["case"]["key"][-1]) if idx["case"] is not None and len(idx["case"]) else None,
+        }
+        save_catalog(index_root, catalog)
+        built += 1
+        log(f"[INDEX] {rel} | rows={idx['rows']}")
+
+    save_catalog(index_root, catalog)
+    summary = {"built": built, "skipped": skipped, "files": len(catalog), "seconds": round(time.time() - t0, 3)}
+    log(f"[INDEX] built={built} skipped={skipped} files={len(catalog)} sec={summary['seconds']}")
+    return summary
+
+
+# =========================================================
+# 4) 查询
+# =========================================================
+
+class FaersIndex:
+    """
+    idx = FaersIndex()
+    idx.lookup(primaryid=100012345)            -> {"DEMO": df, "DRUG": df, ...}
+    idx.lookup(caseid=10001234, tables=["REAC"])
+    返回的 df 带 year / quarter 两列标明来源季度；索引文件以 mmap 打开并缓存。
+    """
+
+    def __init__(self, output_root: str = None, index_root: str = None):
+        self.output_root = output_root or OUTPUT_ROOT
+        self.index_root = index_root or INDEX_ROOT
+        self.catalog = load_catalog(self.index_root)
+        self._arrays = {}
+
+    def _array(self, path: str) -> np.ndarray:
+        arr = self._arrays.get(path)
+        if arr is None:
+            arr = self._arrays[path] = np.load(path, mmap_mode="r")
+        return arr
+
+    @staticmethod
+    def _probe(arr: np.ndarray, key: int) -> np.ndarray:
+        keys = arr["key"]
+        lo = np.searchsorted(keys, key, side="left")
+        hi = np.searchsorted(keys, key, side="right")
+        return np.asarray(arr["loc"][lo:hi])
+
+    def primaryids_for_case(self, caseid: int) -> list:
+        pids = set()
+        for rel, e in self.catalog.items():
+            if e["table"] != "DEMO" or e["case_min"] is None or not e["case_min"] <= caseid <= e["case_max"]:
+                continue
+            pids.update(int(x) for x in self._probe(self._array(index_paths(self.index_root, rel)[1]), caseid))
+        return sorted(pids)
+
+    def locate(self, primaryid: int, tables=None) -> list:
+        """[(rel, locs)]：含该 primaryid 的输出文件与行位置"""
+        hits = []
+        for rel, e in self.catalog.items():
+            if tables and e["table"] not in tables:
+                continue
+            if e["pid_min"] is None or not e["pid_min"] <= primaryid <= e["pid_max"]:
+                continue
+            locs = self._probe(self._array(index_paths(self.index_root, rel)[0]), primaryid)
+            if len(locs):
+                hits.append((rel, locs))
+        return hits
+
+    def _read_rows(self, rel: str, locs: np.ndarray, primaryids: set) -> pd.DataFrame:
+        path = os.path.join(self.output_root, rel)
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            pf = pq.ParquetFile(path)
+            frames = [fd.arrow_to_output_frame(pf.read_row_group(int(rg))) for rg in np.unique(locs)]
+            df = pd.concat(frames, ignore_index=True)
+            col = find_column(df.columns, PID_COLUMNS)
+            return df[df[col].isin({str(p) for p in primaryids})].reset_index(drop=True)
+
+        with open(path, "rb") as f:
+            header = f.readline()
+            lines = []
+            for off in np.sort(locs):
+                f.seek(int(off))
+                lines.append(f.readline())
+        return pd.read_csv(io.BytesIO(header + b"".join(lines)), dtype=str, keep_default_na=False,
+                           encoding="utf-8")
+
+    def lookup(self, primaryid: int = None, caseid: int = None, tables=None) -> dict:
+        if (primaryid is None) == (caseid is None):
+            raise ValueError("exactly one of primaryid / caseid is required")
+        tables = {t.upper() for t in tables} if tables else None
+        pids = [int(primaryid)] if primaryid is not None else self.primaryids_for_case(int(caseid))
+
+        by_file = {}
+        for pid in pids:
+            for rel, locs in self.locate(pid, tables):
+                prev = by_file.get(rel)
+                by_file[rel] = (np.concatenate([prev[0], locs]), prev[1] | {pid}) if prev else (locs, {pid})
+
+        frames = {}
+        for rel in sorted(by_file):
+            locs, pid_set = by_file[rel]
+            df = self._read_rows(rel, np.unique(locs), pid_set)
+            year, quarter = rel.split("/")[:2]
+            df.insert(0, "quarter", quarter)
+            df.insert(0, "year", year)
+            frames.setdefault(self.catalog[rel]["table"], []).append(df)
+        return {t: pd.concat(fs, ignore_index=True) for t, fs in frames.items()}
+
+
+# =========================================================
+# 5) 命令行
+# =========================================================
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="FAERS primaryid / caseid index")
+    ap.add_argument("--output-root", default=None)
+    ap.add_argument("--index-root", default=None)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build", help="build / refresh the index (incremental)")
+    lk = sub.add_parser("lookup", help="print all rows of one case")
+    g = lk.add_mutually_exclusive_group(required=True)
+    g.add_argument("--primaryid", type=int)
+    g.add_argument("--caseid", type=int)
+    lk.add_argument("--table", action="append", help="restrict to table(s), e.g. --table DRUG --table REAC")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        build_index(args.output_root, args.index_root)
+        return 0
+
+    t0 = time.perf_counter()
+    result = FaersIndex(args.output_root, args.index_root).lookup(args.primaryid, args.caseid, args.table)
+    ms = (time.perf_counter() - t0) * 1000
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        for table, df in result.items():
+            print(f"===== {table} ({len(df)} rows) =====")
+            print(df.to_string(index=False))
+    print(f"lookup: {sum(len(df) for df in result.values())} rows in {ms:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+解码运行的遥测汇总与两次运行的对比。
+
+faers_decode_final.py 每次运行在 RUN_DIR 下写出：
+  report_{RUN_TS}.json       运行配置 + summary（按表 / 按年份汇总）+ 每个任务的结果
+  telemetry_{RUN_TS}.jsonl   每个任务一行：阶段耗时（validate / sample / parse / clean / write / rename / stitch）、
+                             读写字节、rows/s、MB/s、峰值 RSS、重试代价、单遍扫描的畸形行统计（scan）、
+                             药名规范化缓存命中（drug_norm）
+
+用法：
+  python faers_report.py summary RUN_DIR/report_20250101_120000.json
+  python faers_report.py compare OLD_report.json NEW_report.json [--threshold 0.15] [--min-seconds 1] [--files]
+
+compare 按整体 / 表 /（--files 时）文件对比吞吐（输入 MB/s），下降超过 threshold 的标为回退，
+并给出增长最多的阶段；有回退时退出码为 1，可直接用在环境升级后的冒烟检查里。
+"""
+
+import re
+import sys
+import json
+import argparse
+from collections import defaultdict
+
+PHASES = ("validate", "sample", "parse", "clean", "write", "rename", "stitch")
+
+# 回退判定：吞吐下降超过该比例；两次耗时都低于 MIN_SECONDS 的项不判定（计时噪声）
+REGRESSION_THRESHOLD = 0.15
+MIN_SECONDS = 1.0
+
+
+# =========================================================
+# 1) 读取
+# =========================================================
+
+def load_results(path: str) -> list:
+    """report_*.json 或 telemetry_*.jsonl -> 任务结果列表"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f).get("results", [])
+
+
+def table_of(stem: str) -> str:
+    m = re.match(r"[A-Za-z]+", stem or "")
+    return m.group(0).upper() if m else ""
+
+
+# =========================================================
+# 2) 汇总
+# =========================================================
+
+def _new_group() -> dict:
+    return {
+        "files": 0, "failed": 0, "skipped": 0, "rows": 0, "bytes_read": 0, "bytes_written": 0,
+        "seconds": 0.0, "retry_seconds": 0.0, "peak_rss_mb": 0.0, "phases": defaultdict(float),
+        "long_rows": 0, "short_rows": 0, "norm_distinct": 0, "norm_computed": 0,
+    }
+
+
+def _add(group: dict, r: dict):
+    group["retry_seconds"] += r.get("retry_seconds", 0.0)
+    if r["status"] == "SKIP":
+        group["skipped"] += 1
+        return
+    if r["status"] != "OK":
+        group["failed"] += 1
+        return
+    group["files"] += 1
+    group["rows"] += r.get("rows", 0)
+    group["bytes_read"] += r.get("bytes_read", 0)
+    group["bytes_written"] += r.get("bytes_written", 0)
+    group["seconds"] += r.get("seconds", 0.0)
+    group["peak_rss_mb"] = max(group["peak_rss_mb"], r.get("peak_rss_mb", 0.0))
+    for name, sec in r.get("phases", {}).items():
+        group["phases"][name] += sec
+    scan = r.get("scan") or {}
+    group["long_rows"] += scan.get("long_rows", 0)
+    group["short_rows"] += scan.get("short_rows", 0)
+    norm = r.get("drug_norm") or {}
+    group["norm_distinct"] += norm.get("distinct", 0)
+    group["norm_computed"] += norm.get("computed", 0)
+
+
+def _finish(group: dict) -> dict:
+    sec = group["seconds"]
+    return {
+        **group,
+        "seconds": round(sec, 3),
+        "retry_seconds": round(group["retry_seconds"], 3),
+        "phases": {k: round(v, 3) for k, v in sorted(group["phases"].items())},
+        "rows_per_sec": round(group["rows"] / sec, 1) if sec > 0 else 0.0,
+        "mb_per_sec": round(group["bytes_read"] / (1024 * 1024) / sec, 3) if sec > 0 else 0.0,
+        "norm_hit_rate": round(1 - group["norm_computed"] / group["norm_distinct"], 4) if group["norm_distinct"] else None,
+    }
+
+
+def summarize(results: list) -> dict:
+    """
+    按整体 / 表 / 年份汇总；吞吐只统计 OK 的任务（SKIP / FAIL 只计数，FAIL 的重试耗时计入 retry_seconds）。
+    seconds 为各任务耗时之和（多进程下是 worker 秒，不是墙钟），MB/s 以输入字节计。
+    """
+    total = _new_group()
+    by_table = defaultdict(_new_group)
+    by_year = defaultdict(_new_group)
+    for r in results:
+        _add(total, r)
+        _add(by_table[table_of(r.get("file"))], r)
+        _add(by_year[str(r.get("year"))], r)
+    return {
+        "total": _finish(total),
+        "by_table": {k: _finish(v) for k, v in sorted(by_table.items())},
+        "by_year": {k: _finish(v) for k, v in sorted(by_year.items())},
+    }
+
+
+def format_summary(summary: dict) -> str:
+    head = f"{'':<8}{'files':>6}{'rows':>12}{'MB in':>10}{'sec':>10}{'MB/s':>9}{'rows/s':>11}"
+    head += "".join(f"{p:>9}" for p in PHASES) + f"{'RSS MB':>9}{'retry s':>9}{'long':>8}{'short':>8}"
+
+    def line(name, g):
+        mb = g["bytes_read"] / (1024 * 1024)
+        text = f"{name:<8}{g['files']:>6}{g['rows']:>12}{mb:>10.1f}{g['seconds']:>10.2f}{g['mb_per_sec']:>9.2f}"
+        text += f"{g['rows_per_sec']:>11.0f}" + "".join(f"{g['phases'].get(p, 0.0):>9.2f}" for p in PHASES)
+        return text + f"{g['peak_rss_mb']:>9.0f}{g['retry_seconds']:>9.2f}{g['long_rows']:>8}{g['short_rows']:>8}"
+
+    lines = ["----- by table -----", head]
+    lines += [line(k, g) for k, g in summary["by_table"].items()]
+    lines += ["----- by year -----", head]
+    lines += [line(k, g) for k, g in summary["by_year"].items()]
+    lines += [line("TOTAL", summary["total"])]
+    return "\n".join(lines)
+
+
+# =========================================================
+# 3) 对比
+# =========================================================
+
+def _compare_row(scope: str, key: str, old: dict, new: dict, threshold: float, min_seconds: float) -> dict:
+    old_mbps, new_mbps = old["mb_per_sec"], new["mb_per_sec"]
+    change = (new_mbps / old_mbps - 1) if old_mbps > 0 else 0.0
+    timed = max(old["seconds"], new["seconds"]) >= min_seconds
+    deltas = {p: round(new["phases"].get(p, 0.0) - old["phases"].get(p, 0.0), 3) for p in PHASES}
+    worst = max(deltas, key=deltas.get)
+    return {
+        "scope": scope,
+        "key": key,
+        "old_mb_per_sec": old_mbps,
+        "new_mb_per_sec": new_mbps,
+        "change": round(change, 4),
+        "old_seconds": old["seconds"],
+        "new_seconds": new["seconds"],
+        "phase_deltas": deltas,
+        "worst_phase": worst if deltas[worst] > 0 else "",
+        "regression": bool(timed and old_mbps > 0 and change < -threshold),
+    }
+
+
+def compare_reports(old_results: list, new_results: list, threshold: float = None, min_seconds: float = None,
+                    files: bool = False) -> dict:
+    """
+    两次运行按整体 / 表 /（files=True 时）文件对比吞吐；只比较两边都有 OK 结果的项
+    （增量运行里 SKIP 的文件自然不参与）。返回 {"rows": [...], "regressions": [...]}
+    """
+    threshold = REGRESSION_THRESHOLD if threshold is None else threshold
+    min_seconds = MIN_SECONDS if min_seconds is None else min_seconds
+    old_sum, new_sum = summarize(old_results), summarize(new_results)
+
+    rows = []
+    if old_sum["total"]["files"] and new_sum["total"]["files"]:
+        rows.append(_compare_row("total", "TOTAL", old_sum["total"], new_sum["total"], threshold, min_seconds))
+    for table, new_g in new_sum["by_table"].items():
+        old_g = old_sum["by_table"].get(table)
+        if old_g and old_g["files"] and new_g["files"]:
+            rows.append(_compare_row("table", table, old_g, new_g, threshold, min_seconds))
+
+    if files:
+        def by_file(results):
+            return {
+                f"{r['year']}/{r['quarter']}/{r['file']}": _finish(_group_of(r))
+                for r in results if r["status"] == "OK"
+            }
+
+        old_files, new_files = by_file(old_results), by_file(new_results)
+        for key in sorted(old_files.keys() & new_files.keys()):
+            rows.append(_compare_row("file", key, old_files[key], new_files[key], threshold, min_seconds))
+
+    return {"rows": rows, "regressions": [r for r in rows if r["regression"]]}
+
+
+def _group_of(r: dict) -> dict:
+    group = _new_group()
+    _add(group, r)
+    return group
+
+
+def format_comparison(comparison: dict) -> str:
+    lines = [f"{'scope':<6} {'key':<24}{'old MB/s':>10}{'new MB/s':>10}{'change':>9}{'old s':>9}{'new s':>9}  worst phase"]
+    for r in comparison["rows"]:
+        flag = "  << REGRESSION" if r["regression"] else ""
+        worst = f"{r['worst_phase']} +{r['phase_deltas'][r['worst_phase']]:.2f}s" if r["worst_phase"] else "-"
+        lines.append(
+            f"{r['scope']:<6} {r['key']:<24}{r['old_mb_per_sec']:>10.2f}{r['new_mb_per_sec']:>10.2f}"
+            f"{r['change']:>+9.1%}{r['old_seconds']:>9.2f}{r['new_seconds']:>9.2f}  {worst}{flag}"
+        )
+    lines.append(f"{len(comparison['regressions'])} regression(s)")
+    return "\n".join(lines)
+
+
+# =========================================================
+# 4) 命令行
+# =========================================================
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="FAERS decode telemetry summary / run comparison")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sm = sub.add_parser("summary", help="per-table / per-year summary of one run")
+    sm.add_argument("report", help="report_*.json or telemetry_*.jsonl")
+    cp = sub.add_parser("compare", help="diff two runs and flag throughput regressions")
+    cp.add_argument("old")
+    cp.add_argument("new")
+    cp.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="flag drops larger than this (0.15 = 15%%)")
+    cp.add_argument("--min-seconds", type=float, default=MIN_SECONDS, help="ignore items faster than this in both runs")
+    cp.add_argument("--files", action="store_true", help="also compare individual files")
+    cp.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "summary":
+        print(format_summary(summarize(load_results(args.report))))
+        return 0
+
+    comparison = compare_reports(load_results(args.old), load_results(args.new), args.threshold, args.min_seconds,
+                                 args.files)
+    if args.json:
+        print(json.dumps(comparison, ensure_ascii=False, indent=2))
+    else:
+        print(format_comparison(comparison))
+    return 1 if comparison["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+FAERS / AERS 各时期列布局 -> 统一的规范列（canonical schema）。
+
+时期（era）：
+  aers_2004      2004Q1–2005Q2   AERS 旧版，大写列名，ISR / CASE
+  aers_2005      2005Q3–2012Q3   同上，DEMO 增加 REPORTER_COUNTRY
+  faers_2012q4   2012Q4–2014Q2   FAERS：primaryid / caseid / caseversion，DRUG 增加剂量列
+  faers_2014q3   2014Q3 起       DEMO gndr_cod -> sex，增加 auth_num / lit_ref / age_grp；
+                                 DRUG 增加 prod_ai；REAC 增加 drug_rec_act
+
+规范列 = 最新 FAERS 列（小写）+ 旧版独有列（追加在末尾，不丢数据）。
+解码时按 COMMON_ALIASES + 各表 aliases 改名，再按规范列重排，缺失列补 ""；
+于是所有年份同一张表的输出列完全一致，可直接整表扫描 / 拼接。
+
+修改规范列或别名时 SCHEMA_VERSION 加 1：解码清单的配置指纹随之变化，全部输出自动重建。
+"""
+
+import pandas as pd
+
+SCHEMA_VERSION = 1
+
+# 所有表通用的别名（AERS -> FAERS）
+COMMON_ALIASES = {"isr": "primaryid", "case": "caseid"}
+
+TABLE_SCHEMAS = {
+    "DEMO": {
+        "canonical": [
+            "primaryid", "caseid", "caseversion", "i_f_code", "event_dt", "mfr_dt", "init_fda_dt", "fda_dt",
+            "rept_cod", "auth_num", "mfr_num", "mfr_sndr", "lit_ref", "age", "age_cod", "age_grp", "sex",
+            "e_sub", "wt", "wt_cod", "rept_dt", "to_mfr", "occp_cod", "reporter_country", "occr_country",
+            # AERS 独有
+            "foll_seq", "image", "death_dt", "confid",
+        ],
+        "aliases": {"i_f_cod": "i_f_code", "gndr_cod": "sex"},
+        "eras": {
+            "aers_2004": [
+                "isr", "case", "i_f_cod", "foll_seq", "image", "event_dt", "mfr_dt", "fda_dt", "rept_cod",
+                "mfr_num", "mfr_sndr", "age", "age_cod", "gndr_cod", "e_sub", "wt", "wt_cod", "rept_dt",
+                "occp_cod", "death_dt", "to_mfr", "confid",
+            ],
+            "aers_2005": [
+                "isr", "case", "i_f_cod", "foll_seq", "image", "event_dt", "mfr_dt", "fda_dt", "rept_cod",
+                "mfr_num", "mfr_sndr", "age", "age_cod", "gndr_cod", "e_sub", "wt", "wt_cod", "rept_dt",
+                "occp_cod", "death_dt", "to_mfr", "confid", "reporter_country",
+            ],
+            "faers_2012q4": [
+                "primaryid", "caseid", "caseversion", "i_f_code", "event_dt", "mfr_dt", "init_fda_dt", "fda_dt",
+                "rept_cod", "mfr_num", "mfr_sndr", "age", "age_cod", "gndr_cod", "e_sub", "wt", "wt_cod",
+                "rept_dt", "to_mfr", "occp_cod", "reporter_country", "occr_country",
+            ],
+            "faers_2014q3": [
+                "primaryid", "caseid", "caseversion", "i_f_code", "event_dt", "mfr_dt", "init_fda_dt", "fda_dt",
+                "rept_cod", "auth_num", "mfr_num", "mfr_sndr", "lit_ref", "age", "age_cod", "age_grp", "sex",
+                "e_sub", "wt", "wt_cod", "rept_dt", "to_mfr", "occp_cod", "reporter_country", "occr_country",
+            ],
+        },
+    },
+    "DRUG": {
+        "canonical": [
+            "primaryid", "caseid", "drug_seq", "role_cod", "drugname", "prod_ai", "val_vbm", "route", "dose_vbm",
+            "cum_dose_chr", "cum_dose_unit", "dechal", "rechal", "lot_num", "exp_dt", "nda_num", "dose_amt",
+            "dose_unit", "dose_form", "dose_freq",
+        ],
+        "aliases": {},
+        "eras": {
+            "aers_2004": [
+                "isr", "drug_seq", "role_cod", "drugname", "val_vbm", "route", "dose_vbm", "dechal", "rechal",
+                "lot_num", "exp_dt", "nda_num",
+            ],
+            "faers_2012q4": [
+                "primaryid", "caseid", "drug_seq", "role_cod", "drugname", "val_vbm", "route", "dose_vbm",
+                "cum_dose_chr", "cum_dose_unit", "dechal", "rechal", "lot_num", "exp_dt", "nda_num", "dose_amt",
+                "dose_unit", "dose_form", "dose_freq",
+            ],
+            "faers_2014q3": [
+                "primaryid", "caseid", "drug_seq", "role_cod", "drugname", "prod_ai", "val_vbm", "route",
+                "dose_vbm", "cum_dose_chr", "cum_dose_unit", "dechal", "rechal", "lot_num", "exp_dt", "nda_num",
+                "dose_amt", "dose_unit", "dose_form", "dose_freq",
+            ],
+        },
+    },
+    "INDI": {
+        "canonical": ["primaryid", "caseid", "indi_drug_seq", "indi_pt"],
+        "aliases": {"drug_seq": "indi_drug_seq"},
+        "eras": {
+            "aers_2004": ["isr", "drug_seq", "indi_pt"],
+            "faers_2012q4": ["primaryid", "caseid", "indi_drug_seq", "indi_pt"],
+        },
+    },
+    "OUTC": {
+        "canonical": ["primaryid", "caseid", "outc_cod"],
+        # 2012Q4 的 OUTC 列名为 outc_code
+        "aliases": {"outc_code": "outc_cod"},
+        "eras": {
+            "aers_2004": ["isr", "outc_cod"],
+            "faers_2012q4": ["primaryid", "caseid", "outc_code"],
+            "faers_2013q1": ["primaryid", "caseid", "outc_cod"],
+        },
+    },
+    "REAC": {
+        "canonical": ["primaryid", "caseid", "pt", "drug_rec_act"],
+        "aliases": {},
+        "eras": {
+            "aers_2004": ["isr", "pt"],
+            "faers_2012q4": ["primaryid", "caseid", "pt"],
+            "faers_2014q3": ["primaryid", "caseid", "pt", "drug_rec_act"],
+        },
+    },
+    "RPSR": {
+        "canonical": ["primaryid", "caseid", "rpsr_cod"],
+        "aliases": {},
+        "eras": {
+            "aers_2004": ["isr", "rpsr_cod"],
+            "faers_2012q4": ["primaryid", "caseid", "rpsr_cod"],
+        },
+    },
+    "STAT": {
+        "canonical": ["primaryid", "caseid", "stat_cod"],
+        "aliases": {},
+        "eras": {
+            "faers_2012q4": ["primaryid", "caseid", "stat_cod"],
+        },
+    },
+    "THER": {
+        "canonical": ["primaryid", "caseid", "dsg_drug_seq", "start_dt", "end_dt", "dur", "dur_cod"],
+        "aliases": {"drug_seq": "dsg_drug_seq"},
+        "eras": {
+            "aers_2004": ["isr", "drug_seq", "start_dt", "end_dt", "dur", "dur_cod"],
+            "faers_2012q4": ["primaryid", "caseid", "dsg_drug_seq", "start_dt", "end_dt", "dur", "dur_cod"],
+        },
+    },
+}
+
+
+def canonical_name(table: str, name: str) -> str:
+    key = str(name).strip().lower()
+    aliases = TABLE_SCHEMAS.get(table, {}).get("aliases", {})
+    return aliases.get(key, COMMON_ALIASES.get(key, key))
+
+
+def detect_era(table: str, columns) -> str:
+    """
+    原始表头（大小写不敏感，忽略行尾 '$' 产生的 Unnamed 列）与登记的某个时期完全一致 -> 时期名，
+    否则 "unknown"
+    """
+    cols = [str(c).strip().lower() for c in columns]
+    cols = [c for c in cols if not c.startswith("unnamed:")]
+    for era, era_cols in TABLE_SCHEMAS.get(table, {}).get("eras", {}).items():
+        if cols == era_cols:
+            return era
+    return "unknown"
+
+
+def harmonize(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """
+    改名到规范列名 -> 按规范列重排（缺失列补 ""）；
+    未登记的列保留并追加在末尾；改名后重名的列只留第一个；
+    行尾 '$' 产生的无名列（Unnamed: N）一律去掉，保证各块 / 各季度列一致。
+    未登记的表原样返回。
+    """
+    schema = TABLE_SCHEMAS.get(table)
+    if schema is None:
+        return df
+
+    names = [canonical_name(table, c) for c in df.columns]
+    keep = ~pd.Index(names).duplicated() & ~pd.Index(names).str.startswith("unnamed:")
+    if not keep.all():
+        df = df.iloc[:, keep]
+        names = [n for n, k in zip(names, keep) if k]
+    df = df.set_axis(names, axis=1)
+
+    canonical = schema["canonical"]
+    known = set(canonical)
+    extra = [n for n in names if n not in known]
+    return df.reindex(columns=canonical + extra, fill_value="")
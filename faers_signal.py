@@ -0,0 +1,486 @@
+# -*- coding: utf-8 -*-
+"""
+药物–不良事件（drug, PT）四格表计数的预计算，用于 PRR / ROR 信号检测，
+不必每次把所有季度的 DRUG 与 REAC 按 primaryid 重新连接。
+
+计数单位是报告（primaryid）：
+  n(drug, pt)  同时含该药与该 PT 的报告数（一份报告内重复的药 / PT 只计一次）
+  n(drug)      含该药、且至少有一个 PT 的报告数
+  n(pt)        含该 PT、且至少有一个药的报告数
+  N            既有药又有 PT 的报告数
+四格表：a = n(drug, pt)，b = n(drug) - a，c = n(pt) - a，d = N - a - b - c。
+
+分段（segment）之间 primaryid 不相交，所以各段计数直接相加：
+  解码输出  {year}/{Qn}/DRUG*, REAC*        一个季度一段（"2024/Q1"）
+  去重输出  DRUG/part-NNN.*, REAC/part-NNN.*  一个 primaryid 哈希分区一段（"part-007"）；
+            先跑 faers_dedup 再统计，可避免同一病例多个版本被重复计数
+每段一份稀疏计数（COUNTS_ROOT/segments/*.npz），另存一份汇总 _total.npz：
+  - 构建时 DRUG / REAC 未变的段跳过（按季度增量）
+  - 只有新增段时汇总 = 旧汇总 + 新段（增量）；有段变化或消失时由各段重新相加
+
+用法：
+  python faers_signal.py build [--input-root CSV_DATA] [--counts-root SIGNAL_DATA]
+  python faers_signal.py query [--drug ASPIRIN] [--pt NAUSEA] [--min-count 3] [--sort ror_lo] [--limit 50]
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import faers_decode_final as fd
+import faers_schema
+
+# =========================================================
+# 0) 配置区
+# =========================================================
+
+# 统计来源：解码输出根目录，或 faers_dedup 的 DEDUP_DATA
+INPUT_ROOT = fd.OUTPUT_ROOT
+
+# 计数存放目录
+COUNTS_ROOT = os.path.join(fd.BASE_DIR, "SIGNAL_DATA")
+
+CATALOG_NAME = "_catalog.json"
+TOTAL_NAME = "_total.npz"
+
+# 计数格式版本：变更存储结构或计数口径时加 1，旧计数全部重建
+COUNTS_VERSION = 1
+
+# 药物键所用的列（drugname；也可用 prod_ai 按活性成分统计）
+DRUG_COLUMN = "drugname"
+
+# 解码输出带规范药名列（{DRUG_COLUMN}_norm，faers_drugnorm）时用它作药物键；没有该列的输出退回原列
+USE_NORMALIZED_NAMES = True
+
+# 只统计这些 role_cod 的药（("PS", "SS") = 首要 / 次要怀疑药）；None = 所有药
+ROLE_CODES = None
+
+# 连接时每批的报告数（每批 DRUG × REAC 的展开行数决定峰值内存）
+JOIN_BATCH_REPORTS = 200_000
+
+# ROR / PRR 置信区间的 z 值（1.96 = 95%）
+CI_Z = 1.96
+
+
+# =========================================================
+# 1) 工具
+# =========================================================
+
+def to_int64(col: pd.Series) -> np.ndarray:
+    """字符串 id -> int64；空值 / 非数字 -> -1（纯数字列走解码器的 Arrow 快速路径）"""
+    ints = fd._to_nullable_int(col, "Int64")
+    if ints is None:
+        ints = pd.to_numeric(col, errors="coerce")
+    return ints.fillna(-1).astype("int64").to_numpy()
+
+
+def normalize_term(col: pd.Series) -> pd.Series:
+    """药名 / PT 统一为大写、去首尾空白、连续空白压成一个"""
+    return col.astype(str).str.strip().str.upper().str.replace(r"\s+", " ", regex=True)
+
+
+def config_fingerprint() -> str:
+    roles = ",".join(sorted(ROLE_CODES)) if ROLE_CODES else "*"
+    return f"v{COUNTS_VERSION}|{DRUG_COLUMN}|{'norm' if USE_NORMALIZED_NAMES else 'raw'}|{roles}"
+
+
+def _pack_strings(values) -> np.ndarray:
+    """字符串列表 -> 以 \\n 分隔的 UTF-8 字节（npz 不存 object 数组；药名 / PT 不含换行）"""
+    return np.frombuffer("\n".join(values).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(blob: np.ndarray, n: int) -> list:
+    return blob.tobytes().decode("utf-8").split("\n") if n else []
+
+
+class _Vocab:
+    """字符串 -> 段内整数编码（按首次出现顺序追加）"""
+
+    def __init__(self):
+        self.index = pd.Index([], dtype=object)
+
+    def encode(self, values: np.ndarray) -> np.ndarray:
+        codes = self.index.get_indexer(values)
+        new = codes < 0
+        if new.any():
+            self.index = self.index.append(pd.Index(pd.unique(values[new]), dtype=object))
+            codes[new] = self.index.get_indexer(values[new])
+        return codes.astype(np.int64)
+
+
+# =========================================================
+# 2) 稀疏计数
+# =========================================================
+
+class ContingencyCounts:
+    """
+    稀疏 (drug, PT) 计数 + 边际计数：
+      drugs / pts             pd.Index（编码 -> 名称）
+      pair_drug / pair_pt     每个非零格的药 / PT 编码
+      pair_n                  n(drug, pt)
+      drug_n / pt_n           n(drug) / n(pt)，按编码
+      reports                 N
+    counts = ContingencyCounts.load(); counts.signals(drug="ASPIRIN", min_count=3)
+    """
+
+    def __init__(self, drugs, pts, pair_drug, pair_pt, pair_n, drug_n, pt_n, reports: int):
+        self.drugs = pd.Index(drugs, dtype=object)
+        self.pts = pd.Index(pts, dtype=object)
+        self.pair_drug = np.asarray(pair_drug, dtype=np.int64)
+        self.pair_pt = np.asarray(pair_pt, dtype=np.int64)
+        self.pair_n = np.asarray(pair_n, dtype=np.int64)
+        self.drug_n = np.asarray(drug_n, dtype=np.int64)
+        self.pt_n = np.asarray(pt_n, dtype=np.int64)
+        self.reports = int(reports)
+
+    @classmethod
+    def empty(cls) -> "ContingencyCounts":
+        z = np.empty(0, dtype=np.int64)
+        return cls([], [], z, z, z, z, z, 0)
+
+    # ---------- 合并 ----------
+
+    @classmethod
+    def merge(cls, parts: list) -> "ContingencyCounts":
+        """各段词表取并集，编码映射到合并后的词表，同一格的计数相加"""
+        parts = [p for p in parts if p.reports or len(p.pair_n)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        drugs = pd.Index(pd.unique(np.concatenate([p.drugs.to_numpy() for p in parts])), dtype=object)
+        pts = pd.Index(pd.unique(np.concatenate([p.pts.to_numpy() for p in parts])), dtype=object)
+
+        drug_n = np.zeros(len(drugs), dtype=np.int64)
+        pt_n = np.zeros(len(pts), dtype=np.int64)
+        keys, ns = [], []
+        for p in parts:
+            dmap = drugs.get_indexer(p.drugs)
+            pmap = pts.get_indexer(p.pts)
+            np.add.at(drug_n, dmap, p.drug_n)
+            np.add.at(pt_n, pmap, p.pt_n)
+            keys.append(dmap[p.pair_drug] * len(pts) + pmap[p.pair_pt])
+            ns.append(p.pair_n)
+        key, n = _sum_by_key(np.concatenate(keys), np.concatenate(ns))
+        return cls(drugs, pts, key // len(pts), key % len(pts), n, drug_n, pt_n, sum(p.reports for p in parts))
+
+    def __add__(self, other: "ContingencyCounts") -> "ContingencyCounts":
+        return ContingencyCounts.merge([self, other])
+
+    # ---------- 存取 ----------
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                drugs=_pack_strings(self.drugs), n_drugs=np.int64(len(self.drugs)),
+                pts=_pack_strings(self.pts), n_pts=np.int64(len(self.pts)),
+                pair_drug=self.pair_drug.astype(np.int32), pair_pt=self.pair_pt.astype(np.int32),
+                pair_n=self.pair_n, drug_n=self.drug_n, pt_n=self.pt_n, reports=np.int64(self.reports),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = None) -> "ContingencyCounts":
+        path = path or os.path.join(COUNTS_ROOT, TOTAL_NAME)
+        with np.load(path) as z:
+            return cls(
+                _unpack_strings(z["drugs"], int(z["n_drugs"])), _unpack_strings(z["pts"], int(z["n_pts"])),
+                z["pair_drug"], z["pair_pt"], z["pair_n"], z["drug_n"], z["pt_n"], int(z["reports"]),
+            )
+
+    # ---------- 查询 ----------
+
+    def contingency(self, drug=None, pt=None, min_count: int = 1) -> pd.DataFrame:
+        """
+        所有 n(drug, pt) >= min_count 的格子的四格表 a / b / c / d；
+        drug / pt 可为单个名称或名称列表（大小写与空白按 normalize_term 统一）
+        """
+        mask = self.pair_n >= min_count
+        for value, codes, index in ((drug, self.pair_drug, self.drugs), (pt, self.pair_pt, self.pts)):
+            if value is None:
+                continue
+            names = normalize_term(pd.Series([value] if isinstance(value, str) else list(value)))
+            wanted = index.get_indexer(names)
+            mask &= np.isin(codes, wanted[wanted >= 0])
+
+        d_code, p_code, a = self.pair_drug[mask], self.pair_pt[mask], self.pair_n[mask]
+        b = self.drug_n[d_code] - a
+        c = self.pt_n[p_code] - a
+        return pd.DataFrame({
+            "drug": self.drugs.to_numpy()[d_code],
+            "pt": self.pts.to_numpy()[p_code],
+            "a": a, "b": b, "c": c, "d": self.reports - a - b - c,
+        })
+
+    def signals(self, drug=None, pt=None, min_count: int = 1, z: float = None) -> pd.DataFrame:
+        """contingency() + PRR / ROR 及其对数正态置信区间 + 1 自由度卡方（全部向量化）"""
+        z = CI_Z if z is None else z
+        df = self.contingency(drug, pt, min_count)
+        a, b, c, d = (df[k].to_numpy(dtype=np.float64) for k in ("a", "b", "c", "d"))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            prr = (a / (a + b)) / (c / (c + d))
+            se_prr = np.sqrt(1 / a - 1 / (a + b) + 1 / c - 1 / (c + d))
+            ror = (a * d) / (b * c)
+            se_ror = np.sqrt(1 / a + 1 / b + 1 / c + 1 / d)
+            n = a + b + c + d
+            chi2 = n * (a * d - b * c) ** 2 / ((a + b) * (c + d) * (a + c) * (b + d))
+        df["prr"] = prr
+        df["prr_lo"] = prr * np.exp(-z * se_prr)
+        df["prr_hi"] = prr * np.exp(z * se_prr)
+        df["ror"] = ror
+        df["ror_lo"] = ror * np.exp(-z * se_ror)
+        df["ror_hi"] = ror * np.exp(z * se_ror)
+        df["chi2"] = chi2
+        return df
+
+
+def _sum_by_key(keys: np.ndarray, counts: np.ndarray) -> (np.ndarray, np.ndarray):
+    if not len(keys):
+        return keys.astype(np.int64), counts.astype(np.int64)
+    uniq, inv = np.unique(keys, return_inverse=True)
+    return uniq, np.bincount(inv, weights=counts, minlength=len(uniq)).astype(np.int64)
+
+
+# =========================================================
+# 3) 单段计数（DRUG / REAC 流式读取 -> 按 primaryid 分批连接）
+# =========================================================
+
+def _find_columns(path: str, table: str, wanted) -> dict:
+    """规范列名 -> 输出里的实际列名（未统一表头的 AERS 输出为大写 ISR 等）"""
+    found = {}
+    for c in fd.output_columns(path):
+        name = faers_schema.canonical_name(table, c)
+        if name in wanted and name not in found:
+            found[name] = c
+    return found
+
+
+def _read_pairs(path: str, table: str, term_col: str, vocab: _Vocab, roles=None, chunk_rows: int = None) -> pd.DataFrame:
+    """一个输出文件 -> 去重后的 (pid, code)；空 id / 空名称的行丢弃"""
+    cols = _find_columns(path, table, ("primaryid", term_col, f"{term_col}_norm", "role_cod"))
+    if table == "DRUG" and USE_NORMALIZED_NAMES and f"{term_col}_norm" in cols:
+        cols[term_col] = cols[f"{term_col}_norm"]
+    if "primaryid" not in cols or term_col not in cols:
+        return pd.DataFrame({"pid": np.empty(0, np.int64), "code": np.empty(0, np.int64)})
+    use_roles = roles and "role_cod" in cols
+    read_cols = [cols["primaryid"], cols[term_col]] + ([cols["role_cod"]] if use_roles else [])
+
+    frames = []
+    for df in fd.read_output_chunks(path, columns=read_cols, chunk_rows=chunk_rows):
+        if use_roles:
+            df = df[normalize_term(df[cols["role_cod"]]).isin(roles)]
+        pid = to_int64(df[cols["primaryid"]])
+        # 只对块内不同的名称做规范化与编码（药名 / PT 的种类远少于行数）
+        raw_codes, uniques = pd.factorize(df[cols[term_col]])
+        names = normalize_term(pd.Series(uniques)).to_numpy(dtype=object)
+        named = names != ""
+        lookup = np.full(len(names) + 1, -1, dtype=np.int64)
+        lookup[:-1][named] = vocab.encode(names[named])
+        codes = lookup[raw_codes]
+        ok = (pid >= 0) & (codes >= 0)
+        frames.append(pd.DataFrame({"pid": pid[ok], "code": codes[ok]}).drop_duplicates())
+    if not frames:
+        return pd.DataFrame({"pid": np.empty(0, np.int64), "code": np.empty(0, np.int64)})
+    return pd.concat(frames, ignore_index=True).drop_duplicates()
+
+
+def count_segment(drug_path: str, reac_path: str, chunk_rows: int = None, batch_reports: int = None) -> ContingencyCounts:
+    batch_reports = batch_reports or JOIN_BATCH_REPORTS
+    roles = {r.upper() for r in ROLE_CODES} if ROLE_CODES else None
+    dv, pv = _Vocab(), _Vocab()
+    drug = _read_pairs(drug_path, "DRUG", DRUG_COLUMN, dv, roles, chunk_rows)
+    reac = _read_pairs(reac_path, "REAC", "pt", pv, None, chunk_rows)
+
+    # 只保留既有药又有 PT 的报告
+    reports = np.sort(np.intersect1d(pd.unique(drug["pid"].to_numpy()), pd.unique(reac["pid"].to_numpy()),
+                                     assume_unique=True))
+    drug = drug[drug["pid"].isin(reports)].sort_values("pid", kind="stable")
+    reac = reac[reac["pid"].isin(reports)].sort_values("pid", kind="stable")
+
+    drug_n = np.bincount(drug["code"].to_numpy(), minlength=len(dv.index)).astype(np.int64)
+    pt_n = np.bincount(reac["code"].to_numpy(), minlength=len(pv.index)).astype(np.int64)
+
+    n_pts = len(pv.index)
+    d_pid, r_pid = drug["pid"].to_numpy(), reac["pid"].to_numpy()
+    keys, ns = [], []
+    for start in range(0, len(reports), batch_reports):
+        lo_pid, hi_pid = reports[start], reports[min(start + batch_reports, len(reports)) - 1]
+        d_sl = slice(np.searchsorted(d_pid, lo_pid, "left"), np.searchsorted(d_pid, hi_pid, "right"))
+        r_sl = slice(np.searchsorted(r_pid, lo_pid, "left"), np.searchsorted(r_pid, hi_pid, "right"))
+        joined = drug.iloc[d_sl].merge(reac.iloc[r_sl], on="pid", suffixes=("_d", "_p"))
+        k, n = _sum_by_key(joined["code_d"].to_numpy() * n_pts + joined["code_p"].to_numpy(),
+                           np.ones(len(joined), dtype=np.int64))
+        keys.append(k)
+        ns.append(n)
+    key, n = _sum_by_key(np.concatenate(keys), np.concatenate(ns)) if keys \
+        else (np.empty(0, np.int64), np.empty(0, np.int64))
+    return ContingencyCounts(dv.index, pv.index, key // max(n_pts, 1), key % max(n_pts, 1), n, drug_n, pt_n,
+                             len(reports))
+
+
+# =========================================================
+# 4) 构建（按段增量）
+# =========================================================
+
+def discover_segments(input_root: str) -> dict:
+    """
+    {segment: {"DRUG": path, "REAC": path}}，只收两表齐全的段；同一段若有 csv 与 parquet 两份，取 parquet
+    解码输出按季度分段，去重输出按分区分段
+    """
+    found = {}
+
+    def add(seg, table, path):
+        prev = found.setdefault(seg, {}).get(table)
+        if prev is None or path.endswith(".parquet"):
+            found[seg][table] = path
+
+    for path in glob.glob(os.path.join(input_root, "*", "Q[1-4]", "*.*")):
+        stem, ext = fd.split_output_name(os.path.basename(path))
+        table = fd.table_of(stem)
+        if ext in fd.OUTPUT_SUFFIXES and ".part" not in stem and table in ("DRUG", "REAC"):
+            rel = os.path.relpath(os.path.dirname(path), input_root).replace(os.sep, "/")
+            add(rel, table, path)
+    for table in ("DRUG", "REAC"):
+        for path in glob.glob(os.path.join(input_root, table, "part-*.*")):
+            stem, ext = fd.split_output_name(os.path.basename(path))
+            if ext in fd.OUTPUT_SUFFIXES and re.fullmatch(r"part-\d+", stem):
+                add(stem, table, path)
+    return {seg: d for seg, d in sorted(found.items()) if len(d) == 2}
+
+
+def segment_path(counts_root: str, seg: str) -> str:
+    return os.path.join(counts_root, "segments", seg.replace("/", "_") + ".npz")
+
+
+def load_catalog(counts_root: str) -> dict:
+    try:
+        with open(os.path.join(counts_root, CATALOG_NAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("fingerprint") != config_fingerprint():
+        return {}
+    return data
+
+
+def save_catalog(counts_root: str, catalog: dict):
+    os.makedirs(counts_root, exist_ok=True)
+    path = os.path.join(counts_root, CATALOG_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({**catalog, "fingerprint": config_fingerprint()}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def _sources(paths: dict) -> dict:
+    out = {}
+    for table, path in sorted(paths.items()):
+        st = os.stat(path)
+        out[table] = [os.path.basename(path), st.st_size, st.st_mtime_ns]
+    return out
+
+
+def build_counts(input_root: str = None, counts_root: str = None, logger=None, chunk_rows: int = None) -> dict:
+    input_root = input_root or INPUT_ROOT
+    counts_root = counts_root or COUNTS_ROOT
+    log = logger.info if logger else print
+    t0 = time.time()
+    catalog = load_catalog(counts_root)
+    segments = catalog.get("segments", {})
+    total_path = os.path.join(counts_root, TOTAL_NAME)
+    # 汇总文件是否与目录一致（缺失 / 上次中断时不可增量）
+    total_ok = catalog.get("total_segments") == sorted(segments) and os.path.exists(total_path)
+
+    live = discover_segments(input_root)
+    removed = [seg for seg in segments if seg not in live]
+    for seg in removed:
+        p = segment_path(counts_root, seg)
+        if os.path.exists(p):
+            os.remove(p)
+        del segments[seg]
+
+    built, replaced, skipped = [], [], 0
+    new_parts = []
+    for seg, paths in live.items():
+        sources = _sources(paths)
+        entry = segments.get(seg)
+        if entry and entry["sources"] == sources and os.path.exists(segment_path(counts_root, seg)):
+            skipped += 1
+            continue
+        start = time.time()
+        counts = count_segment(paths["DRUG"], paths["REAC"], chunk_rows)
+        counts.save(segment_path(counts_root, seg))
+        (replaced if entry else built).append(seg)
+        new_parts.append(counts)
+        segments[seg] = {"sources": sources, "reports": counts.reports, "pairs": int(len(counts.pair_n))}
+        catalog["segments"] = segments
+        save_catalog(counts_root, catalog)
+        log(f"[SIGNAL] {seg} | reports={counts.reports} pairs={len(counts.pair_n)} sec={time.time() - start:.2f}")
+
+    if built or replaced or removed or not total_ok:
+        if total_ok and not replaced and not removed:
+            # 只有新增段：旧汇总 + 新段
+            total = ContingencyCounts.merge([ContingencyCounts.load(total_path)] + new_parts)
+        else:
+            total = ContingencyCounts.merge([ContingencyCounts.load(segment_path(counts_root, s)) for s in sorted(segments)])
+        total.save(total_path)
+    else:
+        total = None
+
+    catalog["segments"] = segments
+    catalog["total_segments"] = sorted(segments)
+    save_catalog(counts_root, catalog)
+    summary = {
+        "built": len(built), "replaced": len(replaced), "removed": len(removed), "skipped": skipped,
+        "segments": len(segments), "reports": sum(e["reports"] for e in segments.values()),
+        "seconds": round(time.time() - t0, 3),
+    }
+    log(f"[SIGNAL] built={len(built)} replaced={len(replaced)} removed={len(removed)} skipped={skipped} "
+        f"reports={summary['reports']} total={'rebuilt' if total is not None else 'unchanged'} sec={summary['seconds']}")
+    return summary
+
+
+# =========================================================
+# 5) 命令行
+# =========================================================
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="FAERS drug-event contingency counts and PRR / ROR")
+    ap.add_argument("--input-root", default=None, help="decoded output root or DEDUP_DATA (default INPUT_ROOT)")
+    ap.add_argument("--counts-root", default=None)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build", help="build / refresh per-segment counts and the total (incremental)")
+    qp = sub.add_parser("query", help="print 2x2 tables with PRR / ROR")
+    qp.add_argument("--drug", action="append")
+    qp.add_argument("--pt", action="append")
+    qp.add_argument("--min-count", type=int, default=3)
+    qp.add_argument("--sort", default="ror_lo", help="column to sort by (descending)")
+    qp.add_argument("--limit", type=int, default=50)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        build_counts(args.input_root, args.counts_root)
+        return 0
+
+    t0 = time.perf_counter()
+    counts = ContingencyCounts.load(os.path.join(args.counts_root or COUNTS_ROOT, TOTAL_NAME))
+    df = counts.signals(args.drug, args.pt, args.min_count)
+    df = df.sort_values(args.sort, ascending=False).head(args.limit)
+    with pd.option_context("display.max_columns", None, "display.width", 200, "display.max_rows", None):
+        print(df.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"{len(df)} rows (N={counts.reports}) in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+把解码输出（CSV_DATA 下的 CSV / Parquet）批量装入一个本地 SQLite 文件，分析时直接 SQL 查询，
+不必每次重读几百个 CSV，也不需要数据库服务。
+
+结构：
+  每张 FAERS 表一张 SQL 表（demo / drug / reac ...），列 = 输出列（faers_schema 规范列）+ _src；
+  id / 序号列为 INTEGER，其余为 TEXT（日期保留 YYYYMMDD 原文），空串存为 NULL。
+  _files 记录每个已装载的输出文件（大小 / mtime / 行数）：
+    - 再次运行只装载新增或变化的文件（按季度增量），变化的文件先按 _src 删掉旧行再装
+    - 输出里已不存在的文件，其行一并删除
+  索引：所有表 primaryid；DEMO caseid；DRUG drugname / prod_ai；REAC pt；以及 _src。
+
+用法：
+  python faers_store.py [--output-root CSV_DATA] [--store faers.sqlite] load
+  python faers_store.py query "SELECT d.drugname, r.pt, COUNT(DISTINCT d.primaryid) AS n
+                                FROM drug d JOIN reac r USING (primaryid)
+                                WHERE d.role_cod = 'PS' GROUP BY 1, 2 ORDER BY n DESC LIMIT 20"
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+
+import pandas as pd
+
+import faers_decode_final as fd
+import faers_schema
+
+# =========================================================
+# 0) 配置区
+# =========================================================
+
+# 装载来源（faers_decode_final.OUTPUT_ROOT；也可指向 faers_dedup 的 DEDUP_DATA）
+OUTPUT_ROOT = fd.OUTPUT_ROOT
+
+# SQLite 文件
+STORE_PATH = os.path.join(fd.BASE_DIR, "faers.sqlite")
+
+# 存储结构版本：变更表结构 / 类型映射时加 1，旧库整体重建
+STORE_VERSION = 1
+
+# 每批 executemany 的行数（同时是读输出的块大小）
+BATCH_ROWS = 100_000
+
+# 除 primaryid（所有表）外要建索引的列
+INDEX_COLUMNS = {
+    "DEMO": ("caseid",),
+    "DRUG": ("drugname", "prod_ai"),
+    "REAC": ("pt",),
+}
+
+# SQLite 页缓存（KiB，负数为 KiB 单位）
+CACHE_SIZE_KIB = 512 * 1024
+
+
+# =========================================================
+# 1) 连接与表结构
+# =========================================================
+
+def _q(name: str) -> str:
+    """标识符加引号（AERS 旧列名 case 是 SQL 关键字）"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def connect(store_path: str = None, bulk: bool = False) -> sqlite3.Connection:
+    """bulk=True：装载用（关闭 fsync；每个文件一个事务，崩溃时最多丢掉正在装的那个文件，下次重装）"""
+    store_path = store_path or STORE_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+    con = sqlite3.connect(store_path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    con.execute("PRAGMA temp_store=MEMORY")
+    if bulk:
+        con.execute("PRAGMA synchronous=OFF")
+    return con
+
+
+def _init_schema(con: sqlite3.Connection):
+    con.execute("CREATE TABLE IF NOT EXISTS _meta (key TEXT PRIMARY KEY, value TEXT)")
+    row = con.execute("SELECT value FROM _meta WHERE key = 'version'").fetchone()
+    if row is not None and int(row[0]) != STORE_VERSION:
+        for (name,) in con.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name != '_meta'").fetchall():
+            con.execute(f"DROP TABLE {_q(name)}")
+    con.execute("INSERT OR REPLACE INTO _meta VALUES ('version', ?)", (str(STORE_VERSION),))
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS _files ("
+        "src INTEGER PRIMARY KEY, rel TEXT UNIQUE, tbl TEXT, year INTEGER, quarter TEXT, "
+        "size INTEGER, mtime_ns INTEGER, rows INTEGER, loaded_at TEXT)"
+    )
+    con.commit()
+
+
+def sql_columns(table: str, columns) -> list:
+    """输出列 -> [(SQL 列名, SQL 类型)]；未统一表头的 AERS 旧列名也映射到规范名"""
+    out = []
+    seen = set()
+    for c in columns:
+        name = faers_schema.canonical_name(table, c)
+        if name in seen:
+            continue
+        seen.add(name)
+        out.append((name, "INTEGER" if fd.column_kind(table, name) == "int64" else "TEXT"))
+    return out
+
+
+def _ensure_table(con: sqlite3.Connection, table: str, cols: list):
+    """建表；已有表缺列时 ALTER TABLE 补上（新时期新增的列）"""
+    sql_table = table.lower()
+    existing = [r[1] for r in con.execute(f"PRAGMA table_info({_q(sql_table)})").fetchall()]
+    if not existing:
+        body = ", ".join(f"{_q(n)} {t}" for n, t in cols)
+        con.execute(f"CREATE TABLE {_q(sql_table)} ({body}, _src INTEGER NOT NULL)")
+        return
+    for n, t in cols:
+        if n not in existing:
+            con.execute(f"ALTER TABLE {_q(sql_table)} ADD COLUMN {_q(n)} {t}")
+
+
+def create_indexes(con: sqlite3.Connection):
+    tables = [r[0] for r in con.execute("SELECT DISTINCT tbl FROM _files").fetchall()]
+    for table in tables:
+        sql_table = table.lower()
+        existing = {r[1] for r in con.execute(f"PRAGMA table_info({_q(sql_table)})").fetchall()}
+        for col in ("_src", "primaryid") + INDEX_COLUMNS.get(table, ()):
+            if col in existing:
+                con.execute(f"CREATE INDEX IF NOT EXISTS {_q(f'ix_{sql_table}_{col}')} ON {_q(sql_table)} ({_q(col)})")
+    con.execute("ANALYZE")
+    con.commit()
+
+
+# =========================================================
+# 2) 装载单个输出文件
+# =========================================================
+
+def _records(df: pd.DataFrame, cols: list, src: int):
+    """字符串块 -> 行元组：INTEGER 列转 int（非数字 / 空 -> NULL），TEXT 空串 -> NULL"""
+    data = []
+    for (name, kind), col in zip(cols, df.columns):
+        s = df[col]
+        if kind == "INTEGER":
+            v = pd.to_numeric(s, errors="coerce").astype("Int64")
+            data.append(v.astype(object).where(v.notna(), None).tolist())
+        else:
+            data.append(s.astype(object).where(s != "", None).tolist())
+    data.append([src] * len(df))
+    return zip(*data)
+
+
+def load_file(con: sqlite3.Connection, path: str, table: str, src: int, batch_rows: int = None) -> int:
+    """在调用方的事务里把一个输出文件装进表；返回行数"""
+    batch_rows = batch_rows or BATCH_ROWS
+    columns = fd.output_columns(path)
+    cols = sql_columns(table, columns)
+    if not cols:
+        return 0
+    _ensure_table(con, table, cols)
+    # 规范名去重后的列与原始列一一对应
+    picked = []
+    seen = set()
+    for c in columns:
+        name = faers_schema.canonical_name(table, c)
+        if name not in seen:
+            seen.add(name)
+            picked.append(c)
+
+    names = ", ".join(_q(n) for n, _ in cols) + ", _src"
+    marks = ", ".join("?" * (len(cols) + 1))
+    sql = f"INSERT INTO {_q(table.lower())} ({names}) VALUES ({marks})"
+    rows = 0
+    for chunk in fd.read_output_chunks(path, columns=picked, chunk_rows=batch_rows):
+        con.executemany(sql, _records(chunk[picked], cols, src))
+        rows += len(chunk)
+    return rows
+
+
+# =========================================================
+# 3) 增量装载整个输出目录
+# =========================================================
+
+def discover_outputs(output_root: str) -> list:
+    """[(rel_path, abs_path)]：{year}/{Qn}/{stem}.csv|csv.gz|csv.zst|parquet（与 faers_index 同一规则）"""
+    import faers_index
+
+    return faers_index.discover_outputs(output_root, fd.OUTPUT_SUFFIXES)
+
+
+def load_store(output_root: str = None, store_path: str = None, logger=None, batch_rows: int = None) -> dict:
+    """
+    新增 / 变化的输出文件逐个装载（每个文件一个事务：删旧行 + 插新行 + 更新 _files），
+    已消失的输出删除其行；最后补建索引并 ANALYZE
+    """
+    output_root = output_root or OUTPUT_ROOT
+    log = logger.info if logger else print
+    t0 = time.time()
+    con = connect(store_path, bulk=True)
+    try:
+        _init_schema(con)
+        known = {rel: (src, tbl, size, mtime) for src, rel, tbl, size, mtime in
+                 con.execute("SELECT src, rel, tbl, size, mtime_ns FROM _files").fetchall()}
+
+        outputs = discover_outputs(output_root)
+        live = {rel for rel, _ in outputs}
+        removed = 0
+        for rel, (src, tbl, _, _) in known.items():
+            if rel not in live:
+                with con:
+                    con.execute(f"DELETE FROM {_q(tbl.lower())} WHERE _src = ?", (src,))
+                    con.execute("DELETE FROM _files WHERE src = ?", (src,))
+                removed += 1
+                log(f"[STORE] removed {rel}")
+
+        loaded = skipped = total_rows = 0
+        for rel, path in outputs:
+            st = os.stat(path)
+            old = known.get(rel)
+            if old and old[2] == st.st_size and old[3] == st.st_mtime_ns:
+                skipped += 1
+                continue
+
+            table = fd.table_of(os.path.basename(rel))
+            year, quarter = rel.split("/")[:2]
+            start = time.time()
+            with con:
+                if old:
+                    con.execute(f"DELETE FROM {_q(old[1].lower())} WHERE _src = ?", (old[0],))
+                    con.execute("DELETE FROM _files WHERE src = ?", (old[0],))
+                cur = con.execute(
+                    "INSERT INTO _files (rel, tbl, year, quarter, size, mtime_ns, rows, loaded_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 0, datetime('now'))",
+                    (rel, table, int(year), quarter, st.st_size, st.st_mtime_ns),
+                )
+                src = cur.lastrowid
+                rows = load_file(con, path, table, src, batch_rows)
+                con.execute("UPDATE _files SET rows = ? WHERE src = ?", (rows, src))
+            loaded += 1
+            total_rows += rows
+            log(f"[STORE] {rel} | rows={rows} sec={time.time() - start:.2f}")
+
+        if loaded or removed:
+            create_indexes(con)
+    finally:
+        con.close()
+
+    summary = {
+        "loaded": loaded, "skipped": skipped, "removed": removed, "rows": total_rows,
+        "seconds": round(time.time() - t0, 3),
+    }
+    log(f"[STORE] loaded={loaded} skipped={skipped} removed={removed} rows={total_rows} sec={summary['seconds']}")
+    return summary
+
+
+# =========================================================
+# 4) 查询
+# =========================================================
+
+def query(sql: str, params=(), store_path: str = None) -> pd.DataFrame:
+    con = connect(store_path)
+    try:
+        return pd.read_sql_query(sql, con, params=params)
+    finally:
+        con.close()
+
+
+# =========================================================
+# 5) 命令行
+# =========================================================
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="FAERS local SQLite store")
+    ap.add_argument("--output-root", default=None, help="decoded output root (default OUTPUT_ROOT)")
+    ap.add_argument("--store", default=None, help="SQLite file (default STORE_PATH)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("load", help="load new / changed decoded outputs (incremental)")
+    qp = sub.add_parser("query", help="run one SQL statement and print the result")
+    qp.add_argument("sql")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "load":
+        load_store(args.output_root, args.store)
+        return 0
+
+    t0 = time.perf_counter()
+    df = query(args.sql, store_path=args.store)
+    with pd.option_context("display.max_columns", None, "display.width", 200, "display.max_rows", 200):
+        print(df.to_string(index=False))
+    print(f"{len(df)} rows in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
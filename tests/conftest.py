@@ -0,0 +1,103 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeZipServer(ThreadingHTTPServer):
+    """
+    本地假下载站：files = {"/path.zip": bytes}。
+    latency：每个请求首字节前的延迟（秒）；bandwidth：每个连接的限速（字节/秒，None 不限）。
+    支持 HEAD、ETag/Last-Modified、Range（返回 206）与 If-Range（ETag 不符时 200 全量），ignore_range=True 时模拟不支持续传的服务器（始终 200 全量）。
+    """
+    daemon_threads = True
+
+    def __init__(self, files, latency=0.0, bandwidth=None, ignore_range=False):
+        super().__init__(("127.0.0.1", 0), _FakeZipHandler)
+        self.files = files
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.ignore_range = ignore_range
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class _FakeZipHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def _respond(self, send_body):
+        srv = self.server
+        with srv.lock:
+            srv.requests.append((self.command, self.path, self.headers.get("Range")))
+        body = srv.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        time.sleep(srv.latency)
+        etag = '"%s"' % hashlib.md5(body).hexdigest()[:16]
+
+        start = 0
+        rng = self.headers.get("Range") if send_body else None
+        if_range = self.headers.get("If-Range")
+        if rng and not srv.ignore_range and (if_range is None or if_range == etag):
+            start = int(rng.split("=", 1)[1].split("-", 1)[0])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        payload = body[start:]
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.end_headers()
+        if not send_body:
+            return
+
+        step = 64 * 1024
+        for i in range(0, len(payload), step):
+            piece = payload[i:i + step]
+            self.wfile.write(piece)
+            if srv.bandwidth:
+                time.sleep(len(piece) / srv.bandwidth)
+
+
+@pytest.fixture
+def fake_zip_server():
+    servers = []
+
+    def start(files, **kwargs):
+        srv = FakeZipServer(files, **kwargs)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return srv
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
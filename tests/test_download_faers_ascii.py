@@ -0,0 +1,181 @@
+import os
+import threading
+
+import download_faers_ascii as dl
+
+
+def fake_zips(n, size):
+    return {f"/faers_ascii_2020q{i + 1}.zip": os.urandom(size) for i in range(n)}
+
+
+def test_download_all_concurrent_matches_content_and_overlaps(fake_zip_server, tmp_path):
+    files = fake_zips(4, 256 * 1024)
+    srv = fake_zip_server(files, latency=0.2, bandwidth=4 * 1024 * 1024)
+    jobs = [(p, srv.url(p), tmp_path / p.lstrip("/")) for p in files]
+
+    summary = dl.download_all(dl.make_session(4), jobs, max_workers=4, show_progress=False)
+
+    assert summary["failed"] == []
+    assert len(summary["ok"]) == 4
+    assert summary["bytes"] == 4 * 256 * 1024
+    for path, body in files.items():
+        assert (tmp_path / path.lstrip("/")).read_bytes() == body
+    # 串行至少 4 * (0.2s + 0.0625s)；并发时延迟互相重叠
+    assert summary["seconds"] < 0.8
+    assert summary["mb_per_s"] > 0
+
+
+def test_download_resumes_partial_file_with_range(fake_zip_server, tmp_path):
+    files = fake_zips(1, 300 * 1024)
+    (path, body), = files.items()
+    srv = fake_zip_server(files)
+    save_path = tmp_path / "a.zip"
+    save_path.write_bytes(body[:100_000])
+
+    summary = dl.download_all(dl.make_session(1), [("a", srv.url(path), save_path)], max_workers=1,
+                              show_progress=False)
+
+    assert save_path.read_bytes() == body
+    assert summary["bytes"] == len(body) - 100_000
+    assert srv.requests == [("GET", path, "bytes=100000-")]
+
+
+def test_download_rewrites_when_server_ignores_range(fake_zip_server, tmp_path):
+    files = fake_zips(1, 200 * 1024)
+    (path, body), = files.items()
+    srv = fake_zip_server(files, ignore_range=True)
+    save_path = tmp_path / "a.zip"
+    save_path.write_bytes(body[:50_000])
+
+    assert dl.download(dl.make_session(1), srv.url(path), save_path, progress=dl.DownloadProgress(1, disable=True))
+    assert save_path.read_bytes() == body
+
+
+def test_download_treats_416_at_local_size_as_complete(fake_zip_server, tmp_path):
+    files = fake_zips(2, 100 * 1024)
+    (done_path, done_body), (long_path, long_body) = sorted(files.items())
+    srv = fake_zip_server(files)
+    # HEAD 失败、清单里也没有（UNVERIFIED）：本地已完整的文件续传时服务器返回 416
+    done = tmp_path / "done.zip"
+    done.write_bytes(done_body)
+    stale = tmp_path / "stale.zip"
+    stale.write_bytes(long_body + b"old tail")
+    jobs = [("done", srv.url(done_path), done), ("stale", srv.url(long_path), stale)]
+
+    summary = dl.download_all(dl.make_session(1), jobs, max_workers=1, show_progress=False)
+
+    assert summary["failed"] == [] and summary["bytes"] == len(long_body)
+    assert done.read_bytes() == done_body and stale.read_bytes() == long_body
+    assert [r for r in srv.requests if r[1] == done_path] == [("GET", done_path, f"bytes={len(done_body)}-")]
+
+
+def test_progress_counts_each_file_once_across_retries(fake_zip_server, tmp_path, monkeypatch):
+    files = fake_zips(1, 300 * 1024)
+    (path, body), = files.items()
+    srv = fake_zip_server(files)
+    save_path = tmp_path / "a.zip"
+    save_path.write_bytes(body[:100_000])
+    monkeypatch.setattr(dl, "CHUNK_SIZE", 64 * 1024)
+    session = dl.make_session(1)
+    real_get = session.get
+    calls = []
+
+    def flaky_get(*args, **kwargs):
+        # 第一次响应传一个块后断开，download 续传重试
+        r = real_get(*args, **kwargs)
+        calls.append(kwargs.get("headers", {}).get("Range"))
+        if len(calls) == 1:
+            chunks = r.iter_content
+
+            def broken(size):
+                it = chunks(size)
+                yield next(it)
+                raise ConnectionError("reset")
+            r.iter_content = broken
+        return r
+
+    monkeypatch.setattr(session, "get", flaky_get)
+    progress = dl.DownloadProgress(1, disable=True)
+
+    assert dl._fetch(session, srv.url(path), save_path, progress, {srv.url(path): {"size": len(body)}}, None)
+    assert save_path.read_bytes() == body
+    assert calls == ["bytes=100000-", f"bytes={100_000 + 64 * 1024}-"]
+    assert progress.total == len(body) and progress.done == len(body)
+    assert progress.transferred == len(body) - 100_000
+
+
+def test_revalidate_refetches_only_missing_short_and_changed(fake_zip_server, tmp_path):
+    files = fake_zips(4, 100 * 1024)
+    srv = fake_zip_server(files)
+    items = [(p, srv.url(p), tmp_path / p.lstrip("/")) for p in sorted(files)]
+    session = dl.make_session(4)
+    manifest = dl.DownloadManifest(tmp_path / dl.MANIFEST_NAME)
+
+    jobs, remote = dl.revalidate(session, items, manifest)
+    assert len(jobs) == 4
+    summary = dl.download_all(session, jobs, show_progress=False, manifest=manifest, remote=remote)
+    assert len(summary["ok"]) == 4
+    saved = dl.DownloadManifest(tmp_path / dl.MANIFEST_NAME)
+    assert saved.get(items[0][1])["sha256"] == dl.file_sha256(items[0][2])
+
+    # 稳态：只有 HEAD，没有 GET
+    srv.requests.clear()
+    jobs, _ = dl.revalidate(session, items, saved)
+    assert jobs == []
+    assert {m for m, _, _ in srv.requests} == {"HEAD"}
+
+    # 0: 崩溃留下的半截文件；1: 被删；2: 远端内容更新
+    p0, p1, p2 = (it[2] for it in items[:3])
+    p0.write_bytes(p0.read_bytes()[:30_000])
+    p1.unlink()
+    new_body = os.urandom(120 * 1024)
+    files[items[2][0]] = new_body
+
+    srv.requests.clear()
+    jobs, remote = dl.revalidate(session, items, saved)
+    assert [j[2] for j in jobs] == [p0, p1, p2]
+    assert not p2.exists()
+    summary = dl.download_all(session, jobs, show_progress=False, manifest=saved, remote=remote)
+
+    assert len(summary["ok"]) == 3
+    assert p0.read_bytes() == files[items[0][0]]
+    assert p2.read_bytes() == new_body
+    assert ("GET", items[0][0], "bytes=30000-") in srv.requests
+    assert dl.DownloadManifest(tmp_path / dl.MANIFEST_NAME).get(items[2][1])["size"] == len(new_body)
+
+
+def test_revalidate_hashes_adopted_files_in_the_head_pool(fake_zip_server, tmp_path, monkeypatch):
+    files = fake_zips(2, 10 * 1024)
+    srv = fake_zip_server(files)
+    items = [(p, srv.url(p), tmp_path / p.lstrip("/")) for p in sorted(files)]
+    for p, _, save_path in items:
+        save_path.write_bytes(files[p])
+    # 两个文件的 sha256 必须同时在算（串行时 barrier 超时）
+    barrier = threading.Barrier(2, timeout=5)
+    real_sha256 = dl.file_sha256
+
+    def file_sha256(path):
+        assert threading.current_thread() is not threading.main_thread()
+        barrier.wait()
+        return real_sha256(path)
+
+    monkeypatch.setattr(dl, "file_sha256", file_sha256)
+    manifest = dl.DownloadManifest(tmp_path / dl.MANIFEST_NAME)
+
+    jobs, _ = dl.revalidate(dl.make_session(2), items, manifest, max_workers=2)
+
+    assert jobs == []
+    assert all(manifest.get(url)["sha256"] == real_sha256(save_path) for _, url, save_path in items)
+
+
+def test_check_local_adopts_complete_unrecorded_file(tmp_path):
+    path = tmp_path / "a.zip"
+    path.write_bytes(b"x" * 10)
+    remote = {"size": 10, "etag": '"a"', "last_modified": None}
+
+    assert dl.check_local(path, None, remote) == "ADOPT"
+    assert dl.check_local(path, {"size": 10, "etag": '"a"'}, remote) is None
+    assert dl.check_local(path, {"size": 10, "etag": '"b"'}, remote) == "CHANGED"
+    assert dl.check_local(path, {"size": 10, "sha256": "0"}, remote, verify_checksum=True) == "CORRUPT"
+    assert dl.check_local(path, {"size": 10}, None) is None
+    assert dl.check_local(path, None, None) == "UNVERIFIED"
@@ -0,0 +1,33 @@
+import warnings
+
+import faers_bench
+import faers_decode_final as fd
+import faers_schema
+
+
+def test_synthetic_tree_covers_every_era_and_is_discovered(tmp_path, monkeypatch):
+    files = faers_bench.write_synthetic_tree(str(tmp_path), 2004, 2015, cases=30, malformed_every=7)
+    eras = {f["era"] for f in files}
+    assert eras == {"aers_2004", "aers_2005", "faers_2012q4", "faers_2013q1", "faers_2014q3"}
+    # AERS 时期没有 STAT；AERS 文件名为大写 .TXT
+    assert not any(f["table"] == "STAT" and f["era"].startswith("aers") for f in files)
+    assert all(f["path"].endswith(".TXT") == f["era"].startswith("aers") for f in files)
+
+    monkeypatch.setattr(fd, "INPUT_SOURCE", "unzip")
+    monkeypatch.setattr(fd, "INPUT_ROOT", str(tmp_path / "UNZIP_DATA"))
+    monkeypatch.setattr(fd, "OUTPUT_ROOT", str(tmp_path / "OUT"))
+    tasks = fd.discover_tasks(fd.logging.getLogger("test"))
+    assert sorted(t["input_path"] for t in tasks) == sorted(f["path"] for f in files)
+
+    pids = set()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for f in files:
+            df = fd.read_faers_full(f["path"], engine="c", compact=False)
+            assert faers_schema.detect_era(f["table"], df.columns) == f["era"]
+            if f["table"] == "DEMO":
+                ids = set(fd.prepare_frame(df, "DEMO")["primaryid"])
+                assert not ids & pids
+                pids |= ids
+    demo = [f for f in files if f["table"] == "DEMO"]
+    assert demo[-1]["rows"] > demo[0]["rows"]
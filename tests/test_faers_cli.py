@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import subprocess
+
+import faers_bench
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_cli(*args, code=None):
+    env = {k: v for k, v in os.environ.items() if k != "FAERS_BASE_DIR"}
+    cmd = [sys.executable, "-c", code] if code else [sys.executable, os.path.join(ROOT, "faers_cli.py"), *args]
+    return subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+
+
+def test_help_does_not_import_pipeline_dependencies():
+    out = run_cli(code=(
+        "import sys, faers_cli\n"
+        "for argv in (['--help'], ['decode', '--help'], ['download', '--help']):\n"
+        "    try:\n"
+        "        faers_cli.main(argv)\n"
+        "    except SystemExit:\n"
+        "        pass\n"
+        "print(sorted(m for m in ('pandas', 'numpy', 'pyarrow', 'requests', 'bs4', 'tqdm', 'faers_decode_final')"
+        " if m in sys.modules))\n"
+    ))
+    assert out.strip().splitlines()[-1] == "[]"
+
+
+def test_decode_dry_run_uses_config_file_and_args_without_writing(tmp_path):
+    faers_bench.write_synthetic_tree(str(tmp_path), 2014, 2014, cases=10, tables=("DEMO", "DRUG"))
+    config = tmp_path / "faers.json"
+    config.write_text(json.dumps({"base_dir": str(tmp_path), "decode": {"OUTPUT_FORMAT": "parquet",
+                                                                        "TABLE_PREFIXES": ["DRUG"]}}))
+    before = sorted(p for p in tmp_path.rglob("*"))
+
+    out = run_cli("--config", str(config), "decode", "--format", "csv", "--dry-run")
+
+    assert "tasks=4 | up_to_date=0 | to_build=4 | jobs=4" in out
+    built = [line.rsplit(" -> ", 1)[1] for line in out.splitlines() if "to build:" in line]
+    # base_dir 与 TABLE_PREFIXES 来自配置文件，--format 覆盖配置文件里的 OUTPUT_FORMAT
+    assert len(built) == 4
+    assert all(p.startswith(str(tmp_path / "CSV_DATA")) and os.path.basename(p).startswith("DRUG")
+               and p.endswith(".csv") for p in built)
+    assert sorted(p for p in tmp_path.rglob("*")) == before
+
+
+def test_decode_log_root_moves_run_dir(tmp_path):
+    faers_bench.write_synthetic_tree(str(tmp_path), 2014, 2014, cases=10, tables=("DEMO",))
+    log_root = tmp_path / "MY_LOGS"
+
+    run_cli("--base-dir", str(tmp_path), "decode", "--log-root", str(log_root), "--processes", "1")
+
+    run_dirs = list(log_root.glob("run_*"))
+    assert len(run_dirs) == 1 and list(run_dirs[0].glob("report_*.json"))
+    assert not (tmp_path / "LOGS").exists()
+    assert len(list((tmp_path / "CSV_DATA").rglob("DEMO*.csv"))) == 4
@@ -0,0 +1,57 @@
+import os
+import json
+
+import pytest
+
+import faers_bench
+import faers_daemon
+import faers_decode_final as fd
+
+
+def test_daemon_batches_match_cold_main(tmp_path, monkeypatch):
+    faers_bench.write_synthetic_tree(str(tmp_path), 2014, 2014, cases=40, tables=("DEMO", "DRUG", "REAC"))
+    config = {
+        "INPUT_SOURCE": "unzip",
+        "INPUT_ROOT": str(tmp_path / "UNZIP_DATA"),
+        "LOG_ROOT": str(tmp_path / "LOGS"),
+        "SKIP_EXISTING": True,
+        "BUILD_INDEX": False,
+        "BUILD_STORE": False,
+    }
+    for name, value in config.items():
+        monkeypatch.setattr(fd, name, value)
+    monkeypatch.setattr(fd, "OUTPUT_ROOT", str(tmp_path / "COLD"))
+    monkeypatch.setattr(fd, "PROCESS_NUM", 1)
+    monkeypatch.setattr(fd, "RUN_TS", "cold")
+    monkeypatch.setattr(fd, "RUN_DIR", str(tmp_path / "LOGS" / "run_cold"))
+    cold_report = fd.main()
+
+    queue_dir = str(tmp_path / "QUEUE")
+    warm_config = {**config, "OUTPUT_ROOT": str(tmp_path / "WARM")}
+    with faers_daemon.DecodeDaemon(1) as daemon:
+        job = faers_daemon.submit(warm_config, queue_dir, wait=False)
+        daemon.serve(queue_dir, poll_sec=0.01, max_jobs=1)
+        with open(os.path.join(queue_dir, "done", f"{job['id']}.json"), encoding="utf-8") as f:
+            done = json.load(f)
+        # 同一池子的第二批：增量清单生效，全部跳过
+        again = daemon.run(warm_config)
+    assert fd.OUTPUT_ROOT == str(tmp_path / "COLD")
+
+    assert done["status"] == "OK" and done["counts"]["ok"] == 12
+    assert again["status"] == "OK" and again["counts"]["skip"] == 12
+    keys = ("year", "quarter", "file", "status", "rows", "cols", "mode", "schema_era", "bytes_written", "scan")
+    reports = []
+    for path in (cold_report, done["report"]):
+        with open(path, encoding="utf-8") as f:
+            reports.append([{k: r.get(k) for k in keys} for r in json.load(f)["results"]])
+    assert reports[0] == reports[1]
+    for r in reports[0]:
+        rel = os.path.join(r["year"], r["quarter"], r["file"] + ".csv")
+        with open(tmp_path / "COLD" / rel, "rb") as a, open(tmp_path / "WARM" / rel, "rb") as b:
+            assert a.read() == b.read()
+    assert os.listdir(os.path.join(queue_dir, "inbox")) == os.listdir(os.path.join(queue_dir, "running")) == []
+
+    with pytest.raises(ValueError):
+        faers_daemon.apply_config({"RUN_DIR": "elsewhere"})
+    with pytest.raises(ValueError):
+        faers_daemon.apply_config({"NO_SUCH_SETTING": 1})
@@ -0,0 +1,662 @@
+import io
+import os
+import json
+import gzip
+import re
+import warnings
+
+import pandas as pd
+import pytest
+
+import faers_bench
+import faers_decode_final as fd
+
+
+def legacy_clean_df(df: pd.DataFrame) -> pd.DataFrame:
+    """旧版 clean_df：逐单元格 applymap(str.strip)，作为回归基准"""
+    df = df.dropna(axis=1, how="all")
+    df = df.fillna("")
+    cellwise = getattr(df, "map", None) or df.applymap
+    return cellwise(lambda x: x.strip() if isinstance(x, str) else x)
+
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, encoding="utf-8")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def faers_file(tmp_path):
+    path = tmp_path / "DRUG24Q1.txt"
+    faers_bench.write_synthetic_table(str(path), "DRUG", 3000, malformed_every=500)
+    # 追加短行 / 空白字符 / latin1 字节，覆盖 NaN 填充与 strip 边界
+    with open(path, "ab") as f:
+        f.write(b"1$2$\r\n")
+        f.write(b" 3 $\t4\xa0$ PS $\xe9  $\x85x\r\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("engine", fd.PARSE_ENGINES)
+def test_clean_df_matches_legacy_output(faers_file, engine):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            raw = fd.read_faers_full(faers_file, engine=engine, compact=False)
+        except ValueError:
+            pytest.skip(f"{engine} rejects short rows (falls back to python at task level)")
+    expected = to_csv_bytes(legacy_clean_df(raw.copy()))
+    assert to_csv_bytes(fd.clean_df(raw)) == expected
+
+
+def test_clean_df_drops_all_nan_columns():
+    df = pd.DataFrame({"a": [" x ", None], "b": [None, None]}, dtype=object)
+    assert to_csv_bytes(fd.clean_df(df.copy())) == to_csv_bytes(legacy_clean_df(df))
+
+
+def test_chunked_write_matches_full_write(faers_file, tmp_path):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        full_out = str(tmp_path / "full.csv")
+        fd.atomic_write_csv(legacy_clean_df(fd.read_faers_full(faers_file, engine="python", compact=False)), full_out)
+
+        chunk_out = str(tmp_path / "chunk.csv")
+        chunks = fd.read_faers_chunks(faers_file, engine="c", chunk_rows=700)
+        fd.atomic_write_csv_chunks(chunks, chunk_out, fd.logging.getLogger("test"))
+
+    with open(full_out, "rb") as a, open(chunk_out, "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_parquet_chunks_typed_schema_and_row_groups(faers_file, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = str(tmp_path / "DRUG24Q1.parquet")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        rows, cols = fd.atomic_write_parquet_chunks(
+            fd.read_faers_chunks(faers_file, engine="c", chunk_rows=1000), out, "DRUG", fd.logging.getLogger("test")
+        )
+
+    pf = pq.ParquetFile(out)
+    assert pf.metadata.num_rows == rows
+    assert pf.metadata.num_row_groups == -(-rows // 1000)
+    schema = pf.schema_arrow
+    assert str(schema.field("primaryid").type) == "int64"
+    assert str(schema.field("exp_dt").type) == "date32[day]"
+    assert str(schema.field("drugname").type) == "string"
+    assert not (tmp_path / "DRUG24Q1.parquet.tmp").exists()
+
+
+def test_manifest_detects_truncated_output_and_changed_input(tmp_path, monkeypatch):
+    monkeypatch.setattr(fd, "OUTPUT_ROOT", str(tmp_path / "out"))
+    src = tmp_path / "REAC24Q1.txt"
+    faers_bench.write_synthetic_table(str(src), "REAC", 200, malformed_every=0)
+    task = {"year": "2024", "quarter": "Q1", "stem": "REAC24Q1",
+            "input_path": str(src), "output_path": str(tmp_path / "out" / "2024" / "Q1" / "REAC24Q1.csv")}
+    settings = {"parse_engine": "c", "output_format": "csv"}
+    fingerprint = fd.config_fingerprint(settings)
+
+    result = fd.new_result(task)
+    result["input_sig"] = fd.input_signature(str(src))
+    fd.atomic_write_csv(fd.clean_df(fd.read_faers_full(str(src), engine="c")), task["output_path"])
+    entry = fd.manifest_entry(result, fingerprint)
+    assert fd.is_up_to_date(task, entry, fingerprint)
+
+    # 只改 mtime（内容不变）-> 仍视为最新
+    os.utime(src, ns=(0, 0))
+    assert fd.is_up_to_date(task, entry, fingerprint)
+
+    assert not fd.is_up_to_date(task, entry, fd.config_fingerprint({**settings, "parse_engine": "pyarrow"}))
+
+    with open(task["output_path"], "r+b") as f:
+        f.truncate(10)
+    assert not fd.is_up_to_date(task, entry, fingerprint)
+
+
+def test_manifest_journal_replays_after_crash_and_compacts(tmp_path):
+    path = str(tmp_path / "out" / fd.MANIFEST_NAME)
+    fd.save_manifest(path, {"a.csv": {"output_size": 1}, "b.csv": {"output_size": 2}})
+
+    fd.append_manifest(path, "c.csv", {"output_size": 3})
+    fd.append_manifest(path, "a.csv", None)
+    with open(fd.journal_path(path), "a", encoding="utf-8") as f:
+        f.write('\n{"key": "d.csv", "ent')  # 崩溃时写了一半
+    fd.append_manifest(path, "b.csv", {"output_size": 20})
+
+    # 快照没被重写，结果只在日志里；载入时按顺序重放
+    with open(path, "r", encoding="utf-8") as f:
+        assert sorted(json.load(f)["entries"]) == ["a.csv", "b.csv"]
+    entries = fd.load_manifest(path)
+    assert entries == {"b.csv": {"output_size": 20}, "c.csv": {"output_size": 3}}
+
+    fd.save_manifest(path, entries)
+    assert not os.path.exists(fd.journal_path(path))
+    assert fd.load_manifest(path) == entries
+
+
+def test_plan_jobs_splits_large_files_on_line_boundaries_largest_first(faers_file, tmp_path):
+    small = tmp_path / "REAC24Q1.txt"
+    faers_bench.write_synthetic_table(str(small), "REAC", 50, malformed_every=0)
+    tasks = [
+        {"stem": "REAC24Q1", "input_path": str(small), "output_path": str(tmp_path / "REAC24Q1.csv")},
+        {"stem": "DRUG24Q1", "input_path": faers_file, "output_path": str(tmp_path / "DRUG24Q1.csv")},
+    ]
+    jobs = fd.plan_jobs(tasks, threshold_mb=0.1, part_mb=0.05)
+
+    parts = [j for j in jobs if j.get("byte_range")]
+    assert len(parts) > 1 and jobs[0]["stem"] == "DRUG24Q1"
+    assert [j["size_bytes"] for j in jobs] == sorted((j["size_bytes"] for j in jobs), reverse=True)
+
+    data = open(faers_file, "rb").read()
+    ranges = sorted(j["byte_range"] for j in parts)
+    assert ranges[0][0] == data.index(b"\n") + 1 and ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start and data[start - 1:start] == b"\n"
+
+
+class _SyncPool:
+    """apply_async 立即在当前线程执行并回调，记录派发顺序"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def apply_async(self, fn, args, callback, error_callback):
+        self.submitted.append(args[0]["stem"])
+        callback(fn(*args))
+
+
+@pytest.mark.parametrize("max_large", [0, 1])
+def test_run_scheduled_admits_a_large_job_when_idle(monkeypatch, max_large):
+    monkeypatch.setattr(fd, "convert_task_with_retry", lambda job: {"file": job["stem"], "status": "OK"})
+    jobs = [{"stem": f"DRUG24Q{i}", "size_bytes": 10} for i in range(1, 4)] + [{"stem": "REAC24Q1", "size_bytes": 1}]
+    pool = _SyncPool()
+
+    done = [job["stem"] for job, res in fd.run_scheduled(pool, jobs, max_in_flight=4, max_large=max_large,
+                                                         large_bytes=5)]
+
+    # 大任务名额占满时先派小任务；在途为空时仍放行一个大任务
+    assert pool.submitted == ["DRUG24Q1", "REAC24Q1", "DRUG24Q2", "DRUG24Q3"]
+    assert sorted(done) == sorted(j["stem"] for j in jobs)
+
+
+@pytest.mark.parametrize("engine", ["c", "bytes", "python"])
+@pytest.mark.parametrize("use_chunk", [False, True])
+def test_split_decode_matches_serial(faers_file, tmp_path, engine, use_chunk):
+    # 去掉末尾换行，覆盖"最后一行无换行"的区间
+    with open(faers_file, "rb+") as f:
+        f.seek(-2, os.SEEK_END)
+        f.truncate()
+    logger = fd.logging.getLogger("test")
+    serial_out = str(tmp_path / "serial.csv")
+    task = {"year": "2024", "quarter": "Q1", "stem": "DRUG24Q1",
+            "input_path": faers_file, "output_path": str(tmp_path / "split.csv")}
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fd.decode_file(faers_file, serial_out, use_chunk, engine, {}, logger)
+
+        jobs = fd.plan_jobs([task], threshold_mb=0, part_mb=0.037)
+        assert len(jobs) > 3
+        part_results = []
+        for job in jobs:
+            res = fd.new_result(job)
+            fd.decode_file(faers_file, job["output_path"], use_chunk, engine, res, logger, byte_range=job["byte_range"])
+            res["status"] = "OK"
+            part_results.append(res)
+    merged = fd.merge_part_results(jobs[0], part_results, "csv", logger)
+
+    assert merged["status"] == "OK"
+    with open(serial_out, "rb") as a, open(task["output_path"], "rb") as b:
+        assert a.read() == b.read()
+    assert not list(tmp_path.glob("split.part*"))
+
+
+@pytest.mark.parametrize("engine", ["c", "bytes", "python"])
+def test_zip_member_decode_matches_unzipped(faers_file, tmp_path, monkeypatch, engine):
+    zip_dir = tmp_path / "RAW_ZIP" / "2024" / "Q1"
+    zip_dir.mkdir(parents=True)
+    zip_path = zip_dir / "faers_ascii_2024q1.zip"
+    with fd.zipfile.ZipFile(zip_path, "w", fd.zipfile.ZIP_DEFLATED) as zf:
+        zf.write(faers_file, "ASCII/DRUG24Q1.txt")
+        zf.writestr("ASCII/README.txt", "not a table")
+        zf.writestr("Deleted/DELETED24Q1.txt", "1\n")
+    monkeypatch.setattr(fd, "RAW_ZIP_ROOT", str(tmp_path / "RAW_ZIP"))
+    monkeypatch.setattr(fd, "OUTPUT_ROOT", str(tmp_path / "OUT"))
+    monkeypatch.setattr(fd, "INPUT_SOURCE", "zip")
+    logger = fd.logging.getLogger("test")
+
+    tasks = fd.discover_tasks(logger)
+    assert [(t["stem"], t["member"]) for t in tasks] == [("DRUG24Q1", "ASCII/DRUG24Q1.txt")]
+    task = tasks[0]
+    assert fd.plan_jobs(tasks, threshold_mb=0, part_mb=0.01) == [task]
+    assert fd.basic_file_validate(task["input_path"], task["member"]) == (True, "OK")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for use_chunk in (False, True):
+            a, b = str(tmp_path / f"plain{use_chunk}.csv"), str(tmp_path / f"zip{use_chunk}.csv")
+            fd.decode_file(faers_file, a, use_chunk, engine, {}, logger)
+            fd.decode_file(task["input_path"], b, use_chunk, engine, {}, logger, member=task["member"])
+            with open(a, "rb") as fa, open(b, "rb") as fb:
+                assert fa.read() == fb.read()
+
+    sig = fd.input_signature(task["input_path"], member=task["member"])
+    assert sig["size"] == os.path.getsize(faers_file)
+    assert sig["hash"].startswith("crc32:")
+
+
+@pytest.mark.parametrize("use_chunk", [False, True])
+def test_legacy_and_faers_headers_decode_to_one_schema(tmp_path, use_chunk):
+    aers = tmp_path / "DRUG08Q1.txt"
+    aers.write_bytes(
+        b"ISR$DRUG_SEQ$ROLE_COD$DRUGNAME$VAL_VBM$ROUTE$DOSE_VBM$DECHAL$RECHAL$LOT_NUM$EXP_DT$NDA_NUM$\r\n"
+        b"5001$1$PS$ASPIRIN $1$ORAL$$Y$$$$$\r\n"
+    )
+    faers = tmp_path / "DRUG24Q1.txt"
+    faers.write_bytes(
+        b"primaryid$caseid$drug_seq$role_cod$drugname$prod_ai$val_vbm$route$dose_vbm$cum_dose_chr$"
+        b"cum_dose_unit$dechal$rechal$lot_num$exp_dt$nda_num$dose_amt$dose_unit$dose_form$dose_freq\n"
+        b"100000011$10000001$1$PS$HUMIRA$ADALIMUMAB$1$SC$$$$$$$$$40$MG$INJ$QW\n"
+    )
+    logger = fd.logging.getLogger("test")
+    frames, eras = [], []
+    for src in (aers, faers):
+        res = {}
+        out = str(tmp_path / f"{src.stem}.csv")
+        fd.decode_file(str(src), out, use_chunk, "c", res, logger)
+        frames.append(pd.read_csv(out, dtype=str, keep_default_na=False))
+        eras.append(res["schema_era"])
+
+    assert eras == ["aers_2004", "faers_2014q3"]
+    assert list(frames[0].columns) == list(frames[1].columns) == fd.faers_schema.TABLE_SCHEMAS["DRUG"]["canonical"]
+    assert frames[0].loc[0, ["primaryid", "caseid", "drugname", "prod_ai"]].tolist() == ["5001", "", "ASPIRIN", ""]
+
+
+def test_harmonize_renames_table_specific_aliases():
+    ther = pd.DataFrame({"ISR": ["1"], "DRUG_SEQ": ["2"], "START_DT": ["20080101"], "EXTRA": ["x"]})
+    out = fd.faers_schema.harmonize(ther, "THER")
+    assert list(out.columns) == ["primaryid", "caseid", "dsg_drug_seq", "start_dt", "end_dt", "dur", "dur_cod", "extra"]
+    assert out.iloc[0].tolist() == ["1", "", "2", "20080101", "", "", "", "x"]
+    assert fd.faers_schema.detect_era("OUTC", ["primaryid", "caseid", "outc_code", "Unnamed: 3"]) == "faers_2012q4"
+
+
+@pytest.mark.parametrize("table", ["DEMO", "DRUG", "THER", "OUTC"])
+def test_compact_dtypes_keep_output_identical_and_use_less_memory(tmp_path, monkeypatch, table):
+    src = str(tmp_path / f"{table}24Q1.txt")
+    faers_bench.write_synthetic_table(src, table, 2000, malformed_every=300)
+    # 非纯数字的 id（带前导零 / 字母）：该列必须保持字符串，输出逐字不变
+    with open(src, "ab") as f:
+        ncols = len(faers_bench.TABLE_COLUMNS[table])
+        f.write(b"$".join([b"0042", b"X1"] + [b" Y "] * (ncols - 2)) + b"\r\n")
+    logger = fd.logging.getLogger("test")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        plain = fd.clean_df(fd.read_faers_full(src, engine="c", compact=False))
+        compact = fd.clean_df(fd.read_faers_full(src, engine="c", compact=True))
+        outputs = {}
+        for flag in (False, True):
+            monkeypatch.setattr(fd, "COMPACT_DTYPES", flag)
+            for fmt in ("csv", "parquet"):
+                for use_chunk in (False, True):
+                    out = str(tmp_path / f"{flag}_{use_chunk}.{fmt}")
+                    fd.decode_file(src, out, use_chunk, "c", {}, logger, fmt)
+                    outputs[(flag, fmt, use_chunk)] = pd.read_parquet(out) if fmt == "parquet" else open(out, "rb").read()
+
+    assert compact.memory_usage(deep=True).sum() < plain.memory_usage(deep=True).sum()
+    assert any(isinstance(t, pd.CategoricalDtype) for t in compact.dtypes) or table == "INDI"
+    for fmt in ("csv", "parquet"):
+        for use_chunk in (False, True):
+            a, b = outputs[(False, fmt, use_chunk)], outputs[(True, fmt, use_chunk)]
+            if fmt == "csv":
+                assert a == b
+            else:
+                pd.testing.assert_frame_equal(a, b)
+
+
+def test_compact_dtypes_keep_all_empty_typed_columns_in_chunks(tmp_path, monkeypatch):
+    # event_dt 全空、rept_dt 只在前 5 行为空：字符串路径两列都保留，紧凑 dtype 不能把它们当全空列删掉
+    header = faers_bench.TABLE_COLUMNS["DEMO"]
+    src = tmp_path / "DEMO24Q1.txt"
+    lines = ["$".join(header)]
+    for i in range(12):
+        row = {c: f"v{i}" for c in header}
+        row.update(primaryid=str(100 + i), caseid=str(10 + i), event_dt="", rept_dt="" if i < 5 else "20240101")
+        lines.append("$".join(row[c] for c in header))
+    src.write_text("\r\n".join(lines) + "\r\n")
+    monkeypatch.setattr(fd, "HARMONIZE_SCHEMA", False)
+    logger = fd.logging.getLogger("test")
+
+    outputs = {}
+    for flag in (False, True):
+        monkeypatch.setattr(fd, "COMPACT_DTYPES", flag)
+        for use_chunk in (False, True):
+            out = tmp_path / f"{flag}_{use_chunk}.csv"
+            result = {}
+            fd.decode_file(str(src), str(out), use_chunk, "c", result, logger, chunk_rows=5)
+            assert result["cols"] == len(header)
+            outputs[(flag, use_chunk)] = out.read_bytes()
+
+    assert len(set(outputs.values())) == 1
+    assert outputs[(True, True)].splitlines()[-1].startswith(b"111,21,v11,")
+    fingerprints = set()
+    for flag in (False, True):
+        monkeypatch.setattr(fd, "COMPACT_DTYPES", flag)
+        fingerprints.add(fd.config_fingerprint(fd.run_settings()))
+    assert len(fingerprints) == 2
+
+
+def test_adaptive_chunking_sizes_chunks_by_row_width(tmp_path, monkeypatch):
+    paths = {}
+    for table in ("DRUG", "OUTC"):
+        paths[table] = str(tmp_path / f"{table}24Q1.txt")
+        faers_bench.write_synthetic_table(paths[table], table, 5000)
+    profiles = {t: fd.sample_row_profile(p) for t, p in paths.items()}
+    assert profiles["DRUG"]["raw_bytes_per_row"] > 2 * profiles["OUTC"]["raw_bytes_per_row"]
+    assert profiles["DRUG"]["mem_bytes_per_row"] > profiles["OUTC"]["mem_bytes_per_row"]
+
+    monkeypatch.setattr(fd, "MIN_CHUNK_ROWS", 10)
+    budget = 64 * 1024 * 1024
+    drug = fd.plan_chunking(2 * 1024 ** 3, profiles["DRUG"], budget)
+    outc = fd.plan_chunking(2 * 1024 ** 3, profiles["OUTC"], budget)
+    assert drug["use_chunk"] and outc["use_chunk"]
+    assert outc["chunk_rows"] > drug["chunk_rows"]
+    # 预算内放得下的小文件走 full；RSS 吃掉预算时至少保留 1/4
+    assert not fd.plan_chunking(os.path.getsize(paths["DRUG"]), profiles["DRUG"], budget)["use_chunk"]
+    assert fd.plan_chunking(2 * 1024 ** 3, profiles["DRUG"], budget, rss_bytes=10 * budget)["available_mb"] == 16.0
+
+
+def test_memory_error_retries_with_smaller_chunk(tmp_path, monkeypatch):
+    faers_file = str(tmp_path / "DRUG24Q1.txt")
+    faers_bench.write_synthetic_table(faers_file, "DRUG", 3000, malformed_every=0)
+    calls = []
+    real_decode = fd.decode_file
+
+    def flaky_decode(*args):
+        use_chunk, chunk_rows = args[2], args[9]
+        calls.append((use_chunk, chunk_rows))
+        if len(calls) < 3:
+            raise MemoryError
+        return real_decode(*args)
+
+    monkeypatch.setattr(fd, "decode_file", flaky_decode)
+    monkeypatch.setattr(fd, "MIN_CHUNK_ROWS", 100)
+    monkeypatch.setattr(fd, "WORKER_LOGGER", fd.logging.getLogger("test"))
+    monkeypatch.setattr(fd, "WORKER_SETTINGS", {
+        "max_retries": 3, "base_backoff_sec": 0, "chunk_threshold_mb": 300, "parse_engine": "c",
+        "output_format": "csv", "adaptive_chunking": True, "memory_budget_mb": 8,
+    })
+    out = str(tmp_path / "DRUG24Q1.csv")
+    task = {"year": "2024", "quarter": "Q1", "stem": "DRUG24Q1", "input_path": faers_file, "output_path": out}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        res = fd.convert_task_with_retry(task)
+        expected = to_csv_bytes(fd.prepare_frame(fd.read_faers_full(faers_file, engine="c"), "DRUG"))
+
+    assert res["status"] == "OK" and res["attempts"] == 3
+    (full, _), (c2, r2), (c3, r3) = calls
+    assert not full and c2 and c3
+    assert r2 <= 1500 and r3 == r2 // 2 and res["chunk_rows"] == r3
+    assert open(out, "rb").read() == expected
+
+
+def test_scan_row_mismatch_falls_back_to_python_or_fails(tmp_path, monkeypatch):
+    lines = ["a$b$c"] + [f"{i}$x$y" for i in range(10)]
+    lines[5] += "$EXTRA"
+    lines[9] += "$EXTRA"
+    src = tmp_path / "INDI24Q1.txt"
+    src.write_text("\r\n".join(lines) + "\r\n")
+    # 首个数据行字段过多：pandas c / python 都把首列当索引，两个引擎都与扫描结果不一致
+    bad = tmp_path / "INDI24Q2.txt"
+    bad.write_text("\r\n".join(["a$b$c", "0$x$y$EXTRA"] + lines[2:]) + "\r\n")
+
+    # 模拟分块边界上截断保留长行的引擎
+    monkeypatch.setattr(fd, "C_CHUNK_ENGINE", "c")
+    monkeypatch.setattr(fd, "CHUNK_ROWS", 4)
+    monkeypatch.setattr(fd, "WORKER_LOGGER", fd.logging.getLogger("test"))
+    settings = {"max_retries": 3, "base_backoff_sec": 0, "chunk_threshold_mb": 0, "parse_engine": "c",
+                "output_format": "csv", "scan_input": True}
+    monkeypatch.setattr(fd, "WORKER_SETTINGS", settings)
+    results = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for path in (src, bad):
+            task = {"year": "2024", "quarter": "Q1", "stem": path.stem, "input_path": str(path),
+                    "output_path": str(tmp_path / "out" / f"{path.stem}.csv")}
+            results[path.stem] = fd.convert_task_with_retry(task)
+
+    ok = results["INDI24Q1"]
+    assert ok["status"] == "OK" and ok["engine"] == "python" and ok["engine_fallback"]
+    assert ok["row_mismatch"] == {"engine": "c", "parsed": 10, "expected": 8, "long_lines": [6, 10]}
+    assert ok["rows"] == 8
+    failed = results["INDI24Q2"]
+    assert failed["status"] == "FAIL" and failed["reason"] == "ROW_COUNT_MISMATCH" and failed["attempts"] == 1
+    assert failed["row_mismatch"]["engine"] == "python"
+    assert not (tmp_path / "out" / "INDI24Q2.csv").exists()
+
+
+@pytest.mark.parametrize("chunk_mb, engine, rows", [(300, "c", 4), (0, "bytes", 3)])
+def test_scan_splits_bare_cr_like_the_parser(tmp_path, monkeypatch, chunk_mb, engine, rows):
+    # 字段中的孤立 \r：c / python 当换行（多出一个短行），"bytes"（分块时的 c）留在字段里；扫描须跟着引擎分行
+    src = tmp_path / "DEMO24Q1.txt"
+    src.write_bytes(b"primaryid$caseid$sex\r\n1$10$F\r\n2$20$U\rS\r\n3$30$M\r\n")
+    monkeypatch.setattr(fd, "WORKER_LOGGER", fd.logging.getLogger("test"))
+    monkeypatch.setattr(fd, "WORKER_SETTINGS", {"max_retries": 1, "base_backoff_sec": 0, "chunk_threshold_mb": chunk_mb,
+                                                "parse_engine": "c", "output_format": "csv", "scan_input": True})
+    task = {"year": "2024", "quarter": "Q1", "stem": "DEMO24Q1", "input_path": str(src),
+            "output_path": str(tmp_path / "out" / "DEMO24Q1.csv")}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = fd.convert_task_with_retry(task)
+
+    assert result["status"] == "OK" and result["engine"] == engine and not result["engine_fallback"]
+    assert result["rows"] == result["scan"]["expected_rows"] == rows and result["row_mismatch"] is None
+
+    sc = fd.LineScanner(cr_breaks=True)
+    for i in range(src.stat().st_size):
+        sc.feed(src.read_bytes()[i:i + 1])
+    assert sc.result()["expected_rows"] == 4 and sc.result()["short_lines"] == [4]
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_task_telemetry_records_phases_bytes_and_rss(faers_file, tmp_path, monkeypatch, output_format):
+    monkeypatch.setattr(fd, "WORKER_LOGGER", fd.logging.getLogger("test"))
+    monkeypatch.setattr(fd, "WORKER_SETTINGS", {
+        "max_retries": 1, "base_backoff_sec": 0, "chunk_threshold_mb": 300, "parse_engine": "c",
+        "output_format": output_format, "adaptive_chunking": True, "memory_budget_mb": 1,
+    })
+    monkeypatch.setattr(fd, "MIN_CHUNK_ROWS", 100)
+    out = str(tmp_path / f"DRUG24Q1.{output_format}")
+    task = {"year": "2024", "quarter": "Q1", "stem": "DRUG24Q1", "input_path": faers_file, "output_path": out}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        res = fd.convert_task_with_retry(task)
+
+    assert res["status"] == "OK" and res["mode"] == "chunk"
+    assert set(res["phases"]) == {"validate", "sample", "parse", "clean", "write", "rename"}
+    assert sum(res["phases"][p] for p in ("parse", "clean", "write", "rename")) <= res["seconds"] + 0.05
+    assert res["bytes_read"] == os.path.getsize(faers_file)
+    assert res["bytes_written"] == os.path.getsize(out)
+    assert res["rows_per_sec"] > 0 and res["mb_per_sec"] > 0 and res["peak_rss_mb"] > 0
+    assert res["retry_seconds"] == 0.0
+    assert fd.TASK_TELEMETRY is None
+
+
+@pytest.mark.parametrize("engine", fd.PARSE_ENGINES)
+def test_long_rows_at_chunk_boundaries_are_dropped(tmp_path, engine):
+    # 第 5、9 行数据恰好是 chunk_rows=4 时的块首：pandas C 引擎分块时会截断保留它们
+    lines = ["a$b$c"] + [f"{i}$x$y" for i in range(10)]
+    lines[5] += "$EXTRA"
+    lines[9] += "$EXTRA"
+    src = tmp_path / "INDI24Q1.txt"
+    src.write_text("\r\n".join(lines) + "\r\n")
+    logger = fd.logging.getLogger("test")
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        chunked = pd.concat(list(fd.read_faers_chunks(str(src), engine=engine, chunk_rows=4, compact=False)))
+        res = {}
+        fd.decode_file(str(src), str(tmp_path / "chunk.csv"), True, engine, res, logger, chunk_rows=4, scan=True)
+    assert sorted({int(n) for w in caught for n in re.findall(r"Skipping line (\d+)", str(w.message))}) in ([6, 10], [7, 11])
+
+    assert chunked["a"].tolist() == ["0", "1", "2", "3", "5", "6", "7", "9"]
+    assert res["rows"] == res["scan"]["expected_rows"] == 8
+    fd.decode_file(str(src), str(tmp_path / "full.csv"), False, "c", {}, logger)
+    assert (tmp_path / "chunk.csv").read_bytes() == (tmp_path / "full.csv").read_bytes()
+
+
+@pytest.mark.parametrize("engine", ["c", "bytes", "python"])
+def test_single_pass_scan_matches_parser(faers_file, tmp_path, engine):
+    with open(faers_file, "ab") as f:
+        f.write(b"\r\n9$9$PS$X$extra$" + b"$" * 20 + b"\r\n9$9")  # 空行 + 长行 + 无换行结尾的短行
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        res = {}
+        fd.decode_file(faers_file, str(tmp_path / "out.csv"), False, engine, res, fd.logging.getLogger("test"),
+                       scan=True)
+    skipped = [int(n) for w in caught for n in re.findall(r"Skipping line (\d+)", str(w.message))]
+
+    scan = res["scan"]
+    assert scan["expected_rows"] == res["rows"]
+    assert scan["long_rows"] == len(skipped) == 6
+    if engine != "python":  # pandas 的 python 引擎报告的行号整体偏 1
+        assert scan["long_lines"] == skipped
+    assert scan["short_rows"] == 3 and scan["blank_lines"] == 1
+    assert scan["expected_fields"] == 20 and scan["header_has_delim"] and not scan["ends_with_newline"]
+    assert scan["bytes"] == os.path.getsize(faers_file)
+
+
+def test_scan_of_split_parts_merges_to_file_scan(faers_file):
+    full = fd.LineScanner()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fd.read_faers_full(faers_file, engine="c", scanner=full)
+        parts = []
+        for rng in fd.line_aligned_ranges(faers_file, 40_000):
+            sc = fd.LineScanner()
+            fd.read_faers_full(faers_file, engine="c", byte_range=rng, scanner=sc)
+            parts.append(sc.result())
+    assert len(parts) > 3
+    assert fd.merge_scans(parts) == full.result()
+
+
+@pytest.mark.parametrize("use_chunk", [False, True])
+def test_string_interning_keeps_output_and_writes_sidecar(faers_file, tmp_path, monkeypatch, use_chunk):
+    monkeypatch.setattr(fd, "CHUNK_ROWS", 400)
+    logger = fd.logging.getLogger("test")
+    plain, interned = str(tmp_path / "plain.csv"), str(tmp_path / "interned.csv")
+    interner = fd.StringInterner(sidecar=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fd.decode_file(faers_file, plain, use_chunk, "c", {}, logger)
+        fd.decode_file(faers_file, interned, use_chunk, "c", {}, logger, interner=interner)
+        # 同一 worker 的第二个文件复用字典
+        fd.decode_file(faers_file, interned, use_chunk, "c", {}, logger, interner=interner)
+
+    with open(plain, "rb") as a, open(interned, "rb") as b:
+        assert a.read() == b.read()
+    df = pd.read_csv(plain, dtype=str, keep_default_na=False)
+    side = fd.read_sidecar(fd.sidecar_path(interned))
+    assert {"role_cod", "route", "drugname", "prod_ai"} <= set(side)
+    for name, cat in side.items():
+        assert cat.codes.dtype.itemsize <= 2
+        assert list(cat.astype(str)) == df[name].tolist()
+    assert len(interner.dictionary("DRUG", "drugname").index) == df["drugname"].nunique()
+
+    # 字典超上限的列：本文件不驻留、不进旁路文件，输出不变
+    small = fd.StringInterner(sidecar=True, max_entries=5)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fd.decode_file(faers_file, interned, use_chunk, "c", {}, logger, interner=small)
+    with open(plain, "rb") as a, open(interned, "rb") as b:
+        assert a.read() == b.read()
+    side = fd.read_sidecar(fd.sidecar_path(interned))
+    assert "dose_unit" in side and "drugname" not in side
+
+
+def test_split_parts_stitch_sidecars(faers_file, tmp_path):
+    logger = fd.logging.getLogger("test")
+    task = {"year": "2024", "quarter": "Q1", "stem": "DRUG24Q1",
+            "input_path": faers_file, "output_path": str(tmp_path / "split.csv")}
+    serial = str(tmp_path / "serial.csv")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fd.decode_file(faers_file, serial, False, "c", {}, logger, interner=fd.StringInterner(sidecar=True))
+        jobs = fd.plan_jobs([task], threshold_mb=0, part_mb=0.037)
+        part_results = []
+        for i, job in enumerate(jobs):
+            res = fd.new_result(job)
+            # 每个分片在不同 worker 上：各自的字典
+            fd.decode_file(faers_file, job["output_path"], False, "c", res, logger, byte_range=job["byte_range"],
+                           interner=fd.StringInterner(sidecar=True))
+            res["status"] = "OK"
+            part_results.append(res)
+    assert fd.merge_part_results(jobs[0], part_results, "csv", logger)["status"] == "OK"
+
+    a, b = fd.read_sidecar(fd.sidecar_path(serial)), fd.read_sidecar(fd.sidecar_path(task["output_path"]))
+    assert set(a) == set(b)
+    for name in a:
+        assert list(a[name].astype(str)) == list(b[name].astype(str))
+    assert not list(tmp_path.glob("split.part*"))
+
+
+@pytest.mark.parametrize("use_chunk", [False, True])
+@pytest.mark.parametrize("intern", [False, True])
+def test_direct_csv_writer_matches_to_csv(faers_file, tmp_path, monkeypatch, use_chunk, intern):
+    monkeypatch.setattr(fd, "CHUNK_ROWS", 400)
+    monkeypatch.setattr(fd, "WRITE_BATCH_ROWS", 700)
+    logger = fd.logging.getLogger("test")
+    baseline, direct = str(tmp_path / "pandas.csv"), str(tmp_path / "direct.csv")
+    interner = fd.StringInterner() if intern else None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fd.decode_file(faers_file, baseline, use_chunk, "c", {}, logger, writer="pandas")
+        fd.decode_file(faers_file, direct, use_chunk, "c", {}, logger, interner=interner, writer="direct")
+    with open(baseline, "rb") as a, open(direct, "rb") as b:
+        assert a.read() == b.read()
+
+    # 引号 / 分隔符 / 换行 / 缺失 / 整数 / category / 单列空串
+    df = pd.DataFrame({
+        "primaryid": pd.array([1, None, 3], dtype="Int64"),
+        "text": pd.Series(['a,b', 'say "hi"', "two\nlines\r"], dtype="str"),
+        "code": pd.Categorical(["PS", None, "x,y"]),
+        "other": pd.Series([1.5, None, True], dtype=object),
+    })
+    one = pd.DataFrame({"x": pd.Series(["", "a", None], dtype="str")})
+    for frame in (df, one, df.iloc[:0], pd.DataFrame(index=range(2))):
+        rendered = fd.render_csv_header(frame.columns) + bytes(fd.render_csv_rows(frame))
+        assert rendered == to_csv_bytes(frame)
+
+
+def test_gzip_output_with_split_parts(faers_file, tmp_path):
+    logger = fd.logging.getLogger("test")
+    serial = str(tmp_path / "serial.csv")
+    task = {"year": "2024", "quarter": "Q1", "stem": "DRUG24Q1",
+            "input_path": faers_file, "output_path": str(tmp_path / "split.csv.gz")}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fd.decode_file(faers_file, serial, True, "c", {}, logger)
+        fd.decode_file(faers_file, str(tmp_path / "whole.csv.gz"), True, "c", {}, logger)
+        jobs = fd.plan_jobs([task], threshold_mb=0, part_mb=0.037)
+        part_results = []
+        for job in jobs:
+            # 分片不压缩，拼接时一次压缩
+            assert job["output_path"].endswith(".csv") and ".part" in job["output_path"]
+            res = fd.new_result(job)
+            fd.decode_file(faers_file, job["output_path"], False, "c", res, logger, byte_range=job["byte_range"])
+            res["status"] = "OK"
+            part_results.append(res)
+    assert len(jobs) > 1
+    assert fd.merge_part_results(jobs[0], part_results, "csv", logger)["status"] == "OK"
+
+    with open(serial, "rb") as f:
+        expected = f.read()
+    for name in ("whole.csv.gz", "split.csv.gz"):
+        with gzip.open(tmp_path / name, "rb") as f:
+            assert f.read() == expected
+        path = str(tmp_path / name)
+        assert fd.output_columns(path) == fd.output_columns(serial)
+        got = pd.concat(fd.read_output_chunks(path, chunk_rows=500), ignore_index=True)
+        assert got.equals(pd.read_csv(serial, dtype=str, keep_default_na=False))
+    assert fd.split_output_name("split.csv.gz") == ("split", ".csv.gz")
+    assert not list(tmp_path.glob("split.part*"))
@@ -0,0 +1,45 @@
+import glob
+import os
+
+import pandas as pd
+
+import faers_dedup as dd
+
+
+def write_csv(root, year, q, stem, rows, header):
+    path = os.path.join(root, year, q, f"{stem}.csv")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.DataFrame(rows, columns=header).to_csv(path, index=False)
+
+
+def read_parts(root, table):
+    files = sorted(glob.glob(os.path.join(root, table, "part-*.csv")))
+    return pd.concat([pd.read_csv(f, dtype=str, keep_default_na=False) for f in files], ignore_index=True)
+
+
+def test_dedup_keeps_latest_version_across_quarters(tmp_path):
+    src, out = str(tmp_path / "CSV_DATA"), str(tmp_path / "DEDUP")
+    # 2012Q3 为 AERS 旧版列名（ISR / CASE，大写）
+    write_csv(src, "2012", "Q3", "DEMO12Q3", [["50", "5", "20120801"], ["70", "7", "20120802"]],
+              ["ISR", "CASE", "FDA_DT"])
+    write_csv(src, "2012", "Q3", "DRUG12Q3", [["50", "1", "OLD"], ["70", "1", "KEEP7"]], ["ISR", "DRUG_SEQ", "DRUGNAME"])
+    write_csv(src, "2024", "Q1", "DEMO24Q1",
+              [["11", "1", "1", "20240105"], ["21", "2", "1", "20240110"], ["51", "5", "1", "202402"]],
+              ["primaryid", "caseid", "caseversion", "fda_dt"])
+    write_csv(src, "2024", "Q1", "DRUG24Q1", [["11", "1", "A"], ["11", "2", "B"], ["21", "1", "C"], ["51", "1", "NEW5"]],
+              ["primaryid", "drug_seq", "drugname"])
+    # 2024Q2 重新发布 case 1 的新版本；case 2 以同一 primaryid 被原样重发（不应产生重复药物行）
+    write_csv(src, "2024", "Q2", "DEMO24Q2", [["12", "1", "2", "20240401"], ["21", "2", "1", "20240110"]],
+              ["primaryid", "caseid", "caseversion", "fda_dt"])
+    write_csv(src, "2024", "Q2", "DRUG24Q2", [["12", "1", "A2"], ["21", "1", "C"]], ["primaryid", "drug_seq", "drugname"])
+
+    summary = dd.run_dedup(src, out, "csv", n_parts=4, process_num=1, chunk_rows=2)
+
+    demo = read_parts(out, "DEMO").sort_values("primaryid")
+    assert demo["primaryid"].tolist() == ["12", "21", "51", "70"]
+    assert summary["cases"] == 4 and summary["demo_versions"] == 7
+    drug = read_parts(out, "DRUG").sort_values(["primaryid", "drugname"])
+    assert drug["drugname"].tolist() == ["A2", "C", "NEW5", "KEEP7"]
+    assert summary["tables"]["DRUG"] == {"rows_in": 8, "rows_out": 4}
+    assert "caseversion" in demo.columns and "primaryid" in drug.columns
+    assert not os.path.exists(os.path.join(out, "_work"))
@@ -0,0 +1,73 @@
+import warnings
+
+import pandas as pd
+import pytest
+
+import faers_bench
+import faers_decode_final as fd
+import faers_drugnorm as dn
+
+
+def test_rules_strip_case_dose_form_salt_and_notes():
+    raw = pd.Series(["Lipitor 20mg tablets", "ATORVASTATIN CALCIUM.", "Tylenol (paracetamol) 500 MG",
+                     "MAGNESIUM SULFATE", "METHYLPREDNISOLONE SODIUM SUCCINATE", "5 MG", "acetaminophen / codeine",
+                     "HUMIRA 40 MG/0.8 ML", ""])
+    assert dn.normalize_names(raw).tolist() == [
+        "LIPITOR", "ATORVASTATIN", "TYLENOL", "MAGNESIUM SULFATE", "METHYLPREDNISOLONE", "5 MG",
+        "ACETAMINOPHEN/CODEINE", "HUMIRA", "",
+    ]
+
+
+def test_cache_is_shared_across_instances_and_runs_rules_once_per_distinct_value(tmp_path, monkeypatch):
+    cache = str(tmp_path / "norm.sqlite")
+    calls = []
+    real = dn.normalize_names
+    monkeypatch.setattr(dn, "normalize_names", lambda s: calls.append(len(s)) or real(s))
+
+    col = pd.Series(["aspirin 81 mg", "Aspirin", "aspirin 81 mg", None, "HUMIRA"] * 1000)
+    first = dn.DrugNormalizer(cache)
+    out = first.normalize(col)
+    assert out.tolist()[:5] == ["ASPIRIN", "ASPIRIN", "ASPIRIN", "", "HUMIRA"]
+    assert calls == [3] and first.stats["computed"] == 3
+    first.normalize(col)
+    assert calls == [3] and first.stats["memory_hits"] == 3
+    first.close()
+
+    # 新进程 / 新一次运行：全部来自磁盘缓存
+    second = dn.DrugNormalizer(cache)
+    before = second.snapshot()
+    assert second.normalize(col).equals(out)
+    assert calls == [3] and second.delta(before) == {
+        "distinct": 3, "memory_hits": 0, "disk_hits": 3, "computed": 0, "hit_rate": 1.0}
+
+    # 规则版本变化：旧缓存作废
+    second.close()
+    monkeypatch.setattr(dn, "NORM_VERSION", dn.NORM_VERSION + 1)
+    third = dn.DrugNormalizer(cache)
+    third.normalize(col)
+    assert third.stats["computed"] == 3
+
+
+@pytest.mark.parametrize("use_chunk", [False, True])
+def test_decode_adds_normalized_column_next_to_raw(tmp_path, use_chunk, monkeypatch):
+    monkeypatch.setattr(fd, "CHUNK_ROWS", 700)
+    src = tmp_path / "DRUG24Q1.txt"
+    faers_bench.write_synthetic_table(str(src), "DRUG", 3000, malformed_every=0)
+    out = str(tmp_path / "DRUG24Q1.csv")
+    res = {}
+    normalizer = dn.DrugNormalizer(str(tmp_path / "norm.sqlite"))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fd.decode_file(str(src), out, use_chunk, "c", res, fd.logging.getLogger("test"), chunk_rows=700,
+                       normalizer=normalizer)
+
+    df = pd.read_csv(out, dtype=str, keep_default_na=False)
+    cols = list(df.columns)
+    assert cols[cols.index("drugname") + 1] == "drugname_norm"
+    assert cols[cols.index("prod_ai") + 1] == "prod_ai_norm"
+    assert df["drugname_norm"].tolist() == dn.normalize_names(df["drugname"]).tolist()
+    stats = res["drug_norm"]
+    # 两列共用一份缓存：每个不同的原始值只跑一次规则
+    assert stats["computed"] == len(set(df["drugname"]) | set(df["prod_ai"]))
+    if use_chunk:
+        assert stats["hit_rate"] > 0.5
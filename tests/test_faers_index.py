@@ -0,0 +1,61 @@
+import os
+
+import pandas as pd
+import pytest
+
+import faers_index as fx
+
+
+def write_output(root, year, q, stem, df, fmt):
+    path = os.path.join(root, year, q, f"{stem}.{fmt}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    else:
+        import faers_decode_final as fd
+        fd.atomic_write(df, path, stem[:4], "parquet")
+    return path
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_index_lookup_by_primaryid_and_caseid(tmp_path, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    out, idx_root = str(tmp_path / "OUT"), str(tmp_path / "IDX")
+    demo1 = pd.DataFrame({"primaryid": ["11", "21"], "caseid": ["1", "2"], "fda_dt": ["20240105", "20240110"]})
+    demo2 = pd.DataFrame({"primaryid": ["12"], "caseid": ["1"], "fda_dt": ["20240401"]})
+    drug1 = pd.DataFrame({"primaryid": ["11", "21", "11"], "drug_seq": ["1", "1", "2"],
+                          "drugname": ["A, 5MG", "C", "B"]})
+    write_output(out, "2024", "Q1", "DEMO24Q1", demo1, fmt)
+    write_output(out, "2024", "Q2", "DEMO24Q2", demo2, fmt)
+    drug_path = write_output(out, "2024", "Q1", "DRUG24Q1", drug1, fmt)
+
+    assert fx.build_index(out, idx_root)["built"] == 3
+    idx = fx.FaersIndex(out, idx_root)
+
+    res = idx.lookup(primaryid=11)
+    assert sorted(res) == ["DEMO", "DRUG"]
+    assert res["DRUG"]["drugname"].tolist() == ["A, 5MG", "B"]
+    assert res["DEMO"][["year", "quarter", "caseid"]].values.tolist() == [["2024", "Q1", "1"]]
+
+    res = idx.lookup(caseid=1, tables=["demo"])
+    assert res["DEMO"]["primaryid"].tolist() == ["11", "12"]
+    assert idx.lookup(primaryid=999) == {}
+
+    # 增量：只有改动过的文件重建
+    assert fx.build_index(out, idx_root)["built"] == 0
+    drug2 = pd.concat([drug1, pd.DataFrame({"primaryid": ["21"], "drug_seq": ["2"], "drugname": ["D"]})])
+    os.remove(drug_path)
+    write_output(out, "2024", "Q1", "DRUG24Q1", drug2, fmt)
+    assert fx.build_index(out, idx_root)["built"] == 1
+    res = fx.FaersIndex(out, idx_root).lookup(primaryid=21, tables=["DRUG"])
+    assert res["DRUG"]["drugname"].tolist() == ["C", "D"]
+
+
+def test_cli_lookup_prints_rows(tmp_path, capsys):
+    out, idx_root = str(tmp_path / "OUT"), str(tmp_path / "IDX")
+    write_output(out, "2024", "Q1", "REAC24Q1", pd.DataFrame({"primaryid": ["5", "6"], "pt": ["NAUSEA", "RASH"]}), "csv")
+    assert fx.main(["--output-root", out, "--index-root", idx_root, "build"]) == 0
+    assert fx.main(["--output-root", out, "--index-root", idx_root, "lookup", "--primaryid", "6"]) == 0
+    text = capsys.readouterr().out
+    assert "RASH" in text and "NAUSEA" not in text
@@ -0,0 +1,42 @@
+import json
+
+import faers_report
+
+
+def result(file, year, seconds, mb=100, status="OK", **phases):
+    return {
+        "year": year, "quarter": "Q1", "file": file, "status": status, "rows": 1000, "seconds": seconds,
+        "bytes_read": mb * 1024 * 1024, "bytes_written": mb * 1024 * 1024, "peak_rss_mb": 200.0,
+        "retry_seconds": 0.0, "phases": phases,
+    }
+
+
+def test_summary_groups_by_table_and_year_and_counts_skips():
+    results = [
+        result("DEMO24Q1", "2024", 10, parse=6, write=4),
+        result("DRUG24Q1", "2024", 20, parse=15, write=5),
+        result("DEMO23Q1", "2023", 10, parse=5, write=5),
+        result("DRUG23Q1", "2023", 0, status="SKIP"),
+    ]
+    s = faers_report.summarize(results)
+    assert s["by_table"]["DEMO"]["files"] == 2 and s["by_table"]["DEMO"]["mb_per_sec"] == 10.0
+    assert s["by_table"]["DRUG"]["skipped"] == 1 and s["by_table"]["DRUG"]["phases"]["parse"] == 15
+    assert s["by_year"]["2024"]["seconds"] == 30 and s["total"]["rows"] == 3000
+    assert "DEMO" in faers_report.format_summary(s)
+
+
+def test_compare_flags_throughput_regression_and_worst_phase(tmp_path, capsys):
+    old = [result("DEMO24Q1", "2024", 10, parse=6, write=4), result("DRUG24Q1", "2024", 20, parse=15, write=5)]
+    new = [result("DEMO24Q1", "2024", 10.5, parse=6.5, write=4), result("DRUG24Q1", "2024", 40, parse=16, write=24)]
+    cmp = faers_report.compare_reports(old, new, threshold=0.15, files=True)
+    flagged = {(r["scope"], r["key"]) for r in cmp["regressions"]}
+    assert flagged == {("total", "TOTAL"), ("table", "DRUG"), ("file", "2024/Q1/DRUG24Q1")}
+    drug = next(r for r in cmp["rows"] if r["key"] == "DRUG")
+    assert drug["worst_phase"] == "write" and drug["change"] == -0.5
+
+    old_path, new_path = tmp_path / "report_old.json", tmp_path / "telemetry_new.jsonl"
+    old_path.write_text(json.dumps({"results": old}), encoding="utf-8")
+    new_path.write_text("\n".join(json.dumps(r) for r in new), encoding="utf-8")
+    assert faers_report.main(["compare", str(old_path), str(new_path)]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+    assert faers_report.main(["compare", str(old_path), str(old_path)]) == 0
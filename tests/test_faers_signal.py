@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import faers_signal as sg
+
+
+def write_output(root, rel, stem, df):
+    path = os.path.join(root, rel, f"{stem}.csv")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_csv(path, index=False)
+    return path
+
+
+def brute_force(drug: pd.DataFrame, reac: pd.DataFrame) -> pd.DataFrame:
+    d = drug.assign(drug=drug["drugname"].str.strip().str.upper())[["primaryid", "drug"]].drop_duplicates()
+    r = reac.assign(pt=reac["pt"].str.strip().str.upper())[["primaryid", "pt"]].drop_duplicates()
+    both = set(d["primaryid"]) & set(r["primaryid"])
+    d, r = d[d["primaryid"].isin(both)], r[r["primaryid"].isin(both)]
+    a = d.merge(r, on="primaryid").groupby(["drug", "pt"]).size().rename("a").reset_index()
+    a["b"] = a["drug"].map(d["drug"].value_counts()) - a["a"]
+    a["c"] = a["pt"].map(r["pt"].value_counts()) - a["a"]
+    a["d"] = len(both) - a["a"] - a["b"] - a["c"]
+    return a.sort_values(["drug", "pt"]).reset_index(drop=True)
+
+
+def random_quarter(rng, first_pid, n_reports):
+    pids = np.arange(first_pid, first_pid + n_reports)
+    drug = pd.DataFrame({"primaryid": rng.choice(pids, n_reports * 3).astype(str),
+                         "drugname": rng.choice(["aspirin", "ASPIRIN ", "IBUPROFEN", "METFORMIN", "X"], n_reports * 3)})
+    reac = pd.DataFrame({"primaryid": rng.choice(pids, n_reports * 2).astype(str),
+                         "pt": rng.choice(["Nausea", "RASH", "HEADACHE", "DEATH"], n_reports * 2)})
+    return drug, reac
+
+
+def test_counts_match_brute_force_join_and_merge_incrementally(tmp_path):
+    rng = np.random.default_rng(0)
+    src, counts_root = str(tmp_path / "OUT"), str(tmp_path / "SIG")
+    quarters = {"2024/Q1": random_quarter(rng, 1000, 60), "2024/Q2": random_quarter(rng, 2000, 80)}
+    for rel, (drug, reac) in quarters.items():
+        write_output(src, rel, "DRUG" + rel[2:4] + rel[-2:], drug)
+        write_output(src, rel, "REAC" + rel[2:4] + rel[-2:], reac)
+
+    res = sg.build_counts(src, counts_root, chunk_rows=17)
+    assert (res["built"], res["segments"]) == (2, 2)
+    counts = sg.ContingencyCounts.load(os.path.join(counts_root, sg.TOTAL_NAME))
+    got = counts.contingency().sort_values(["drug", "pt"]).reset_index(drop=True)
+    expected = brute_force(pd.concat([q[0] for q in quarters.values()]), pd.concat([q[1] for q in quarters.values()]))
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+    # 新季度：只统计新增段，汇总 = 旧汇总 + 新段
+    drug3, reac3 = random_quarter(rng, 3000, 40)
+    write_output(src, "2024/Q3", "DRUG24Q3", drug3)
+    write_output(src, "2024/Q3", "REAC24Q3", reac3)
+    res = sg.build_counts(src, counts_root)
+    assert (res["built"], res["skipped"], res["segments"]) == (1, 2, 3)
+    got = sg.ContingencyCounts.load(os.path.join(counts_root, sg.TOTAL_NAME)).contingency()
+    expected = brute_force(pd.concat([q[0] for q in quarters.values()] + [drug3]),
+                           pd.concat([q[1] for q in quarters.values()] + [reac3]))
+    pd.testing.assert_frame_equal(got.sort_values(["drug", "pt"]).reset_index(drop=True), expected, check_dtype=False)
+
+    # 季度被删除：由剩余各段重新相加
+    os.remove(os.path.join(src, "2024/Q1/REAC24Q1.csv"))
+    res = sg.build_counts(src, counts_root)
+    assert (res["removed"], res["segments"]) == (1, 2)
+    got = sg.ContingencyCounts.load(os.path.join(counts_root, sg.TOTAL_NAME)).contingency()
+    expected = brute_force(pd.concat([quarters["2024/Q2"][0], drug3]), pd.concat([quarters["2024/Q2"][1], reac3]))
+    pd.testing.assert_frame_equal(got.sort_values(["drug", "pt"]).reset_index(drop=True), expected, check_dtype=False)
+
+
+def test_signals_prr_ror_and_role_filter(tmp_path, monkeypatch):
+    src, counts_root = str(tmp_path / "OUT"), str(tmp_path / "SIG")
+    # 10 份报告：A 出现在 1–4（其中 1–3 有 RASH），RASH 另出现在 5；6–10 只有 B / NAUSEA
+    drug = pd.DataFrame({"primaryid": [str(i) for i in range(1, 11)] + ["1"],
+                         "role_cod": ["PS"] * 4 + ["C"] * 6 + ["C"],
+                         "drugname": ["A"] * 4 + ["B"] * 6 + ["B"]})
+    reac = pd.DataFrame({"primaryid": ["1", "2", "3", "5"] + [str(i) for i in range(4, 11)],
+                         "pt": ["RASH"] * 4 + ["NAUSEA"] * 7})
+    write_output(src, "2024/Q1", "DRUG24Q1", drug)
+    write_output(src, "2024/Q1", "REAC24Q1", reac)
+    sg.build_counts(src, counts_root)
+    counts = sg.ContingencyCounts.load(os.path.join(counts_root, sg.TOTAL_NAME))
+
+    row = counts.signals(drug="a", pt="rash").iloc[0]
+    assert (row["a"], row["b"], row["c"], row["d"]) == (3, 1, 1, 5)
+    assert row["prr"] == pytest.approx((3 / 4) / (1 / 6))
+    assert row["ror"] == pytest.approx(15.0)
+    assert row["ror_lo"] < row["ror"] < row["ror_hi"]
+    assert len(counts.signals(min_count=4)) == 1
+
+    # 只统计首要怀疑药：B 不再计入，N 只剩 A 的报告
+    monkeypatch.setattr(sg, "ROLE_CODES", ("PS",))
+    assert sg.build_counts(src, counts_root)["built"] == 1
+    counts = sg.ContingencyCounts.load(os.path.join(counts_root, sg.TOTAL_NAME))
+    assert counts.reports == 4 and list(counts.drugs) == ["A"]
@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+
+import faers_store as fs
+
+
+def write_output(root, year, q, stem, df, fmt):
+    path = os.path.join(root, year, q, f"{stem}.{fmt}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    else:
+        import faers_decode_final as fd
+        fd.atomic_write(df, path, stem[:4], "parquet")
+    return path
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_store_load_query_and_incremental_reload(tmp_path, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    out, store = str(tmp_path / "OUT"), str(tmp_path / "faers.sqlite")
+    demo = pd.DataFrame({"primaryid": ["11", "21"], "caseid": ["1", "2"], "fda_dt": ["20240105", ""]})
+    drug = pd.DataFrame({"primaryid": ["11", "21", "11"], "drug_seq": ["1", "1", "2"], "role_cod": ["PS", "PS", "C"],
+                         "drugname": ["A, 5MG", "C", "B"]})
+    reac = pd.DataFrame({"primaryid": ["11", "21"], "pt": ["NAUSEA", "RASH"]})
+    write_output(out, "2024", "Q1", "DEMO24Q1", demo, fmt)
+    drug_path = write_output(out, "2024", "Q1", "DRUG24Q1", drug, fmt)
+    reac_path = write_output(out, "2024", "Q1", "REAC24Q1", reac, fmt)
+
+    res = fs.load_store(out, store)
+    assert (res["loaded"], res["rows"]) == (3, 7)
+
+    df = fs.query("SELECT primaryid, caseid, fda_dt FROM demo ORDER BY primaryid", store_path=store)
+    assert df["primaryid"].tolist() == [11, 21]
+    assert df["fda_dt"].tolist()[0] == "20240105" and df["fda_dt"].isna().tolist()[1]
+    df = fs.query("SELECT d.drugname, r.pt FROM drug d JOIN reac r USING (primaryid) "
+                  "WHERE d.role_cod = ? ORDER BY 1", params=("PS",), store_path=store)
+    assert df.values.tolist() == [["A, 5MG", "NAUSEA"], ["C", "RASH"]]
+
+    indexes = set(fs.query("SELECT name FROM sqlite_master WHERE type = 'index'", store_path=store)["name"])
+    assert {"ix_demo_caseid", "ix_drug_primaryid", "ix_drug_drugname", "ix_reac_pt"} <= indexes
+
+    # 增量：未变的文件跳过；变化的文件替换旧行；消失的文件删除其行
+    assert fs.load_store(out, store)["loaded"] == 0
+    os.remove(drug_path)
+    write_output(out, "2024", "Q1", "DRUG24Q1", drug.iloc[:1], fmt)
+    os.remove(reac_path)
+    res = fs.load_store(out, store)
+    assert (res["loaded"], res["skipped"], res["removed"]) == (1, 1, 1)
+    counts = fs.query("SELECT (SELECT COUNT(*) FROM drug) AS d, (SELECT COUNT(*) FROM reac) AS r, "
+                      "(SELECT COUNT(*) FROM _files) AS f", store_path=store)
+    assert counts.values.tolist() == [[1, 0, 2]]
+
+
+def test_store_aers_columns_and_cli(tmp_path, capsys):
+    out, store = str(tmp_path / "OUT"), str(tmp_path / "faers.sqlite")
+    # 未统一表头的 AERS 输出：ISR / CASE 映射到 primaryid / caseid
+    write_output(out, "2005", "Q1", "DEMO05Q1", pd.DataFrame({"ISR": ["7"], "CASE": ["70"]}), "csv")
+    write_output(out, "2024", "Q1", "DEMO24Q1", pd.DataFrame({"primaryid": ["8"], "caseid": ["80"],
+                                                             "sex": ["F"]}), "csv")
+    assert fs.main(["--output-root", out, "--store", store, "load"]) == 0
+    assert fs.main(["--store", store, "query", "SELECT primaryid, caseid, sex FROM demo ORDER BY primaryid"]) == 0
+    text = capsys.readouterr().out
+    assert "2 rows" in text and "80" in text
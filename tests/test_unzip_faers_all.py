@@ -0,0 +1,59 @@
+import zipfile
+
+import unzip_faers_all as uz
+
+
+def make_zip(path, members):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+
+
+def test_extract_all_filters_members_and_skips_verified(tmp_path, monkeypatch):
+    raw, out = tmp_path / "RAW_ZIP", tmp_path / "UNZIP_DATA"
+    monkeypatch.setattr(uz, "FAILED_LOG", tmp_path / "failed.txt")
+    drug = b"primaryid$drugname\n1$ASPIRIN\n" * 1000
+    make_zip(raw / "2012" / "Q4" / "faers_ascii_2012q4.zip", {
+        "ascii/DRUG12Q4.txt": drug,
+        "ascii/REAC12Q4.txt": b"primaryid$pt\n1$NAUSEA\n",
+        "ascii/ASC_NTS.pdf": b"%PDF",
+        "ascii/Readme.txt": b"readme",
+        "xml/DRUG12Q4.xml": b"<x/>",
+    })
+    make_zip(raw / "2003" / "Q1" / "aers_ascii_2003q1.zip", {"ascii/DRUG03Q1.txt": b"x"})
+
+    res = uz.extract_all(raw, out, 2004, 2025, process_num=2)
+
+    assert res["failed"] == [] and res["extracted"] == 2 and res["skipped"] == 0
+    files = sorted(p.relative_to(out).as_posix() for p in out.rglob("*") if p.is_file())
+    assert files == ["2012/Q4/ascii/DRUG12Q4.txt", "2012/Q4/ascii/REAC12Q4.txt", uz.EXTRACT_MANIFEST_NAME]
+    assert (out / "2012/Q4/ascii/DRUG12Q4.txt").read_bytes() == drug
+
+    assert uz.extract_all(raw, out, 2004, 2025, process_num=1)["skipped"] == 2
+
+    # 落地文件被截断 -> 只重解这一个成员
+    (out / "2012/Q4/ascii/DRUG12Q4.txt").write_bytes(b"short")
+    res = uz.extract_all(raw, out, 2004, 2025, process_num=1)
+    assert (res["extracted"], res["skipped"]) == (1, 1)
+    assert (out / "2012/Q4/ascii/DRUG12Q4.txt").read_bytes() == drug
+
+
+def test_extract_archive_rejects_crc_mismatch(tmp_path):
+    zip_path = tmp_path / "2020" / "Q1" / "faers_ascii_2020q1.zip"
+    zip_path.parent.mkdir(parents=True)
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as zf:
+        zf.writestr("ascii/DEMO20Q1.txt", b"primaryid$caseid\n" + b"1$2\n" * 100)
+    data = bytearray(zip_path.read_bytes())
+    pos = data.index(b"1$2\n")
+    data[pos] = ord("9")
+    zip_path.write_bytes(bytes(data))
+
+    try:
+        uz.extract_archive(zip_path, tmp_path / "out")
+    except zipfile.BadZipFile:
+        pass
+    else:
+        raise AssertionError("corrupted member was accepted")
+    assert not list((tmp_path / "out").rglob("*.txt"))
+    assert not list((tmp_path / "out").rglob("*.tmp"))
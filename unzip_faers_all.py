@@ -1,12 +1,242 @@
+import json
+import os
+import sys
+import time
 import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
 from pathlib import Path
 
+import faers_config
+from faers_config import ascii_table_member
+
 # ======== 路径配置 ========
 
-FAILED_LOG = Path(r"C:\Users\venture\first\FAERS_DATA\unzip_failed_files.txt")
-RETRY_FAILED_LOG = Path(r"C:\Users\venture\first\FAERS_DATA\unzip_failed_files_retry_failed.txt")
+# 数据根目录：环境变量 FAERS_BASE_DIR（faers_cli --base-dir 会设置），未设置时为默认目录
+BASE_DIR = Path(faers_config.base_dir())
+
+FAILED_LOG = BASE_DIR / "unzip_failed_files.txt"
+RETRY_FAILED_LOG = BASE_DIR / "unzip_failed_files_retry_failed.txt"
+
+RAW_ZIP_ROOT = BASE_DIR / "RAW_ZIP"
+UNZIP_ROOT = BASE_DIR / "UNZIP_DATA"
+
+START_YEAR = 2004
+END_YEAR = 2025
+
+# 并行解压的进程数（None = CPU 核数）；每个进程一次处理一个 ZIP
+PROCESS_NUM = None
+
+# 成员流式拷贝的缓冲区大小
+COPY_BUFFER = 4 * 1024 * 1024
+
+# 解压清单：记录每个 ZIP 的签名与已校验成员，下次运行直接跳过
+EXTRACT_MANIFEST_NAME = "_extract_manifest.json"
+
+# ======== 解压核心 ========
+
+
+def zip_signature(zip_path):
+    st = os.stat(zip_path)
+    return {"zip_size": st.st_size, "zip_mtime_ns": st.st_mtime_ns}
+
+
+def extract_member(zf, info, dest):
+    """
+    流式解压单个成员到 dest（先写 .tmp，校验通过后 replace），
+    边拷贝边算 CRC32，和中央目录里的 CRC / 解压后大小比对。
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp")
+    crc = 0
+    size = 0
+    try:
+        with zf.open(info) as src, open(tmp, "wb") as dst:
+            while True:
+                buf = src.read(COPY_BUFFER)
+                if not buf:
+                    break
+                crc = zlib.crc32(buf, crc)
+                size += len(buf)
+                dst.write(buf)
+        if size != info.file_size:
+            raise zipfile.BadZipFile(f"size mismatch {info.filename}: {size} != {info.file_size}")
+        if crc != info.CRC:
+            raise zipfile.BadZipFile(f"CRC mismatch {info.filename}: {crc:08x} != {info.CRC:08x}")
+        os.replace(tmp, dest)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return {"path": str(dest), "size": size, "crc": f"{crc:08x}"}
+
+
+def is_member_current(record, info):
+    """清单里的成员记录仍有效：CRC 一致且落地文件存在、大小一致"""
+    if not record or record.get("crc") != f"{info.CRC:08x}":
+        return False
+    try:
+        return os.path.getsize(record["path"]) == info.file_size
+    except OSError:
+        return False
+
+
+def extract_archive(zip_path, target_dir, entry=None):
+    """
+    只解出 ascii 目录下属于 8 张表的 .txt 到 target_dir/ascii/；
+    entry 为上次的清单记录：ZIP 签名未变且成员已校验过的直接跳过。
+    返回新的清单记录 + 统计；失败时抛出异常（由调用方记录）。
+    """
+    zip_path = Path(zip_path)
+    target_dir = Path(target_dir)
+    sig = zip_signature(zip_path)
+    old_members = {}
+    if entry and entry.get("zip_size") == sig["zip_size"] and entry.get("zip_mtime_ns") == sig["zip_mtime_ns"]:
+        old_members = entry.get("members", {})
+
+    members = {}
+    extracted = skipped = nbytes = 0
+    start = time.perf_counter()
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            stem = ascii_table_member(info)
+            if stem is None:
+                continue
+            if is_member_current(old_members.get(info.filename), info):
+                members[info.filename] = old_members[info.filename]
+                skipped += 1
+                continue
+            dest = target_dir / "ascii" / Path(info.filename.replace("\\", "/")).name
+            members[info.filename] = extract_member(zf, info, dest)
+            extracted += 1
+            nbytes += info.file_size
+
+    return {
+        "zip": str(zip_path),
+        "entry": {**sig, "members": members},
+        "extracted": extracted,
+        "skipped": skipped,
+        "bytes": nbytes,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def _extract_job(zip_path, target_dir, entry):
+    """进程池入口：异常转成结果，避免一个坏 ZIP 中断整个池"""
+    try:
+        return extract_archive(zip_path, target_dir, entry)
+    except Exception as e:
+        return {"zip": str(zip_path), "error": repr(e)}
+
+
+def discover_archives(raw_root=None, start_year=None, end_year=None):
+    """RAW_ZIP\\{year}\\{Qn}\\*.zip -> [(zip_path, target_dir)]，按 ZIP 大小降序（大件先开工）"""
+    raw_root = Path(raw_root or RAW_ZIP_ROOT)
+    start_year = start_year or START_YEAR
+    end_year = end_year or END_YEAR
+
+    archives = []
+    if not raw_root.is_dir():
+        return archives
+    for year_dir in sorted(raw_root.iterdir()):
+        if not (year_dir.is_dir() and year_dir.name.isdigit() and len(year_dir.name) == 4):
+            continue
+        if not start_year <= int(year_dir.name) <= end_year:
+            continue
+        for q in ("Q1", "Q2", "Q3", "Q4"):
+            for zip_path in sorted((year_dir / q).glob("*.zip")):
+                archives.append((zip_path, zip_path.parent))
+    archives.sort(key=lambda a: a[0].stat().st_size, reverse=True)
+    return archives
+
+
+def load_extract_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("archives", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_extract_manifest(path, archives):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"archives": archives}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def extract_all(raw_root=None, unzip_root=None, start_year=None, end_year=None, process_num=None,
+                dry_run=False):
+    """
+    全量解压 START_YEAR–END_YEAR 的全部 ZIP：进程池按 ZIP 并行，只取需要的成员，
+    逐成员校验 CRC/大小，清单记录已校验成员；失败的 ZIP 写入 FAILED_LOG（可再用 retry_failed_unzip 重试）。
+    dry_run=True：只列出 ZIP 及其是否与清单签名一致，不启动进程池、不写任何文件。
+    """
+    raw_root = Path(raw_root or RAW_ZIP_ROOT)
+    unzip_root = Path(unzip_root or UNZIP_ROOT)
+    manifest_path = unzip_root / EXTRACT_MANIFEST_NAME
+    manifest = load_extract_manifest(manifest_path)
+
+    jobs = []
+    for zip_path, zip_dir in discover_archives(raw_root, start_year, end_year):
+        rel = zip_dir.relative_to(raw_root)
+        key = zip_path.relative_to(raw_root).as_posix()
+        jobs.append((key, zip_path, unzip_root / rel))
+
+    process_num = process_num or PROCESS_NUM or os.cpu_count() or 1
+    process_num = max(1, min(process_num, len(jobs) or 1))
+    print(f"共找到 {len(jobs)} 个 ZIP，进程数 {process_num}")
+    if dry_run:
+        changed = []
+        for key, zip_path, target in jobs:
+            entry = manifest.get(key) or {}
+            sig = zip_signature(zip_path)
+            current = entry.get("zip_size") == sig["zip_size"] and entry.get("zip_mtime_ns") == sig["zip_mtime_ns"]
+            if not current:
+                changed.append(key)
+            print(f"[{'清单一致' if current else '待解压'}] {key} -> {target}")
+        return {"archives": len(jobs), "pending": changed}
+
+    failed = []
+    totals = {"extracted": 0, "skipped": 0, "bytes": 0}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=process_num, mp_context=get_context("spawn")) as ex:
+        futures = {
+            ex.submit(_extract_job, str(zip_path), str(target), manifest.get(key)): key
+            for key, zip_path, target in jobs
+        }
+        for fut in as_completed(futures):
+            key = futures[fut]
+            res = fut.result()
+            if "error" in res:
+                print(f"[失败] {res['zip']} -> {res['error']}")
+                failed.append((res["zip"], res["error"]))
+                continue
+            manifest[key] = res["entry"]
+            save_extract_manifest(manifest_path, manifest)
+            for k in totals:
+                totals[k] += res[k]
+            print(f"[OK] {key} | 解压 {res['extracted']} 跳过 {res['skipped']} | {res['seconds']}s")
+
+    seconds = time.perf_counter() - start
+    if failed:
+        FAILED_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with open(FAILED_LOG, "w", encoding="utf-8") as f:
+            f.write("FAERS 解压失败记录\n")
+            f.write("=" * 60 + "\n")
+            for zp, err in failed:
+                f.write(f"{zp}\n")
+                f.write(f"ERROR: {err}\n")
+                f.write("-" * 60 + "\n")
+        print(f"\n{len(failed)} 个 ZIP 失败，已记录到：{FAILED_LOG}")
+
+    print(
+        f"=== 完成 === 解压 {totals['extracted']} 个成员（{totals['bytes'] / (1024 * 1024):.1f}MB），"
+        f"跳过 {totals['skipped']} 个已校验成员，用时 {seconds:.1f}s"
+    )
+    return {**totals, "failed": failed, "seconds": round(seconds, 3)}
 
-UNZIP_ROOT = Path(r"C:\Users\venture\first\FAERS_DATA\UNZIP_DATA")
 
 # ======== 主逻辑 ========
 
@@ -38,16 +268,15 @@ def retry_failed_unzip():
         try:
             # 从路径中解析 year / quarter
             # ...\RAW_ZIP\2011\Q3\xxx.zip
-            year = zip_path.parents[2].name
-            quarter = zip_path.parents[1].name
+            year = zip_path.parents[1].name
+            quarter = zip_path.parents[0].name
 
             target_dir = UNZIP_ROOT / year / quarter
             target_dir.mkdir(parents=True, exist_ok=True)
 
             print(f"[重试解压] {zip_path} -> {target_dir}")
 
-            with zipfile.ZipFile(zip_path, "r") as zf:
-                zf.extractall(target_dir)
+            extract_archive(zip_path, target_dir)
 
         except Exception as e:
             print(f"[仍失败] {zip_path}")
@@ -70,4 +299,7 @@ def retry_failed_unzip():
 # ======== 程序入口 ========
 
 if __name__ == "__main__":
-    retry_failed_unzip()
+    if "--retry-failed" in sys.argv[1:]:
+        retry_failed_unzip()
+    else:
+        extract_all()